@@ -0,0 +1,131 @@
+"""
+Local stand-in for TelegramClient used by the benchmarks.
+Serves synthetic channels whose posts are generated on demand, with a fixed
+latency per request, so fetcher runs are reproducible without Telegram.
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from telethon.tl.types import InputPeerChannel, Message, PeerChannel
+
+# Telegram returns at most this many messages per GetHistory request
+PAGE_SIZE = 100
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+# Pseudo-words from syllables: a vocabulary large enough that unrelated
+# synthetic posts share few word pairs, like real ones
+SYLLABLES = ["ка", "но", "ра", "ти", "мо", "ле", "ви", "ст", "пр", "до", "се", "ну", "ба", "ло", "ре", "ко"]
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+_rng = random.Random(42)
+FRAGMENTS = [" ".join(_rng.choice(WORDS) for _ in range(_rng.randint(5, 40))) for _ in range(1024)]
+
+
+class FakeChannel:
+    """A synthetic channel: message ids 1..head, one post per `spacing`."""
+
+    def __init__(self, channel_id: int, username: str, head: int, spacing: timedelta):
+        self.channel_id = channel_id
+        self.username = username
+        self.head = head
+        self.spacing = spacing
+        self.access_hash = channel_id * 7919
+
+    def text(self, message_id: int) -> str:
+        # Two fragments picked by a cheap hash: ~1M distinct texts
+        key = self.channel_id * 1_000_003 + message_id
+        return f"{FRAGMENTS[key % 1021]} {FRAGMENTS[key // 1021 % 1024]}"
+
+    def date(self, message_id: int) -> datetime:
+        return EPOCH + self.spacing * message_id
+
+    def message(self, message_id: int) -> Message:
+        text = self.text(message_id)
+        message = Message(
+            id=message_id,
+            peer_id=PeerChannel(self.channel_id),
+            date=self.date(message_id),
+            message=text
+        )
+        # Without a client Message.text would not fall back to the raw text
+        message._text = text
+        return message
+
+
+class FakeTelegramClient:
+    """Implements the parts of TelegramClient the parser uses.
+
+    Every request (resolution or a page of up to 100 messages) sleeps for
+    `latency` seconds. publish() adds new posts to every channel.
+    """
+
+    def __init__(self, channels: int, posts_per_channel: int, latency: float = 0.05, spacing_seconds: int = 60):
+        self.latency = latency
+        self.channels: Dict[str, FakeChannel] = {}
+        self.by_id: Dict[int, FakeChannel] = {}
+        for i in range(channels):
+            channel = FakeChannel(
+                10_000 + i,
+                f"bench_channel_{i}",
+                posts_per_channel,
+                timedelta(seconds=spacing_seconds * channels) + timedelta(seconds=i)
+            )
+            self.channels[channel.username] = channel
+            self.by_id[channel.channel_id] = channel
+        self.requests = 0
+        self.connected = False
+
+    def publish(self, posts_per_channel: int):
+        """Make `posts_per_channel` new posts appear in every channel."""
+        for channel in self.channels.values():
+            channel.head += posts_per_channel
+
+    async def start(self):
+        self.connected = True
+        return self
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def _request(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _channel(self, entity) -> FakeChannel:
+        if isinstance(entity, InputPeerChannel):
+            return self.by_id[entity.channel_id]
+        return self.channels[entity.lstrip("@")]
+
+    async def get_input_entity(self, entity) -> InputPeerChannel:
+        channel = self._channel(entity)
+        if not isinstance(entity, InputPeerChannel):
+            await self._request()
+        return InputPeerChannel(channel.channel_id, channel.access_hash)
+
+    async def get_peer_id(self, entity) -> int:
+        channel = self._channel(entity)
+        return -1_000_000_000_000 - channel.channel_id
+
+    async def iter_messages(self, entity, limit: Optional[int] = None, min_id: int = 0, reverse: bool = False, **kwargs):
+        channel = self._channel(entity)
+        if reverse:
+            ids = range(min_id + 1, channel.head + 1)
+        else:
+            ids = range(channel.head, min_id, -1)
+        if limit is not None:
+            ids = ids[:limit]
+
+        for start in range(0, len(ids), PAGE_SIZE):
+            await self._request()
+            for message_id in ids[start:start + PAGE_SIZE]:
+                yield channel.message(message_id)
+
+    async def get_messages(self, entity, limit: Optional[int] = None, **kwargs) -> List[Message]:
+        return [message async for message in self.iter_messages(entity, limit=limit, **kwargs)]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Telegram News Aggregator.
+Seeds a database with synthetic posts, runs the parser against a fake
+Telegram backend and times the hot Repository queries. Results are printed
+as JSON so runs can be compared over time.
+
+Example:
+    python -m benchmarks.run --posts 100000 --channels 100 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Settings are read at import time; fill in what a benchmark doesn't need
+for name, value in {
+    "BOT_TOKEN": "0:benchmark",
+    "API_ID": "0",
+    "API_HASH": "benchmark",
+    "ADMIN_IDS": "[]",
+    "FEEDBACK_FORM": "-",
+}.items():
+    os.environ.setdefault(name, value)
+
+logger = logging.getLogger("benchmarks")
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples: List[float], total_seconds: float, items: int) -> Dict:
+    """Summarize per-operation latencies in milliseconds."""
+    return {
+        "operations": len(samples),
+        "throughput_per_second": round(items / total_seconds, 1) if total_seconds else None,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def time_calls(func: Callable, args_list: List[tuple]) -> Dict:
+    samples = []
+    started = time.perf_counter()
+    for args in args_list:
+        call_started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - call_started)
+    return summarize(samples, time.perf_counter() - started, len(args_list))
+
+
+def seed(repo, client, users: int, saved_per_user: int, subscriptions: int, batch_size: int = 5000) -> Dict:
+    """Fill the database with the fake client's current posts, users and saved posts."""
+    started = time.perf_counter()
+    channel_ids = {}
+    for channel in client.channels.values():
+        channel_ids[channel.username] = repo.add_channel(channel.username, title=channel.username).id
+
+    inserted = 0
+    for channel in client.channels.values():
+        channel_id = channel_ids[channel.username]
+        for start in range(1, channel.head + 1, batch_size):
+            rows = [
+                {
+                    "message_id": message_id,
+                    "text": channel.text(message_id),
+                    "date": channel.date(message_id),
+                    "url": f"https://t.me/{channel.username}/{message_id}"
+                }
+                for message_id in range(start, min(start + batch_size, channel.head + 1))
+            ]
+            inserted += repo.add_posts_bulk(channel_id, rows, last_message_id=rows[-1]["message_id"])
+
+    rng = random.Random(7)
+    ids = list(channel_ids.values())
+    heads = {channel_ids[channel.username]: channel.head for channel in client.channels.values()}
+    for user_id in range(1, users + 1):
+        repo.register_user(user_id)
+        for _ in range(saved_per_user):
+            channel_id = rng.choice(ids)
+            repo.save_post(user_id, channel_id, rng.randint(1, heads[channel_id]))
+        for channel_id in rng.sample(ids, min(subscriptions, len(ids))):
+            repo.subscribe_channel(user_id, channel_id)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "posts": inserted,
+        "seconds": round(elapsed, 1),
+        "posts_per_second": round(inserted / elapsed, 1) if elapsed else None,
+    }
+
+
+def bench_queries(repo, client, users: int, iterations: int, page_size: int) -> Dict:
+    """Time the feed, saved posts and stats queries at random positions."""
+    rng = random.Random(11)
+    results = {}
+
+    # Cursors spread over the whole history of the fake channels
+    oldest = min(channel.date(1) for channel in client.channels.values()).replace(tzinfo=None)
+    newest = max(channel.date(channel.head) for channel in client.channels.values()).replace(tzinfo=None)
+    cursors = [(oldest + (newest - oldest) * rng.random(), 0, 0) for _ in range(iterations)]
+
+    results["feed_first_page"] = time_calls(repo.get_latest_posts_page, [(None, page_size)] * iterations)
+    results["feed_deep_page"] = time_calls(repo.get_latest_posts_page, [(cursor, page_size) for cursor in cursors])
+    if users:
+        user_ids = [rng.randint(1, users) for _ in range(iterations)]
+        results["saved_page"] = time_calls(repo.get_saved_posts_page, [(user_id, None, page_size) for user_id in user_ids])
+        results["user_feed_first_page"] = time_calls(
+            repo.get_user_feed_page, [(user_id, None, page_size) for user_id in user_ids]
+        )
+        results["user_feed_deep_page"] = time_calls(
+            repo.get_user_feed_page, [(user_id, cursor, page_size) for user_id, cursor in zip(user_ids, cursors)]
+        )
+    results["stats"] = time_calls(repo.get_stats, [()] * max(1, iterations // 10))
+    return results
+
+
+async def bench_fetch(fetcher, client, cycles: int, new_posts_per_channel: int) -> Dict:
+    """Time update_channels cycles, each with new posts in every channel."""
+    samples = []
+    fetched = 0
+    requests_before = client.requests
+    started = time.perf_counter()
+    for _ in range(cycles):
+        client.publish(new_posts_per_channel)
+        cycle_started = time.perf_counter()
+        await fetcher.update_channels()
+        await fetcher.pipeline.flush()
+        samples.append(time.perf_counter() - cycle_started)
+        fetched += new_posts_per_channel * len(client.channels)
+    result = summarize(samples, time.perf_counter() - started, fetched)
+    result["posts"] = fetched
+    result["telegram_requests"] = client.requests - requests_before
+    return result
+
+
+async def run(args) -> Dict:
+    from benchmarks.fake_telegram import FakeTelegramClient
+    from tg_news_feed.config import config
+    from tg_news_feed.parser.fetcher import TelegramFetcher
+    from tg_news_feed.parser.pool import ClientPool
+    from tg_news_feed.storage.async_repo import AsyncRepository
+    from tg_news_feed.storage.repo import Repository
+
+    posts_per_channel = max(1, args.posts // args.channels)
+    client = FakeTelegramClient(args.channels, posts_per_channel, latency=args.latency)
+
+    repo = Repository()
+    repo.create_tables()
+    results = {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": vars(args),
+        "config": {
+            "PARSER_CONCURRENCY": config.PARSER_CONCURRENCY,
+            "PARSER_RATE_PER_SECOND": config.PARSER_RATE_PER_SECOND,
+            "PARSER_MAX_MESSAGES_PER_FETCH": config.PARSER_MAX_MESSAGES_PER_FETCH,
+            "DEDUP_ENABLED": config.DEDUP_ENABLED,
+        },
+    }
+
+    logger.info(f"Seeding {posts_per_channel * args.channels} posts in {args.channels} channels")
+    results["seed"] = seed(repo, client, args.users, args.saved_per_user, args.subscriptions)
+
+    logger.info("Running parser cycles")
+    async_repo = AsyncRepository(repo)
+    fetcher = TelegramFetcher(async_repo, pool=ClientPool({"benchmark": client}))
+    await fetcher.start()
+    # A single benchmark process is always the leader
+    await fetcher.lead()
+    try:
+        results["fetch"] = await bench_fetch(fetcher, client, args.cycles, args.new_posts)
+    finally:
+        await fetcher.stop()
+
+    logger.info("Timing queries")
+    results["queries"] = bench_queries(repo, client, args.users, args.iterations, args.page_size)
+    results["peak_rss_mb"] = peak_rss_mb()
+    async_repo.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parser and feed queries against a fake Telegram")
+    parser.add_argument("--posts", type=int, default=10_000, help="posts to seed (10k to 10M)")
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--saved-per-user", type=int, default=20)
+    parser.add_argument("--subscriptions", type=int, default=10, help="channels each user follows")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Telegram latency per request, seconds")
+    parser.add_argument("--cycles", type=int, default=5, help="parser cycles to time")
+    parser.add_argument("--new-posts", type=int, default=20, help="new posts per channel per cycle")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per timed query")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--db", help="database file (default: a fresh temporary file)")
+    parser.add_argument("--output", help="write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Per-channel parser logs would dominate the timings
+    logging.getLogger("tg_news_feed").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or str(Path(tmp) / "benchmark.sqlite")
+        if Path(db_path).exists():
+            parser.error(f"{db_path} already exists; benchmarks need an empty database")
+        os.environ["DB_PATH"] = db_path
+        results = asyncio.run(run(args))
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+
+if __name__ == "__main__":
+    main()
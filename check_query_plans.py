@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the Telegram News Aggregator database.
+Runs EXPLAIN QUERY PLAN for the hot feed/saved/suggestions queries and fails
+if any of them falls back to a full table scan or a temporary sort.
+"""
+
+import sys
+import logging
+
+from tg_news_feed.storage.repo import Repository
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def check_query_plans():
+    """Check that the hot queries are served by indexes."""
+    repo = Repository()
+    repo.create_tables()
+
+    ok = True
+    for name, steps in repo.explain_query_plans().items():
+        # The first step reads the driving table of the query
+        driving = steps[0]
+        problems = [step for step in steps if "USE TEMP B-TREE" in step]
+        if "INDEX" not in driving:
+            problems.append(driving)
+
+        for step in steps:
+            logger.info(f"{name}: {step}")
+        if problems:
+            logger.error(f"{name}: not served by an index: {problems}")
+            ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    success = check_query_plans()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+One-off switch of an existing Telegram News Aggregator database to
+incremental auto-vacuum, so retention can return freed pages to the OS.
+Runs a full VACUUM: it holds an exclusive lock while the whole file is
+rewritten and rebuilds the search index afterwards, so stop the bot and
+the workers first.
+"""
+
+import sys
+import logging
+
+from tg_news_feed.storage.repo import Repository
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def enable_incremental_vacuum():
+    """Convert the database unless it already uses incremental auto-vacuum."""
+    repo = Repository()
+    if repo.incremental_vacuum(1):
+        logger.info("Database already uses incremental auto-vacuum")
+        return True
+
+    logger.info("Rewriting the database with a full VACUUM, this may take a while")
+    repo.enable_incremental_vacuum()
+    if not repo.incremental_vacuum(1):
+        logger.error("Database is still not in incremental auto-vacuum mode")
+        return False
+    logger.info("Database now uses incremental auto-vacuum")
+    return True
+
+
+if __name__ == "__main__":
+    success = enable_incremental_vacuum()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,40 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Settings are read at import time; fill in what the tests don't need
+for name, value in {
+    "BOT_TOKEN": "0:test",
+    "API_ID": "0",
+    "API_HASH": "test",
+    "ADMIN_IDS": "[]",
+    "FEEDBACK_FORM": "-",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """A Repository on a fresh SQLite file."""
+    from tg_news_feed.config import config
+    from tg_news_feed.storage.repo import Repository
+
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "test.sqlite"))
+    repo = Repository()
+    repo.create_tables()
+    yield repo
+    repo.engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze time.monotonic at a value the test moves by hand."""
+    import time
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
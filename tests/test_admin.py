@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+from tg_news_feed.bot.handlers import admin
+from tg_news_feed.config import config
+
+
+class FakeMessage:
+    def __init__(self, user_id):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+class FakeRepo:
+    def __init__(self, channels):
+        self.channels = channels
+
+    async def get_stats(self):
+        return {
+            "users": 1,
+            "posts": sum(channel["posts"] for channel in self.channels),
+            "channels": len(self.channels),
+            "saved_posts": 0,
+            "channel_posts": self.channels,
+        }
+
+
+def test_stats_lists_the_most_active_channels_within_the_message_limit(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_IDS", [1])
+    channels = [
+        {"channel_id": i, "username": f"channel_with_a_long_name_{i:04d}", "posts": 1000 + i, "last_hour": i % 7}
+        for i in range(200)
+    ]
+    message = FakeMessage(1)
+    asyncio.run(admin.cmd_stats(message, FakeRepo(channels), None))
+
+    text = message.answers[0]
+    assert len(text) < 4096
+    assert text.count("`@channel_with_a_long_name_") == admin.STATS_TOP_CHANNELS
+    # The busiest channel of the last hour comes first
+    listed = [line.split("`")[1] for line in text.splitlines() if line.startswith("`@")]
+    assert listed[0] == "@channel_with_a_long_name_0195"
+    assert f"и ещё {200 - admin.STATS_TOP_CHANNELS} каналов" in text
+
+
+class FakeFetcher:
+    """Only offers the limited fetch, like the scheduled cycle uses."""
+
+    subscribed = False
+
+    def __init__(self):
+        self.fetched = []
+
+    async def fetch_limited(self, channel):
+        self.fetched.append(channel['username'])
+        return 3
+
+
+def test_addchannel_fetches_within_the_scheduler_limits(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_IDS", [1])
+
+    class Repo:
+        async def add_channel(self, username):
+            return SimpleNamespace(id=5, username=username)
+
+    message = FakeMessage(1)
+    message.text = "/addchannel @news"
+    fetcher = FakeFetcher()
+    asyncio.run(admin.cmd_add_channel(message, Repo(), fetcher))
+
+    assert fetcher.fetched == ["news"]
+    assert "Получено первых постов: 3" in message.answers[-1]
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from tg_news_feed.storage.repo import merge_album
+
+
+def album_row(message_id, caption="", thumbnail=None, grouped_id=7):
+    return {
+        "message_id": message_id,
+        "text": caption,
+        "date": datetime(2026, 1, 1),
+        "url": f"https://t.me/test/{message_id}",
+        "media": [{"message_id": message_id, "type": "photo", "thumbnail": thumbnail, "caption": caption}],
+        "grouped_id": grouped_id,
+    }
+
+
+def test_merge_album_joins_captions_in_message_order():
+    merged = merge_album([album_row(3, "B"), album_row(2), album_row(1, "A")])
+    assert merged["message_id"] == 1
+    assert merged["text"] == "A\n\nB"
+    assert [item["message_id"] for item in merged["media"]] == [1, 2, 3]
+
+
+def test_merge_album_is_idempotent():
+    stored = merge_album([album_row(1, "A"), album_row(2, "B")])
+    again = merge_album([stored, album_row(2, "B")])
+    assert again["text"] == "A\n\nB"
+    assert again["media"] == stored["media"]
+    assert merge_album([again, album_row(1, "A"), album_row(2, "B")]) == again
+
+
+def test_merge_album_applies_edits_and_keeps_thumbnails():
+    stored = merge_album([album_row(1, "A", thumbnail="hash1"), album_row(2, "B", thumbnail="hash2")])
+    # Edits arrive without a thumbnail
+    edited = merge_album([stored, album_row(2, "B2")])
+    assert edited["text"] == "A\n\nB2"
+    assert [item["thumbnail"] for item in edited["media"]] == ["hash1", "hash2"]
+
+
+def test_merge_album_reads_albums_stored_without_captions():
+    legacy = album_row(1, "A")
+    legacy["media"] = [{"message_id": 1, "type": "photo", "thumbnail": None}]
+    merged = merge_album([legacy, album_row(2)])
+    assert merged["text"] == "A"
+    assert [item["caption"] for item in merged["media"]] == ["A", ""]
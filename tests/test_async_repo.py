@@ -0,0 +1,37 @@
+import asyncio
+from datetime import datetime
+
+from tg_news_feed.storage.async_repo import AsyncRepository
+
+
+def post(message_id):
+    return {
+        "message_id": message_id,
+        "text": "text",
+        "date": datetime(2026, 1, 1, 0, message_id),
+        "url": f"https://t.me/test/{message_id}",
+    }
+
+
+def test_users_without_subscriptions_read_the_cached_feed(repo):
+    async def scenario():
+        store = AsyncRepository(repo, max_workers=1)
+        channel = await store.add_channel("test")
+        await store.add_posts_bulk(channel.id, [post(1), post(2)])
+
+        first = await store.get_user_feed_page(7, None, 10)
+        again = await store.get_user_feed_page(8, None, 10)
+        hits = store.feed_cache.hits
+
+        await store.subscribe_channel(9, channel.id)
+        followed = await store.get_user_feed_page(9, None, 10)
+        store.executor.shutdown(wait=True)
+        return first, again, hits, followed, store.feed_cache.hits
+
+    first, again, hits, followed, hits_after = asyncio.run(scenario())
+    assert [p["message_id"] for p in first] == [2, 1]
+    assert again == first
+    assert hits == 1
+    # Personal feeds aren't cached
+    assert [p["message_id"] for p in followed] == [2, 1]
+    assert hits_after == hits
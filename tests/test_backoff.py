@@ -0,0 +1,31 @@
+from tg_news_feed.parser.backoff import BackoffSchedule
+
+
+def test_deferred_channel_waits_until_its_time(clock):
+    schedule = BackoffSchedule()
+    assert schedule.is_ready(1)
+    assert schedule.defer(1, 30) == 30
+    assert not schedule.is_ready(1)
+    assert schedule.is_ready(2)
+
+    clock[0] += 20
+    assert schedule.delay(1) == 10
+    clock[0] += 10
+    assert schedule.is_ready(1)
+
+
+def test_shorter_wait_does_not_cut_a_longer_one(clock):
+    schedule = BackoffSchedule()
+    schedule.defer(1, 60)
+    assert schedule.defer(1, 5) == 60
+
+
+def test_clear_and_state(clock):
+    schedule = BackoffSchedule()
+    schedule.defer(1, 10)
+    schedule.defer(2, 20)
+    assert schedule.state() == {1: 10, 2: 20}
+
+    schedule.clear(1)
+    clock[0] += 15
+    assert schedule.state() == {2: 5}
@@ -0,0 +1,31 @@
+from tg_news_feed.storage.cache import FeedCache
+
+
+def test_pages_expire_after_ttl(clock):
+    feed = FeedCache(max_pages=10, ttl=60)
+    feed.put("page", [1], feed.generation)
+    assert feed.get("page") == [1]
+    clock[0] += 61
+    assert feed.get("page") is None
+    assert (feed.hits, feed.misses) == (1, 1)
+
+
+def test_least_recently_used_page_is_dropped(clock):
+    feed = FeedCache(max_pages=2, ttl=60)
+    feed.put("a", 1, feed.generation)
+    feed.put("b", 2, feed.generation)
+    feed.get("a")
+    feed.put("c", 3, feed.generation)
+    assert feed.get("b") is None
+    assert (feed.get("a"), feed.get("c")) == (1, 3)
+
+
+def test_read_racing_an_invalidation_is_not_cached(clock):
+    feed = FeedCache(max_pages=10, ttl=60)
+    generation = feed.generation
+    feed.put("a", 1, generation)
+    # New posts are stored while a page is being read
+    feed.invalidate()
+    feed.put("b", 2, generation)
+    assert feed.get("a") is None
+    assert feed.get("b") is None
@@ -0,0 +1,54 @@
+from tg_news_feed.parser.dedup import DuplicateDetector, minhash, similarity
+
+TEXT = "OpenAI released a new model today that writes code and answers questions much faster than before"
+REWORDED = "OpenAI released a new model today that writes code and answers questions much faster than ever"
+OTHER = "The city council approved the budget for new parks and bike lanes after a long public debate"
+
+
+def row(message_id, text):
+    return {"message_id": message_id, "text": text}
+
+
+def test_minhash_skips_short_texts():
+    assert minhash("too short to compare", min_words=8) is None
+    assert minhash(TEXT, min_words=8) is not None
+
+
+def test_similarity_tracks_text_overlap():
+    assert similarity(minhash(TEXT), minhash(TEXT)) == 1.0
+    assert similarity(minhash(TEXT), minhash(REWORDED)) > 0.7
+    assert similarity(minhash(TEXT), minhash(OTHER)) < 0.3
+
+
+def test_classify_marks_near_duplicates_of_the_representative():
+    detector = DuplicateDetector(threshold=0.7)
+    first, second, third = row(1, TEXT), row(2, REWORDED), row(3, OTHER)
+    detector.classify(10, first)
+    detector.classify(20, second)
+    detector.classify(30, third)
+
+    assert first["duplicate_of_channel_id"] is None
+    assert (second["duplicate_of_channel_id"], second["duplicate_of_message_id"]) == (10, 1)
+    assert third["duplicate_of_channel_id"] is None
+    # Only cluster representatives are indexed
+    assert set(detector.signatures) == {(10, 1), (30, 3)}
+
+
+def test_reclassifying_a_representative_keeps_it():
+    detector = DuplicateDetector(threshold=0.7)
+    detector.classify(10, row(1, TEXT))
+    again = row(1, TEXT)
+    detector.classify(10, again)
+    assert again["duplicate_of_channel_id"] is None
+
+
+def test_removed_and_evicted_posts_leave_the_buckets():
+    detector = DuplicateDetector(threshold=0.7, max_size=1)
+    detector.add((10, 1), minhash(TEXT))
+    detector.add((30, 3), minhash(OTHER))
+    assert list(detector.signatures) == [(30, 3)]
+    assert detector.find(minhash(REWORDED)) is None
+
+    detector.remove((30, 3))
+    assert detector.find(minhash(OTHER)) is None
+    assert all(not bucket for bucket in detector.buckets)
@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+from telethon.errors import FloodWaitError
+
+from tg_news_feed.config import config
+from tg_news_feed.parser.dedup import DuplicateDetector
+from tg_news_feed.parser.fetcher import TelegramFetcher
+from tg_news_feed.parser.pipeline import MAX_WRITE_ATTEMPTS
+from tg_news_feed.parser.pool import ClientPool, create_client_pool
+
+CHANNEL = {
+    'id': 1,
+    'username': 'channel',
+    'title': 'Channel',
+    'tg_id': 100,
+    'access_hash': 200,
+    'peer_session': 'a'
+}
+
+
+class FakeClient:
+    """A connected session whose history requests hit a FloodWait."""
+
+    def __init__(self, flood_seconds: int):
+        self.flood_seconds = flood_seconds
+        self.requests = 0
+
+    def is_connected(self):
+        return True
+
+    async def _messages(self):
+        self.requests += 1
+        raise FloodWaitError(None, capture=self.flood_seconds)
+        yield
+
+    def iter_messages(self, peer, **kwargs):
+        return self._messages()
+
+
+class FakeRepo:
+    """Stores posts by key; the first `failures` writes raise."""
+
+    def __init__(self):
+        self.posts = {}
+        self.failures = 0
+
+    async def get_channel_cursors(self):
+        return {CHANNEL['id']: 10}
+
+    async def add_posts_bulk(self, channel_id, rows, last_message_id=None):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        for row in rows:
+            self.posts[(channel_id, row['message_id'])] = row
+        return len(rows)
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    monkeypatch.setattr(config, "MEDIA_THUMBNAILS", False)
+
+    def make(*clients):
+        return TelegramFetcher(FakeRepo(), pool=ClientPool(dict(clients or [("a", FakeClient(0))])))
+
+    return make
+
+
+def test_sessions_leave_flood_waits_to_the_backoff(tmp_path, monkeypatch):
+    # Telethon would otherwise sleep through short waits inside a fetch
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "API_ID", 1)
+    monkeypatch.setattr(config, "TELEGRAM_SESSIONS", ["a", "b"])
+    pool = create_client_pool()
+    assert [pooled.client.flood_sleep_threshold for pooled in pool.clients] == [0, 0]
+
+
+def test_short_flood_wait_defers_the_channel(fetcher):
+    async def scenario():
+        client = FakeClient(flood_seconds=5)
+        telegram = fetcher(("a", client))
+        assert await telegram.fetch_channel_posts(dict(CHANNEL)) == 0
+        retry = telegram.retry_handles.pop(CHANNEL['id'])
+        retry.cancel()
+        return telegram, client
+
+    telegram, client = asyncio.run(scenario())
+    assert client.requests == 1
+    assert 4 < telegram.backoff.delay(CHANNEL['id']) <= 5
+    assert 4 < telegram.pool.clients[0].throttle_delay() <= 5
+
+
+TEXT = "OpenAI released a new model today that writes code and answers questions much faster than before"
+REWORDED = "OpenAI released a new model today that writes code and answers questions much faster than ever"
+
+
+def ingest(fetcher, failures):
+    """Write a post that fails `failures` times, then a reworded copy from another channel."""
+    async def scenario():
+        telegram = fetcher()
+        telegram.dedup = DuplicateDetector(threshold=0.7)
+        telegram.pipeline.normalize = lambda channel, item: item
+        telegram.pipeline.flush_interval = 0.05
+        telegram.pipeline.start()
+        telegram.repo.failures = failures
+        await telegram.pipeline.put({'id': 1, 'username': 'first'}, {'message_id': 1, 'text': TEXT})
+        await asyncio.sleep(0.5)
+        await telegram.pipeline.put({'id': 2, 'username': 'second'}, {'message_id': 5, 'text': REWORDED})
+        await telegram.pipeline.stop()
+        return telegram
+
+    return asyncio.run(scenario())
+
+
+def test_posts_dropped_by_the_writer_are_no_duplicate_target(fetcher):
+    telegram = ingest(fetcher, failures=MAX_WRITE_ATTEMPTS)
+    assert list(telegram.repo.posts) == [(2, 5)]
+    assert telegram.repo.posts[(2, 5)]['duplicate_of_channel_id'] is None
+    assert set(telegram.dedup.signatures) == {(2, 5)}
+
+
+def test_posts_stored_on_a_retry_are_indexed_again(fetcher):
+    telegram = ingest(fetcher, failures=1)
+    assert sorted(telegram.repo.posts) == [(1, 1), (2, 5)]
+    assert telegram.repo.posts[(2, 5)]['duplicate_of_channel_id'] == 1
+
+
+def test_flood_wait_moves_the_channel_to_another_session(fetcher):
+    async def scenario():
+        telegram = fetcher(("a", FakeClient(flood_seconds=30)), ("b", FakeClient(flood_seconds=30)))
+        channel_id = next(
+            channel_id for channel_id in range(1, 100)
+            if telegram.pool.pick(channel_id).name == "a"
+        )
+        channel = dict(CHANNEL, id=channel_id)
+        await telegram.fetch_channel_posts(channel)
+        retry = telegram.retry_handles.pop(channel_id)
+        retry.cancel()
+        return telegram, channel_id
+
+    telegram, channel_id = asyncio.run(scenario())
+    assert telegram.pool.pick(channel_id).name == "b"
+    # The other session is free, so the channel is retried right away
+    assert telegram.backoff.delay(channel_id) == 0
+
+
+def test_channel_in_flight_is_not_fetched_twice(fetcher):
+    async def scenario():
+        client = FakeClient(flood_seconds=5)
+        telegram = fetcher(("a", client))
+        telegram.in_flight.add(CHANNEL['id'])
+        return await telegram.fetch_limited(dict(CHANNEL)), client
+
+    fetched, client = asyncio.run(scenario())
+    assert fetched == 0
+    assert client.requests == 0
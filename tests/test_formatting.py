@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from tg_news_feed.bot.formatting import PREVIEW_LENGTH, format_posts, snippet_body
+from tg_news_feed.storage.repo import SNIPPET_OPEN, SNIPPET_CLOSE
+
+
+def post(**fields):
+    return {
+        "channel_title": None,
+        "channel_username": "news",
+        "date": datetime(2026, 1, 2, 3, 4),
+        "url": "https://t.me/news/1",
+        "text": "",
+        "media": None,
+        **fields,
+    }
+
+
+def test_feed_cards_escape_and_trim_text():
+    text = format_posts([post(text="<b>" + "x" * PREVIEW_LENGTH)])
+    assert text.startswith("📡 <b>@news</b> 02.01.2026 03:04\n&lt;b&gt;")
+    assert "…" in text
+    assert text.endswith('<a href="https://t.me/news/1">Открыть пост</a>')
+
+
+def test_media_only_posts_get_a_label():
+    photo = {"message_id": 1, "type": "photo"}
+    assert "🖼 Фото ×2" in format_posts([post(media=[photo, photo])])
+
+
+def test_search_cards_highlight_matches():
+    result = post(snippet=f"about {SNIPPET_OPEN}AI{SNIPPET_CLOSE} & more")
+    text = format_posts([result], body=snippet_body, date_format='%d.%m.%Y')
+    assert text.startswith("📡 <b>@news</b> 02.01.2026\nabout <b>AI</b> &amp; more\n")
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from tg_news_feed.bot.keyboards import (
+    CHANNELS_PAGE_SIZE, channels_keyboard, decode_cursor, encode_cursor, my_feed_keyboard, next_page_cursor
+)
+
+
+def channels(count):
+    return [{"id": i, "username": f"channel{i}", "title": None} for i in range(1, count + 1)]
+
+
+def callbacks(keyboard):
+    return [[button.callback_data for button in row] for row in keyboard.inline_keyboard]
+
+
+def test_channels_keyboard_fits_on_one_page():
+    rows = callbacks(channels_keyboard(channels(3), followed={2}))
+    assert rows == [["sub:1:0"], ["sub:2:0"], ["sub:3:0"]]
+
+
+def test_channels_keyboard_pages_large_lists():
+    many = channels(2 * CHANNELS_PAGE_SIZE + 5)
+
+    first = callbacks(channels_keyboard(many, followed=set()))
+    assert len(first) == CHANNELS_PAGE_SIZE + 1
+    assert first[-1] == ["chpage:1"]
+
+    middle = callbacks(channels_keyboard(many, followed=set(), page=1))
+    assert middle[0] == [f"sub:{CHANNELS_PAGE_SIZE + 1}:1"]
+    assert middle[-1] == ["chpage:0", "chpage:2"]
+
+    # Pages past the end, e.g. after channels were removed, show the last one
+    last = callbacks(channels_keyboard(many, followed=set(), page=9))
+    assert len(last) == 5 + 1
+    assert last[-1] == ["chpage:1"]
+
+
+def test_cursor_survives_a_round_trip():
+    cursor = (datetime(2026, 10, 18, 12, 30, 45, 123456), 42, 987654)
+    token = encode_cursor(cursor)
+    assert decode_cursor(token) == cursor
+    # The callback data limit is 64 bytes
+    assert len(my_feed_keyboard(cursor).inline_keyboard[0][0].callback_data) <= 64
+
+
+def test_broken_cursor_tokens_decode_to_none():
+    assert decode_cursor("") is None
+    assert decode_cursor("zz.1") is None
+    assert decode_cursor("not a token") is None
+
+
+def test_next_page_cursor_points_after_a_full_page():
+    posts = [{"date": datetime(2026, 1, 1, 0, i), "channel_id": 1, "message_id": i} for i in range(3)]
+    assert next_page_cursor(posts, limit=3) == (datetime(2026, 1, 1, 0, 2), 1, 2)
+    assert next_page_cursor(posts, limit=5) is None
@@ -0,0 +1,90 @@
+import asyncio
+
+from tg_news_feed.lease import LeaderLease
+
+
+class FakeRepo:
+    def __init__(self):
+        self.holder = None
+        self.broken = False
+
+    async def acquire_lease(self, name, holder, ttl):
+        if self.broken:
+            raise RuntimeError("database is locked")
+        if self.holder in (None, holder):
+            self.holder = holder
+            return True
+        return False
+
+    async def release_lease(self, name, holder):
+        if self.holder == holder:
+            self.holder = None
+
+
+def test_lease_callbacks_follow_leadership():
+    events = []
+
+    async def scenario():
+        repo = FakeRepo()
+
+        async def acquired():
+            events.append("acquire")
+
+        async def lost():
+            events.append("lose")
+
+        lease = LeaderLease(repo, "scheduler", "a", ttl=10, heartbeat=5, on_acquire=acquired, on_lose=lost)
+        await lease.start()
+        assert lease.is_leader
+        # Renewing an already held lease doesn't fire the callback again
+        await lease._renew()
+
+        repo.holder = "b"
+        await lease._renew()
+        assert not lease.is_leader
+        await lease.stop()
+
+    asyncio.run(scenario())
+    assert events == ["acquire", "lose"]
+
+
+def test_lease_callback_errors_are_contained():
+    async def scenario():
+        async def broken():
+            raise RuntimeError("boom")
+
+        lease = LeaderLease(FakeRepo(), "scheduler", "a", ttl=10, heartbeat=5, on_acquire=broken)
+        await lease.start()
+        assert lease.is_leader
+        await lease.stop()
+
+    asyncio.run(scenario())
+
+
+def test_lease_running_out_while_renewals_fail_fires_on_lose(clock):
+    events = []
+
+    async def scenario():
+        repo = FakeRepo()
+
+        async def acquired():
+            events.append("acquire")
+
+        async def lost():
+            events.append("lose")
+
+        lease = LeaderLease(repo, "scheduler", "a", ttl=10, heartbeat=3, on_acquire=acquired, on_lose=lost)
+        await lease._renew()
+        repo.broken = True
+        for _ in range(4):
+            clock[0] += 3
+            await lease._renew()
+        assert not lease.is_leader
+        # Another process took over meanwhile
+        repo.broken = False
+        repo.holder = "b"
+        await lease._renew()
+        await lease.stop()
+
+    asyncio.run(scenario())
+    assert events == ["acquire", "lose"]
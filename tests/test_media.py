@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from telethon.errors import FloodWaitError
+from telethon.tl.types import Message, MessageMediaPhoto, PeerChannel, Photo, PhotoSize
+
+from tg_news_feed.parser.media import ThumbnailDownloader, thumbnail_size
+from tg_news_feed.storage.thumbnails import ThumbnailCache
+
+PHOTO = Photo(
+    id=500,
+    access_hash=1,
+    file_reference=b"",
+    date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+    sizes=[PhotoSize("s", 90, 90, 1000), PhotoSize("m", 320, 240, 20000), PhotoSize("x", 800, 600, 90000)],
+    dc_id=2,
+)
+
+
+def photo_message(message_id=1):
+    return Message(id=message_id, peer_id=PeerChannel(1), message="", media=MessageMediaPhoto(photo=PHOTO))
+
+
+class Client:
+    def __init__(self, error=None):
+        self.error = error
+        self.downloads = 0
+
+    async def download_media(self, message, file=None, thumb=None):
+        self.downloads += 1
+        if self.error:
+            raise self.error
+        return f"thumb-{thumb}".encode()
+
+
+def test_largest_fitting_size_is_picked():
+    assert thumbnail_size(PHOTO, 320).type == "m"
+    assert thumbnail_size(PHOTO, 50).type == "s"
+
+
+def test_known_media_is_downloaded_once(tmp_path):
+    downloader = ThumbnailDownloader(ThumbnailCache(str(tmp_path), 10_000), max_side=320)
+    client = Client()
+
+    async def scenario():
+        return [await downloader.download(client, photo_message(i)) for i in (1, 2)]
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert client.downloads == 1
+
+
+def test_flood_wait_reaches_the_caller(tmp_path):
+    downloader = ThumbnailDownloader(ThumbnailCache(str(tmp_path), 10_000), max_side=320)
+    client = Client(FloodWaitError(request=None, capture=30))
+    with pytest.raises(FloodWaitError):
+        asyncio.run(downloader.download(client, photo_message()))
+
+
+def test_other_download_errors_only_skip_the_thumbnail(tmp_path):
+    downloader = ThumbnailDownloader(ThumbnailCache(str(tmp_path), 10_000), max_side=320)
+    client = Client(ConnectionError("reset"))
+    assert asyncio.run(downloader.download(client, photo_message())) is None
@@ -0,0 +1,248 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from tg_news_feed.parser.pipeline import IngestPipeline
+
+CHANNEL = {'id': 1, 'username': 'channel'}
+
+
+class FakeRepo:
+    """Records what the pipeline writes; the first `failures` writes raise."""
+
+    def __init__(self, failures: int = 0):
+        self.posts: Dict[int, Dict] = {}
+        self.cursors: Dict[int, int] = {}
+        self.failures = failures
+
+    async def add_posts_bulk(self, channel_id: int, rows: List[Dict], last_message_id: Optional[int] = None) -> int:
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        inserted = 0
+        for row in rows:
+            if row["message_id"] not in self.posts:
+                self.posts[row["message_id"]] = row
+                inserted += 1
+        if last_message_id is not None:
+            self.cursors[channel_id] = max(self.cursors.get(channel_id, 0), last_message_id)
+        return inserted
+
+    async def update_posts_text(self, channel_id: int, rows: List[Dict]) -> int:
+        return 0
+
+    async def set_post_thumbnails(self, channel_id: int, thumbnails: List[Dict]) -> int:
+        for thumbnail in thumbnails:
+            self.posts[thumbnail["message_id"]]["media"][0]["thumbnail"] = thumbnail["thumbnail"]
+        return len(thumbnails)
+
+
+def row(message_id: int, grouped_id: Optional[int] = None, text: str = "", media: bool = False) -> Dict:
+    items = [{"message_id": message_id, "type": "photo", "thumbnail": None}] if media else None
+    return {"message_id": message_id, "text": text, "media": items, "grouped_id": grouped_id}
+
+
+def make_pipeline(repo: FakeRepo, **kwargs) -> IngestPipeline:
+    options = dict(queue_size=10, max_batch=100, flush_interval=0.05)
+    options.update(kwargs)
+    return IngestPipeline(repo, normalize=lambda channel, item: item, **options)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_commit_stores_rows_and_moves_cursor():
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        fetch = pipeline.begin()
+        for message_id in (1, 2, 3):
+            await pipeline.put(CHANNEL, row(message_id), fetch)
+        inserted = await pipeline.commit(CHANNEL, 5, fetch)
+        pipeline.end(fetch)
+        await pipeline.stop()
+        return repo, inserted
+
+    repo, inserted = run(scenario())
+    assert inserted == 3
+    assert sorted(repo.posts) == [1, 2, 3]
+    assert repo.cursors == {1: 5}
+
+
+def test_pushed_rows_do_not_move_cursor():
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        await pipeline.put(CHANNEL, row(105))
+        await pipeline.flush()
+        await pipeline.stop()
+        return repo
+
+    repo = run(scenario())
+    assert 105 in repo.posts
+    assert repo.cursors == {}
+
+
+def test_commit_counts_only_its_own_fetch():
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        first, second = pipeline.begin(), pipeline.begin()
+        await pipeline.put(CHANNEL, row(1), first)
+        await pipeline.put(CHANNEL, row(2))  # pushed
+        await pipeline.put(CHANNEL, row(3), second)
+        await pipeline.put(CHANNEL, row(4), second)
+        counts = (await pipeline.commit(CHANNEL, 1, first), await pipeline.commit(CHANNEL, 4, second))
+        pipeline.end(first)
+        pipeline.end(second)
+        await pipeline.stop()
+        return repo, counts, pipeline
+
+    repo, counts, pipeline = run(scenario())
+    assert counts == (1, 2)
+    assert sorted(repo.posts) == [1, 2, 3, 4]
+    assert pipeline.inserted == {}
+
+
+def test_failed_rows_are_retried():
+    async def scenario():
+        repo = FakeRepo(failures=1)
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        await pipeline.put(CHANNEL, row(1))
+        await asyncio.sleep(0.3)
+        await pipeline.stop()
+        return repo
+
+    repo = run(scenario())
+    assert list(repo.posts) == [1]
+
+
+def test_failing_rows_are_dropped_after_max_attempts():
+    async def scenario():
+        repo = FakeRepo(failures=100)
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        await pipeline.put(CHANNEL, row(1))
+        await asyncio.sleep(0.5)
+        pending = pipeline.pending, dict(pipeline.attempts)
+        repo.failures = 0
+        await pipeline.stop()
+        return repo, pending
+
+    repo, pending = run(scenario())
+    assert pending == (0, {})
+    assert repo.posts == {}
+
+
+def test_failed_commit_raises_and_keeps_cursor():
+    async def scenario():
+        repo = FakeRepo(failures=1)
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        fetch = pipeline.begin()
+        await pipeline.put(CHANNEL, row(1), fetch)
+        try:
+            await pipeline.commit(CHANNEL, 1, fetch)
+        except RuntimeError:
+            failed = True
+        else:
+            failed = False
+        pipeline.end(fetch)
+        await pipeline.stop()
+        return repo, failed
+
+    repo, failed = run(scenario())
+    assert failed
+    assert list(repo.posts) == [1]
+    assert repo.cursors == {}
+
+
+def test_late_thumbnails_reach_queued_and_stored_rows():
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        # Album still collected by the normalizer
+        await pipeline.put(CHANNEL, row(1, grouped_id=7, media=True))
+        await pipeline.put(CHANNEL, row(2, grouped_id=7, media=True))
+        await pipeline.put_thumbnail(CHANNEL, 2, 7, "album")
+        # Stored before its thumbnail arrives
+        await pipeline.put(CHANNEL, row(3, media=True))
+        await pipeline.flush()
+        await pipeline.put_thumbnail(CHANNEL, 3, None, "single")
+        await pipeline.flush()
+        await pipeline.stop()
+        return repo
+
+    repo = run(scenario())
+    assert [item["thumbnail"] for item in repo.posts[1]["media"]] == [None, "album"]
+    assert repo.posts[3]["media"][0]["thumbnail"] == "single"
+
+
+def test_rows_that_fail_to_classify_are_stored_unclassified():
+    def classify(channel, row):
+        row["minhash"] = b"sig"
+        if row["message_id"] == 2:
+            raise ValueError("bad row")
+
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo, classify=classify)
+        pipeline.start()
+        fetch = pipeline.begin()
+        for message_id in (1, 2, 3):
+            await pipeline.put(CHANNEL, row(message_id), fetch)
+        inserted = await pipeline.commit(CHANNEL, 3, fetch)
+        await pipeline.stop()
+        return repo, inserted
+
+    repo, inserted = run(scenario())
+    assert inserted == 3
+    assert sorted(repo.posts) == [1, 2, 3]
+    assert repo.posts[2]["minhash"] is None
+    assert repo.posts[2]["duplicate_of_channel_id"] is None
+    assert repo.cursors == {1: 3}
+
+
+def test_album_messages_are_stored_as_one_post():
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        fetch = pipeline.begin()
+        await pipeline.put(CHANNEL, row(1, grouped_id=7, text="A", media=True), fetch)
+        await pipeline.put(CHANNEL, row(2, grouped_id=7, text="B", media=True), fetch)
+        # The channel moving on closes the album
+        await pipeline.put(CHANNEL, row(3, text="C"), fetch)
+        await pipeline.put(CHANNEL, row(4, grouped_id=8, media=True), fetch)
+        inserted = await pipeline.commit(CHANNEL, 4, fetch)
+        pipeline.end(fetch)
+        await pipeline.stop()
+        return repo, inserted
+
+    repo, inserted = run(scenario())
+    assert inserted == 3
+    assert sorted(repo.posts) == [1, 3, 4]
+    assert repo.posts[1]["text"] == "A\n\nB"
+    assert [item["message_id"] for item in repo.posts[1]["media"]] == [1, 2]
+
+
+def test_pushed_album_is_closed_after_flush_interval():
+    async def scenario():
+        repo = FakeRepo()
+        pipeline = make_pipeline(repo)
+        pipeline.start()
+        await pipeline.put(CHANNEL, row(1, grouped_id=7, media=True))
+        await pipeline.put(CHANNEL, row(2, grouped_id=7, media=True))
+        await asyncio.sleep(0.3)
+        posts = dict(repo.posts)
+        await pipeline.stop()
+        return posts
+
+    posts = run(scenario())
+    assert list(posts) == [1]
+    assert len(posts[1]["media"]) == 2
@@ -0,0 +1,50 @@
+from tg_news_feed.parser.pool import ClientPool
+
+
+class FakeClient:
+    def __init__(self, connected=True):
+        self.connected = connected
+
+    def is_connected(self):
+        return self.connected
+
+
+def pool(*names):
+    return ClientPool({name: FakeClient() for name in names})
+
+
+def owners(clients, channels=range(1, 501)):
+    return {channel_id: clients.pick(channel_id).name for channel_id in channels}
+
+
+def test_channels_stick_to_an_account_and_spread_evenly():
+    clients = pool("a", "b", "c")
+    first = owners(clients)
+    assert owners(clients) == first
+    shares = [list(first.values()).count(name) for name in ("a", "b", "c")]
+    assert min(shares) > 100
+
+
+def test_adding_an_account_only_moves_its_share():
+    before = owners(pool("a", "b"))
+    after = owners(pool("a", "b", "c"))
+    moved = [channel_id for channel_id in before if before[channel_id] != after[channel_id]]
+    assert all(after[channel_id] == "c" for channel_id in moved)
+    assert len(moved) < len(before) / 2
+
+
+def test_throttled_or_disconnected_accounts_fall_through_the_ring():
+    clients = pool("a", "b", "c")
+    channel_id = next(cid for cid, name in owners(clients).items() if name == "a")
+    order = [pooled.name for pooled in clients.candidates(channel_id)]
+    assert order[0] == "a" and sorted(order) == ["a", "b", "c"]
+
+    clients.clients[0].throttle(60)
+    assert clients.pick(channel_id).name == order[1]
+    # Other accounts are free, so nothing has to wait
+    assert clients.wait_time() == 0
+
+    clients.clients[0].throttled_until = 0
+    clients.clients[0].client.connected = False
+    assert clients.pick(channel_id).name == order[1]
+    assert clients.state()["a"] == -1
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from tg_news_feed.parser.ratelimit import TokenBucket
+
+
+def test_bucket_allows_a_burst_then_paces_calls():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(2):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(scenario())
+    assert burst < 0.05
+    # Two more tokens at 20 per second take about 0.1s
+    assert 0.08 <= total < 0.5
+
+
+def test_bucket_serves_waiters_in_order():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=1)
+        order = []
+
+        async def call(i):
+            await bucket.acquire()
+            order.append(i)
+
+        await asyncio.gather(*(call(i) for i in range(5)))
+        return order
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
@@ -0,0 +1,302 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tg_news_feed.storage import repo as repo_module
+from tg_news_feed.storage.repo import FEED_GENERATION
+
+
+def post(message_id, text="text", **columns):
+    return {
+        "message_id": message_id,
+        "text": text,
+        "date": datetime(2026, 1, 1, 0, message_id),
+        "url": f"https://t.me/test/{message_id}",
+        "minhash": None,
+        "duplicate_of_channel_id": None,
+        "duplicate_of_message_id": None,
+        **columns,
+    }
+
+
+def test_feed_generation_follows_feed_writes(repo):
+    channel = repo.add_channel("test")
+    assert repo.get_feed_generation() == 0
+
+    assert repo.add_posts_bulk(channel.id, [post(1), post(2)]) == 2
+    first = repo.get_feed_generation()
+    assert first > 0
+
+    # Duplicates and cursor-only commits don't change the feed
+    assert repo.add_posts_bulk(channel.id, [post(1)], last_message_id=5) == 0
+    assert repo.get_feed_generation() == first
+
+    assert repo.update_posts_text(channel.id, [{"message_id": 1, "text": "edited"}]) == 1
+    assert repo.get_feed_generation() > first
+
+
+def test_reconcile_counters_keeps_feed_generation(repo):
+    channel = repo.add_channel("test")
+    repo.add_posts_bulk(channel.id, [post(1)])
+    generation = repo.get_feed_generation()
+
+    counters = repo.reconcile_counters()
+    assert FEED_GENERATION not in counters
+    assert counters["posts"] == 1
+    assert repo.get_feed_generation() == generation
+
+
+def duplicate_of(key):
+    return {"minhash": b"sig", "duplicate_of_channel_id": key[0], "duplicate_of_message_id": key[1]}
+
+
+def test_pruning_a_representative_promotes_its_oldest_duplicate(repo):
+    first = repo.add_channel("first")
+    second = repo.add_channel("second")
+    representative = (first.id, 1)
+    repo.add_posts_bulk(first.id, [post(1, minhash=b"rep"), post(2)])
+    repo.add_posts_bulk(second.id, [
+        post(5, minhash=b"old", duplicate_of_channel_id=first.id, duplicate_of_message_id=1),
+        post(6, **duplicate_of(representative)),
+    ])
+
+    result = repo.prune_posts(first.id, keep_latest=1)
+    assert result.deleted == 1
+    assert result.representatives == {representative: ((second.id, 5), b"old")}
+
+    # The heir shows up in the feed and the rest of the cluster follows it
+    feed = {(p["channel_id"], p["message_id"]) for p in repo.get_latest_posts(limit=10)}
+    assert feed == {(first.id, 2), (second.id, 5)}
+
+
+def test_pruning_a_lone_representative_reports_no_heir(repo):
+    channel = repo.add_channel("test")
+    repo.add_posts_bulk(channel.id, [post(1, minhash=b"rep"), post(2)])
+
+    result = repo.prune_posts(channel.id, keep_latest=1)
+    assert result.representatives == {(channel.id, 1): None}
+
+
+def test_album_edits_update_their_caption(repo):
+    channel = repo.add_channel("test")
+
+    def album(message_id, caption):
+        return post(
+            message_id,
+            text=caption,
+            grouped_id=7,
+            media=[{"message_id": message_id, "type": "photo", "thumbnail": None, "caption": caption}],
+        )
+
+    repo.add_posts_bulk(channel.id, [album(1, "A"), album(2, "B")])
+    assert repo.update_posts_text(channel.id, [album(2, "B2")]) == 1
+    assert repo.update_posts_text(channel.id, [album(1, "A2")]) == 1
+    # A refetch of the album changes nothing
+    repo.add_posts_bulk(channel.id, [album(1, "A2"), album(2, "B2")])
+
+    posts = repo.get_latest_posts(limit=10)
+    assert len(posts) == 1
+    assert posts[0]["text"] == "A2\n\nB2"
+
+
+def test_set_post_thumbnails_finds_album_messages(repo):
+    channel = repo.add_channel("test")
+    photo = lambda message_id: {"message_id": message_id, "type": "photo", "thumbnail": None, "caption": ""}
+    repo.add_posts_bulk(channel.id, [
+        post(1, grouped_id=7, media=[photo(1)]),
+        post(2, grouped_id=7, media=[photo(2)]),
+        post(3, grouped_id=None, media=[photo(3)]),
+    ])
+    updated = repo.set_post_thumbnails(channel.id, [
+        {"message_id": 2, "grouped_id": 7, "thumbnail": "album"},
+        {"message_id": 3, "grouped_id": None, "thumbnail": "single"},
+        {"message_id": 9, "grouped_id": None, "thumbnail": "missing"},
+    ])
+    assert updated == 2
+    media = {p["message_id"]: [item["thumbnail"] for item in p["media"]] for p in repo.get_latest_posts(limit=10)}
+    assert media == {1: [None, "album"], 3: ["single"]}
+
+
+def test_old_sqlite_is_rejected(monkeypatch):
+    monkeypatch.setattr(repo_module.sqlite3, "sqlite_version_info", (3, 31, 1))
+    with pytest.raises(RuntimeError, match="3.35.0 or newer"):
+        repo_module.create_sqlite_engine(":memory:")
+
+
+def page_keys(posts):
+    return [(p["channel_id"], p["message_id"]) for p in posts]
+
+
+def last_key(posts, date="date"):
+    return posts[-1][date], posts[-1]["channel_id"], posts[-1]["message_id"]
+
+
+def test_feed_pages_follow_the_cursor_through_equal_dates(repo):
+    first = repo.add_channel("first")
+    second = repo.add_channel("second")
+    same_time = {"date": datetime(2026, 1, 1, 12, 0)}
+    repo.add_posts_bulk(first.id, [post(1, **same_time), post(2, **same_time), post(3)])
+    repo.add_posts_bulk(second.id, [post(1, **same_time), post(4)])
+
+    pages = [repo.get_latest_posts_page(limit=2)]
+    while len(pages[-1]) == 2:
+        pages.append(repo.get_latest_posts_page(last_key(pages[-1]), limit=2))
+
+    keys = [key for page in pages for key in page_keys(page)]
+    assert keys == [
+        (second.id, 1), (first.id, 2), (first.id, 1), (second.id, 4), (first.id, 3)
+    ]
+    # Keyset pages match the offset pages
+    assert keys == page_keys(repo.get_latest_posts(limit=10))
+
+
+def test_saved_pages_follow_the_cursor(repo):
+    channel = repo.add_channel("test")
+    repo.add_posts_bulk(channel.id, [post(i) for i in range(1, 6)])
+    for message_id in range(1, 6):
+        repo.save_post(7, channel.id, message_id)
+
+    first_page = repo.get_saved_posts_page(7, limit=3)
+    second_page = repo.get_saved_posts_page(7, last_key(first_page, "saved_at"), limit=3)
+    assert page_keys(first_page + second_page) == page_keys(repo.get_saved_posts(7, limit=10))
+    assert len(second_page) == 2
+
+
+def test_touch_users_registers_new_users_and_moves_last_seen(repo):
+    from sqlalchemy import select
+    from tg_news_feed.storage.models import Counter, User
+
+    repo.register_user(1)
+    first = datetime(2026, 1, 1)
+    later = datetime(2026, 1, 2)
+    repo.touch_users({1: first, 2: first})
+    repo.touch_users({2: later, 3: later})
+
+    with repo.get_session() as session:
+        users = {
+            user.user_id: (user.first_seen, user.last_seen)
+            for user in session.execute(select(User)).scalars()
+        }
+        counted = session.execute(select(Counter.value).where(Counter.name == "users")).scalar_one()
+    assert users[2] == (first, later)
+    assert users[3] == (later, later)
+    assert users[1][1] == first
+    assert repo.get_user_ids() == {1, 2, 3}
+    # The counter only grows by the users that were new
+    assert counted == 3
+
+
+def test_save_post_tells_new_existing_and_missing_posts_apart(repo):
+    channel = repo.add_channel("test")
+    repo.add_posts_bulk(channel.id, [post(1)])
+
+    assert repo.save_post(7, channel.id, 1) == (True, "Post saved")
+    saved_at = repo.get_saved_posts(7)[0]["saved_at"]
+    assert repo.save_post(7, channel.id, 1) == (False, "Post already saved")
+    assert repo.save_post(7, channel.id, 2) == (False, "Post not found")
+
+    # A repeated save keeps the original time and isn't counted twice
+    assert [p["saved_at"] for p in repo.get_saved_posts(7)] == [saved_at]
+    assert repo.get_stats()["saved_posts"] == 1
+    assert repo.save_post(8, channel.id, 1) == (True, "Post saved")
+
+
+def found(repo, query):
+    return [p["message_id"] for p in repo.search_posts(query)]
+
+
+def test_search_index_follows_inserts_edits_and_deletes(repo):
+    channel = repo.add_channel("test")
+    repo.add_posts_bulk(channel.id, [
+        post(1, "Нейросети пишут новости"),
+        post(2, "Погода на выходные"),
+        post(3, "Новые нейросети и погода"),
+    ])
+    assert sorted(found(repo, "нейросети")) == [1, 3]
+    assert found(repo, "нейросети погода") == [3]
+    assert found(repo, "") == []
+    # Quotes in user input don't break the query
+    assert sorted(found(repo, '"погода')) == [2, 3]
+
+    repo.update_posts_text(channel.id, [{"message_id": 2, "text": "Нейросети о погоде"}])
+    assert sorted(found(repo, "нейросети")) == [1, 2, 3]
+    assert found(repo, "выходные") == []
+
+    repo.prune_posts(channel.id, keep_latest=2)
+    assert sorted(found(repo, "нейросети")) == [2, 3]
+
+
+def test_search_results_carry_a_snippet_and_page_by_offset(repo):
+    channel = repo.add_channel("test")
+    repo.add_posts_bulk(channel.id, [post(i, f"новость номер {i}") for i in range(1, 6)])
+
+    first = repo.search_posts("новость", cursor=0, limit=3)
+    rest = repo.search_posts("новость", cursor=3, limit=3)
+    assert len(first) == 3 and len(rest) == 2
+    assert {p["message_id"] for p in first + rest} == {1, 2, 3, 4, 5}
+    assert repo_module.SNIPPET_OPEN + "новость" + repo_module.SNIPPET_CLOSE in first[0]["snippet"]
+
+
+def test_search_queries_get_stable_ids_until_pruned(repo):
+    query_id = repo.get_search_query_id("нейросети")
+    assert repo.get_search_query_id("нейросети") == query_id
+    assert repo.get_search_query_id("погода") != query_id
+    assert repo.get_search_query(query_id) == "нейросети"
+
+    assert repo.prune_search_queries(datetime.utcnow() + timedelta(seconds=1)) == 2
+    assert repo.get_search_query(query_id) is None
+
+
+def personal_feed(repo, user_id, limit=2):
+    pages = [repo.get_user_feed_page(user_id, limit=limit)]
+    while len(pages[-1]) == limit:
+        pages.append(repo.get_user_feed_page(user_id, last_key(pages[-1]), limit=limit))
+    return [key for page in pages for key in page_keys(page)]
+
+
+@pytest.mark.parametrize("fanout_limit", [50, 1])
+def test_personal_feed_pages_through_followed_channels(repo, monkeypatch, fanout_limit):
+    # 50 merges per-channel timelines, 1 filters the global feed
+    from tg_news_feed.config import config
+    monkeypatch.setattr(config, "FEED_FANOUT_MAX_CHANNELS", fanout_limit)
+
+    first = repo.add_channel("first")
+    second = repo.add_channel("second")
+    other = repo.add_channel("other")
+    same_time = {"date": datetime(2026, 1, 1, 12, 0)}
+    repo.add_posts_bulk(other.id, [post(1, minhash=b"rep"), post(9, **same_time)])
+    repo.add_posts_bulk(first.id, [post(1, **same_time), post(2, **same_time), post(3)])
+    repo.add_posts_bulk(second.id, [
+        post(1, **same_time),
+        post(4),
+        # Its representative is in a channel the user doesn't follow
+        post(5, **duplicate_of((other.id, 1))),
+        # Hidden behind first/3
+        post(6, **duplicate_of((first.id, 3))),
+    ])
+    repo.subscribe_channel(7, first.id)
+    repo.subscribe_channel(7, second.id)
+
+    assert personal_feed(repo, 7) == [
+        (second.id, 1), (first.id, 2), (first.id, 1), (second.id, 5), (second.id, 4), (first.id, 3)
+    ]
+    # Users who follow nothing get the global feed
+    assert personal_feed(repo, 8) == personal_feed(repo, 8, limit=10)
+    assert (other.id, 9) in personal_feed(repo, 8)
+
+
+def test_lease_goes_to_one_holder_until_it_expires(repo):
+    assert repo.acquire_lease("scheduler", "a", ttl_seconds=60)
+    assert not repo.acquire_lease("scheduler", "b", ttl_seconds=60)
+    # The holder renews its own lease
+    assert repo.acquire_lease("scheduler", "a", ttl_seconds=60)
+    assert repo.acquire_lease("other", "b", ttl_seconds=60)
+
+    # An expired lease goes to whoever asks next
+    assert repo.acquire_lease("scheduler", "a", ttl_seconds=-1)
+    assert repo.acquire_lease("scheduler", "b", ttl_seconds=60)
+    assert not repo.acquire_lease("scheduler", "a", ttl_seconds=60)
+
+    assert not repo.release_lease("scheduler", "a")
+    assert repo.release_lease("scheduler", "b")
+    assert repo.acquire_lease("scheduler", "a", ttl_seconds=60)
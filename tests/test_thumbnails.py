@@ -0,0 +1,32 @@
+import os
+
+from tg_news_feed.storage.thumbnails import ThumbnailCache
+
+
+def age(cache, digest, mtime):
+    os.utime(cache._file(digest), (mtime, mtime))
+
+
+def test_thumbnails_are_stored_once_by_content(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=10_000)
+    digest = cache.put_sync(b"picture")
+    assert cache.put_sync(b"picture") == digest
+    assert cache.get_sync(digest) == b"picture"
+    assert cache.total == len(b"picture")
+    assert cache.get_sync("0" * 64) is None
+
+
+def test_least_recently_used_thumbnails_are_evicted(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=3000)
+    old, used, new = (cache.put_sync(bytes([i]) * 1000) for i in range(3))
+    age(cache, old, 100)
+    age(cache, used, 200)
+    age(cache, new, 300)
+    # Reading a thumbnail makes it recent again
+    cache.get_sync(old)
+
+    cache.put_sync(b"x" * 1000)
+    assert not cache.contains(used)
+    assert not cache.contains(new)
+    assert cache.contains(old)
+    assert cache.total <= 3000 * 0.9
@@ -0,0 +1,54 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+
+class PostCallbackDebounce(BaseMiddleware):
+    """Drop repeated save/delete taps on the same post.
+
+    While a tap for a (user, post) pair is being handled, and for `window`
+    seconds after it, further taps are answered right away and never reach
+    the handler or the database.
+    """
+
+    def __init__(self, window: float, actions: Tuple[str, ...] = ("save", "delete")):
+        self.window = window
+        self.actions = actions
+        self.in_flight: Set[Tuple[int, str, str]] = set()
+        self.recent: Dict[Tuple[int, str, str], float] = {}
+
+    def _key(self, event: CallbackQuery):
+        parts = (event.data or "").split(":")
+        if len(parts) != 3 or parts[0] not in self.actions:
+            return None
+        return event.from_user.id, parts[1], parts[2]
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        key = self._key(event)
+        if key is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if key in self.in_flight or self.recent.get(key, 0) > now:
+            await event.answer()
+            return None
+
+        self.in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight.discard(key)
+            self._remember(key)
+
+    def _remember(self, key: Tuple[int, str, str]):
+        now = time.monotonic()
+        if len(self.recent) > 10000:
+            self.recent = {k: until for k, until in self.recent.items() if until > now}
+        self.recent[key] = now + self.window
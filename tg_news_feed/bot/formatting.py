@@ -0,0 +1,46 @@
+import html
+from typing import Callable, Dict, List
+
+from tg_news_feed.bot.media import media_label
+from tg_news_feed.storage.repo import SNIPPET_OPEN, SNIPPET_CLOSE
+
+PREVIEW_LENGTH = 600
+
+
+def preview_body(post: Dict) -> str:
+    """Render the start of a post's text as HTML.
+
+    Media-only posts get a label instead of an empty line, albums a summary
+    of what they hold.
+    """
+    text = post['text'] or ""
+    if len(text) > PREVIEW_LENGTH:
+        text = text[:PREVIEW_LENGTH] + "…"
+    body = html.escape(text)
+    if not text or len(post.get('media') or []) > 1:
+        body = f"{media_label(post)}\n{body}".rstrip()
+    return body
+
+
+def snippet_body(post: Dict) -> str:
+    """Render a search result's snippet as HTML with the matches in bold."""
+    snippet = html.escape(post['snippet'] or "")
+    return snippet.replace(SNIPPET_OPEN, "<b>").replace(SNIPPET_CLOSE, "</b>")
+
+
+def format_posts(
+    posts: List[Dict],
+    body: Callable[[Dict], str] = preview_body,
+    date_format: str = '%d.%m.%Y %H:%M'
+) -> str:
+    """Format posts as HTML cards: channel, date, `body` and a link to the post."""
+    blocks = []
+    for post in posts:
+        channel = html.escape(post['channel_title'] or f"@{post['channel_username']}")
+        date = post['date'].strftime(date_format) if post['date'] else ""
+        blocks.append(
+            f"📡 <b>{channel}</b> {date}\n"
+            f"{body(post)}\n"
+            f"<a href=\"{html.escape(post['url'] or '')}\">Открыть пост</a>"
+        )
+    return "\n\n".join(blocks)
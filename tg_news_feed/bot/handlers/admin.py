@@ -12,7 +12,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from tg_news_feed.config import config
-from tg_news_feed.storage.repo import Repository
+from tg_news_feed.storage.async_repo import AsyncRepository
 from tg_news_feed.parser.fetcher import TelegramFetcher
 
 logger = logging.getLogger(__name__)
@@ -21,6 +21,10 @@ router = Router()
 # Track server start time for uptime calculation
 SERVER_START_TIME = datetime.now()
 
+# Channels listed in /stats; the rest are summed up, so the reply stays
+# within Telegram's message length limit
+STATS_TOP_CHANNELS = 20
+
 
 def is_admin(user_id: int) -> bool:
     """Check if user is an admin."""
@@ -29,7 +33,7 @@ def is_admin(user_id: int) -> bool:
 
 # Middleware to check admin status
 @router.message(Command("stats"))
-async def cmd_stats(message: Message, repo: Repository):
+async def cmd_stats(message: Message, repo: AsyncRepository, fetcher: Optional[TelegramFetcher]):
     """Handle /stats command - show statistics."""
     user_id = message.from_user.id
     
@@ -37,16 +41,50 @@ async def cmd_stats(message: Message, repo: Repository):
         await message.answer("⛔ У вас нет прав для использования этой команды.")
         return
     
-    stats = repo.get_stats()
+    stats = await repo.get_stats()
     
-    await message.answer(
+    text = (
         "📊 *Статистика бота*\n\n"
         f"👥 Пользователей: {stats['users']}\n"
         f"📝 Всего постов: {stats['posts']}\n"
-        f"📡 Активных каналов: {stats['channels']}\n"
-        f"❤️ Сохранённых постов: {stats['saved_posts']}",
-        parse_mode="Markdown"
+        f"📡 Каналов: {stats['channels']}\n"
+        f"❤️ Сохранённых постов: {stats['saved_posts']}"
     )
+    
+    if stats['channel_posts']:
+        # Most active channels first
+        channels = sorted(
+            stats['channel_posts'],
+            key=lambda channel: (channel['last_hour'], channel['posts']),
+            reverse=True
+        )
+        text += "\n\n📈 *Самые активные каналы* (всего / за час):\n"
+        for channel in channels[:STATS_TOP_CHANNELS]:
+            text += f"`@{channel['username']}`: {channel['posts']} / {channel['last_hour']}\n"
+        rest = channels[STATS_TOP_CHANNELS:]
+        if rest:
+            text += (
+                f"_...и ещё {len(rest)} каналов: "
+                f"{sum(channel['posts'] for channel in rest)} / "
+                f"{sum(channel['last_hour'] for channel in rest)}_\n"
+            )
+    
+    # Bot-only replicas have no parser state to show
+    backoff = fetcher.get_backoff_state() if fetcher else {}
+    if backoff:
+        text += (
+            f"\n⏳ Каналов в FloodWait: {len(backoff)} "
+            f"(ближайший повтор через {min(backoff.values()):.0f} с)"
+        )
+    
+    sessions = fetcher.get_pool_state() if fetcher else {}
+    if len(sessions) > 1:
+        text += "\n\n🔑 *Аккаунты*:\n"
+        for name, delay in sessions.items():
+            status = "отключён" if delay < 0 else f"FloodWait {delay:.0f} с" if delay > 0 else "активен"
+            text += f"`{name}`: {status}\n"
+    
+    await message.answer(text, parse_mode="Markdown")
 
 
 @router.message(Command("server"))
@@ -94,7 +132,7 @@ async def cmd_server_info(message: Message):
 
 
 @router.message(Command("addchannel"))
-async def cmd_add_channel(message: Message, repo: Repository, fetcher: TelegramFetcher):
+async def cmd_add_channel(message: Message, repo: AsyncRepository, fetcher: Optional[TelegramFetcher]):
     """Handle /addchannel command."""
     user_id = message.from_user.id
     
@@ -131,7 +169,7 @@ async def cmd_add_channel(message: Message, repo: Repository, fetcher: TelegramF
         await message.answer(f"🔄 Добавляю канал {channel_username}...")
         
         # Add to database
-        channel = repo.add_channel(username=clean_username)
+        channel = await repo.add_channel(username=clean_username)
         
         if not channel:
             await message.answer(f"❌ Ошибка: не удалось добавить канал {channel_username}.")
@@ -144,8 +182,21 @@ async def cmd_add_channel(message: Message, repo: Repository, fetcher: TelegramF
             'title': None
         }
         
+        if fetcher is None:
+            # The ingest workers pick the channel up on their next cycle
+            await message.answer(
+                f"✅ Канал {channel_username} успешно добавлен!\n\n"
+                "Посты появятся после следующего обновления каналов.",
+            )
+            return
+        
         await message.answer(f"🔄 Получаю первоначальные посты из {channel_username}...")
-        new_posts = await fetcher.fetch_channel_posts(channel_dict)
+        # Within the same limits as the scheduled fetches, and never
+        # alongside one of the same channel
+        new_posts = await fetcher.fetch_limited(channel_dict)
+        if fetcher.subscribed:
+            # Only the leading worker receives pushes
+            await fetcher.track_channel(channel_dict)
         
         await message.answer(
             f"✅ Канал {channel_username} успешно добавлен!\n\n"
@@ -160,7 +211,7 @@ async def cmd_add_channel(message: Message, repo: Repository, fetcher: TelegramF
 
 
 @router.message(Command("suggestions"))
-async def cmd_suggestions(message: Message, repo: Repository):
+async def cmd_suggestions(message: Message, repo: AsyncRepository):
     """Handle /suggestions command - list channel suggestions."""
     user_id = message.from_user.id
     
@@ -168,7 +219,7 @@ async def cmd_suggestions(message: Message, repo: Repository):
         await message.answer("⛔ У вас нет прав для использования этой команды.")
         return
     
-    suggestions = repo.get_suggestions()
+    suggestions = await repo.get_suggestions()
     
     if not suggestions:
         await message.answer("Предложенных каналов пока нет.")
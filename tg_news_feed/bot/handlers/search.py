@@ -0,0 +1,85 @@
+import logging
+from typing import Optional
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject
+
+from tg_news_feed.bot.formatting import format_posts, snippet_body
+from tg_news_feed.bot.keyboards import search_more_keyboard
+from tg_news_feed.storage.async_repo import AsyncRepository
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+SEARCH_PAGE_SIZE = 5
+
+
+async def send_results(
+    message: Message,
+    repo: AsyncRepository,
+    query: str,
+    offset: int,
+    query_id: Optional[int] = None
+):
+    """Send one page of search results.
+    
+    The "more" button carries the id of the stored query rather than the
+    query: it may not fit into callback data, and the tap may reach another
+    bot replica.
+    """
+    # Fetch one extra row to know whether there is a next page
+    results = await repo.search_posts(query, cursor=offset, limit=SEARCH_PAGE_SIZE + 1)
+    
+    if not results:
+        text = "Ничего не найдено." if offset == 0 else "Больше результатов нет."
+        await message.answer(text)
+        return
+    
+    keyboard = None
+    if len(results) > SEARCH_PAGE_SIZE:
+        results = results[:SEARCH_PAGE_SIZE]
+        if query_id is None:
+            query_id = await repo.get_search_query_id(query)
+        keyboard = search_more_keyboard(query_id, offset + SEARCH_PAGE_SIZE)
+    
+    await message.answer(
+        format_posts(results, body=snippet_body, date_format='%d.%m.%Y'),
+        parse_mode="HTML",
+        reply_markup=keyboard,
+        disable_web_page_preview=True
+    )
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, repo: AsyncRepository):
+    """Handle /search command - full-text search over posts."""
+    query = (command.args or "").strip()
+    
+    if not query:
+        await message.answer(
+            "⚠️ Укажите, что искать.\n"
+            "Пример: `/search нейросети`",
+            parse_mode="Markdown"
+        )
+        return
+    
+    await send_results(message, repo, query, 0)
+
+
+@router.callback_query(F.data.startswith("search:"))
+async def on_search_more(callback: CallbackQuery, repo: AsyncRepository):
+    """Handle the "more results" button."""
+    parts = callback.data.split(":")
+    query = None
+    if len(parts) == 3:
+        query_id, offset = int(parts[1]), int(parts[2])
+        query = await repo.get_search_query(query_id)
+    
+    if not query:
+        # Buttons of old messages outlive their stored queries
+        await callback.answer("Поиск устарел, повторите /search", show_alert=True)
+        return
+    
+    await callback.answer()
+    await send_results(callback.message, repo, query, offset, query_id)
@@ -0,0 +1,112 @@
+import logging
+from typing import Dict, List, Optional
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command
+
+from tg_news_feed.bot.formatting import format_posts
+from tg_news_feed.bot.keyboards import channels_keyboard, my_feed_keyboard, next_page_cursor, decode_cursor
+from tg_news_feed.bot.media import send_posts
+from tg_news_feed.storage.async_repo import AsyncRepository
+from tg_news_feed.storage.repo import PageCursor
+from tg_news_feed.storage.thumbnails import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+MY_FEED_PAGE_SIZE = 5
+
+
+async def get_channel_dicts(repo: AsyncRepository) -> List[Dict]:
+    channels = await repo.get_channels(active_only=True)
+    return [
+        {'id': channel.id, 'username': channel.username, 'title': channel.title}
+        for channel in channels
+    ]
+
+
+async def send_my_feed(
+    message: Message,
+    repo: AsyncRepository,
+    thumbnails: Optional[ThumbnailCache],
+    user_id: int,
+    cursor: Optional[PageCursor]
+):
+    """Send one page of the user's personal feed."""
+    posts = await repo.get_user_feed_page(user_id, cursor, MY_FEED_PAGE_SIZE)
+
+    if not posts:
+        text = "В ваших каналах пока нет постов." if cursor is None else "Больше постов нет."
+        await message.answer(text)
+        return
+
+    await send_posts(
+        message,
+        repo,
+        thumbnails,
+        posts,
+        format_posts,
+        reply_markup=my_feed_keyboard(next_page_cursor(posts, MY_FEED_PAGE_SIZE))
+    )
+
+
+@router.message(Command("channels"))
+async def cmd_channels(message: Message, repo: AsyncRepository):
+    """Handle /channels command - choose channels for the personal feed."""
+    channels = await get_channel_dicts(repo)
+
+    if not channels:
+        await message.answer("Каналов пока нет.")
+        return
+
+    followed = await repo.get_user_channel_ids(message.from_user.id)
+    await message.answer(
+        "Выберите каналы для своей ленты /myfeed.\n"
+        "Если не выбрать ни одного, лента покажет все каналы.",
+        reply_markup=channels_keyboard(channels, followed)
+    )
+
+
+@router.callback_query(F.data.startswith("sub:"))
+async def on_toggle_channel(callback: CallbackQuery, repo: AsyncRepository):
+    """Handle a channel button: follow or unfollow the channel."""
+    user_id = callback.from_user.id
+    _, channel_id, *page = callback.data.split(":")
+    channel_id = int(channel_id)
+    # Buttons sent before the list was paginated carry no page
+    page = int(page[0]) if page else 0
+
+    if await repo.unsubscribe_channel(user_id, channel_id):
+        await callback.answer("Канал убран из ленты")
+    else:
+        await repo.subscribe_channel(user_id, channel_id)
+        await callback.answer("Канал добавлен в ленту")
+
+    channels = await get_channel_dicts(repo)
+    followed = await repo.get_user_channel_ids(user_id)
+    await callback.message.edit_reply_markup(reply_markup=channels_keyboard(channels, followed, page))
+
+
+@router.callback_query(F.data.startswith("chpage:"))
+async def on_channels_page(callback: CallbackQuery, repo: AsyncRepository):
+    """Handle the channel list page buttons."""
+    page = int(callback.data.split(":")[1])
+    channels = await get_channel_dicts(repo)
+    followed = await repo.get_user_channel_ids(callback.from_user.id)
+    await callback.answer()
+    await callback.message.edit_reply_markup(reply_markup=channels_keyboard(channels, followed, page))
+
+
+@router.message(Command("myfeed"))
+async def cmd_my_feed(message: Message, repo: AsyncRepository, thumbnails: Optional[ThumbnailCache]):
+    """Handle /myfeed command - show posts from followed channels."""
+    await send_my_feed(message, repo, thumbnails, message.from_user.id, None)
+
+
+@router.callback_query(F.data.startswith("myfeed:"))
+async def on_my_feed_page(callback: CallbackQuery, repo: AsyncRepository, thumbnails: Optional[ThumbnailCache]):
+    """Handle the personal feed "next page" button."""
+    cursor = decode_cursor(callback.data.split(":", 1)[1])
+    await callback.answer()
+    await send_my_feed(callback.message, repo, thumbnails, callback.from_user.id, cursor)
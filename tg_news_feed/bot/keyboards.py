@@ -1,5 +1,10 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+EPOCH = datetime(1970, 1, 1)
+# Telegram rejects inline keyboards of more than about 100 buttons
+CHANNELS_PAGE_SIZE = 20
 
 
 def main_keyboard() -> ReplyKeyboardMarkup:
@@ -71,4 +76,83 @@ def pagination_keyboard(
         )
     
     keyboard.add(*buttons)
-    return keyboard 
\ No newline at end of file
+    return keyboard
+
+
+def encode_cursor(cursor: Tuple[datetime, int, int]) -> str:
+    """Pack a (datetime, channel_id, message_id) cursor into a short base36 token."""
+    moment, channel_id, message_id = cursor
+    micros = (moment.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+    return ".".join(_to_base36(value) for value in (micros, channel_id, message_id))
+
+
+def decode_cursor(token: str) -> Optional[Tuple[datetime, int, int]]:
+    """Unpack a token made by encode_cursor. Returns None for an empty or broken token."""
+    try:
+        micros, channel_id, message_id = (int(part, 36) for part in token.split("."))
+    except ValueError:
+        return None
+    return EPOCH + timedelta(microseconds=micros), channel_id, message_id
+
+
+def _to_base36(value: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        result = digits[remainder] + result
+        if not value:
+            return result
+
+
+def next_page_cursor(posts: List[Dict], limit: int, page_type: str = "feed") -> Optional[Tuple[datetime, int, int]]:
+    """Get the cursor of the page after `posts`, or None if this is the last page."""
+    if len(posts) < limit:
+        return None
+    last = posts[-1]
+    moment = last["saved_at"] if page_type == "saved" else last["date"]
+    return moment, last["channel_id"], last["message_id"]
+
+
+def search_more_keyboard(query_id: int, next_offset: int) -> InlineKeyboardMarkup:
+    """Create keyboard to show more results of a stored search query."""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="🔎 Ещё результаты", callback_data=f"search:{query_id}:{next_offset}")
+    ]])
+
+
+def channels_keyboard(channels: List[Dict], followed: Set[int], page: int = 0) -> InlineKeyboardMarkup:
+    """Create keyboard to follow or unfollow channels, one per row.
+
+    Shows CHANNELS_PAGE_SIZE channels per page with `chpage:<page>` buttons
+    to move between pages; channel buttons remember their page.
+    """
+    pages = max(1, -(-len(channels) // CHANNELS_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    rows = []
+    for channel in channels[page * CHANNELS_PAGE_SIZE:(page + 1) * CHANNELS_PAGE_SIZE]:
+        mark = "✅" if channel["id"] in followed else "➕"
+        rows.append([
+            InlineKeyboardButton(
+                text=f"{mark} {channel['title'] or '@' + channel['username']}",
+                callback_data=f"sub:{channel['id']}:{page}"
+            )
+        ])
+        
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"chpage:{page - 1}"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(text="➡️ Вперёд", callback_data=f"chpage:{page + 1}"))
+    if buttons:
+        rows.append(buttons)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def my_feed_keyboard(next_cursor: Optional[Tuple[datetime, int, int]]) -> Optional[InlineKeyboardMarkup]:
+    """Create keyboard to open the next page of the personal feed."""
+    if not next_cursor:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="➡️ Вперёд", callback_data=f"myfeed:{encode_cursor(next_cursor)}")
+    ]])
@@ -0,0 +1,103 @@
+import logging
+from typing import Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, InlineKeyboardMarkup, Message
+
+from tg_news_feed.storage.async_repo import AsyncRepository
+from tg_news_feed.storage.thumbnails import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+
+MEDIA_LABELS = {
+    "photo": "🖼 Фото",
+    "video": "🎬 Видео",
+    "animation": "🎞 GIF",
+    "audio": "🎵 Аудио",
+    "document": "📎 Файл",
+}
+
+
+def media_label(post: Dict) -> str:
+    """Describe a post's media for text previews, e.g. "🖼 Фото ×3, 🎬 Видео"."""
+    counts: Dict[str, int] = {}
+    for item in post.get('media') or []:
+        label = MEDIA_LABELS.get(item['type'], MEDIA_LABELS["document"])
+        counts[label] = counts.get(label, 0) + 1
+    return ", ".join(label if count == 1 else f"{label} ×{count}" for label, count in counts.items())
+
+
+def post_thumbnail(post: Dict) -> Optional[str]:
+    """Get the content hash of a post's first cached thumbnail."""
+    for item in post.get('media') or []:
+        if item.get('thumbnail'):
+            return item['thumbnail']
+    return None
+
+
+async def send_photo(
+    message: Message,
+    repo: AsyncRepository,
+    thumbnails: Optional[ThumbnailCache],
+    thumbnail: str,
+    file_id: Optional[str],
+    caption: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+) -> Optional[Message]:
+    """Send a thumbnail with a caption. Returns None if it is not available.
+
+    A thumbnail is uploaded from the cache once; later sends reuse the
+    file_id Telegram gave it.
+    """
+    if file_id:
+        try:
+            return await message.answer_photo(file_id, caption=caption, parse_mode="HTML", reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            # e.g. the bot token changed; upload the file again
+            logger.warning(f"Stored file_id of thumbnail {thumbnail} was rejected: {e}")
+
+    data = await thumbnails.get(thumbnail) if thumbnails is not None else None
+    if data is None:
+        return None
+    sent = await message.answer_photo(
+        BufferedInputFile(data, filename=f"{thumbnail[:16]}.jpg"),
+        caption=caption,
+        parse_mode="HTML",
+        reply_markup=reply_markup
+    )
+    await repo.set_media_file_id(thumbnail, sent.photo[-1].file_id)
+    return sent
+
+
+async def send_posts(
+    message: Message,
+    repo: AsyncRepository,
+    thumbnails: Optional[ThumbnailCache],
+    posts: List[Dict],
+    render: Callable[[List[Dict]], str],
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+):
+    """Send a page of posts rendered by `render`.
+
+    Posts with a thumbnail go out as photos with the post as the caption;
+    runs of other posts are sent as one text message, as before. The
+    keyboard is attached to the last message.
+    """
+    groups = []
+    for post in posts:
+        thumbnail = post_thumbnail(post)
+        if thumbnail is None and groups and groups[-1][0] is None:
+            groups[-1][1].append(post)
+        else:
+            groups.append((thumbnail, [post]))
+
+    hashes = [thumbnail for thumbnail, _ in groups if thumbnail]
+    file_ids = await repo.get_media_file_ids(hashes) if hashes else {}
+    for i, (thumbnail, group) in enumerate(groups):
+        markup = reply_markup if i == len(groups) - 1 else None
+        text = render(group)
+        if thumbnail is not None:
+            sent = await send_photo(message, repo, thumbnails, thumbnail, file_ids.get(thumbnail), text, markup)
+            if sent is not None:
+                continue
+        await message.answer(text, parse_mode="HTML", reply_markup=markup, disable_web_page_preview=True)
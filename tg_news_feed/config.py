@@ -1,5 +1,6 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -15,12 +16,116 @@ class Settings(BaseSettings):
     
     # Database configuration
     DB_PATH: str = "db.sqlite"
+    DB_EXECUTOR_WORKERS: int = 4
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    
+    # SQLite tuning applied to every connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
+    SQLITE_CACHE_SIZE: int = -65536  # negative means KiB, i.e. 64 MB per connection
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    
+    # Feed page cache
+    FEED_CACHE_PAGES: int = 50
+    FEED_CACHE_TTL_SECONDS: int = 600
+    # How often cached pages are checked against writes of other processes
+    FEED_CACHE_SYNC_SECONDS: float = 1.0
+    
+    # Personal feeds merge per-channel timelines up to this many followed
+    # channels and filter the global feed above it
+    FEED_FANOUT_MAX_CHANNELS: int = 50
+    
+    # How often new users and last-seen times are written to the database
+    USER_FLUSH_SECONDS: float = 5.0
+    
+    # Repeated save/delete taps on the same post within this window are ignored
+    CALLBACK_DEBOUNCE_SECONDS: float = 1.0
+    
+    # Search queries behind "more results" buttons are kept this long after
+    # their last use
+    SEARCH_QUERY_TTL_HOURS: int = 24
+    
+    # How often /stats counters are recounted from the tables
+    COUNTERS_RECONCILE_HOURS: int = 24
+    
+    # Retention: 0 disables a limit. RETENTION_CHANNEL_DAYS overrides the age
+    # limit per channel username, e.g. {"some_channel": 30}
+    RETENTION_DAYS: int = 0
+    RETENTION_CHANNEL_DAYS: Dict[str, int] = {}
+    RETENTION_MAX_POSTS_PER_CHANNEL: int = 0
+    RETENTION_INTERVAL_HOURS: int = 6
+    RETENTION_BATCH_SIZE: int = 500
+    RETENTION_BATCH_PAUSE_SECONDS: float = 0.1
+    RETENTION_VACUUM_PAGES: int = 0  # pages to free per run, 0 means all
     
     # Feedback form URL
     FEEDBACK_FORM: str
     
-    # Parser settings
+    # Process role: "all" runs the bot and the parser, "bot" only serves users
+    # and "worker" only ingests posts. Workers elect one leader through a
+    # lease in the shared database; only it runs the scheduled jobs and
+    # receives pushed posts.
+    ROLE: Literal["all", "bot", "worker"] = "all"
+    LEADER_LEASE_SECONDS: int = 60
+    LEADER_HEARTBEAT_SECONDS: int = 15
+    
+    # Webhook mode: Telegram sends updates to WEBHOOK_URL + "/webhook"
+    # instead of the bot polling for them. Only one process may poll a bot
+    # token, so ROLE=bot replicas require it.
+    WEBHOOK_URL: Optional[str] = None
+    WEBHOOK_SECRET: Optional[str] = None
+    
+    # Telegram sessions used for fetching; channels are spread across them
+    TELEGRAM_SESSIONS: List[str] = ["bot_session"]
+    
+    # Parser settings (concurrency and rate limits apply per session)
     PARSER_INTERVAL_MINUTES: int = 5
+    PARSER_MAX_MESSAGES_PER_FETCH: int = 500
+    PARSER_CONCURRENCY: int = 5
+    PARSER_RATE_PER_SECOND: float = 2.0
+    PARSER_RATE_BURST: int = 5
+    PARSER_FETCH_TIMEOUT_SECONDS: int = 60
+    # FloodWaits up to this many seconds are slept through inside Telethon,
+    # holding the fetch slot; longer ones go to the per-channel backoff and
+    # move the session's channels to other sessions. 0 sends every FloodWait
+    # to the backoff.
+    PARSER_FLOOD_SLEEP_THRESHOLD: int = 0
+    
+    # Push mode: stream new posts as they arrive and poll only to fill gaps
+    PARSER_PUSH_MODE: bool = False
+    PARSER_RECONCILE_INTERVAL_MINUTES: int = 60
+    
+    # Ingest pipeline: fetched and pushed messages wait in queues of up to
+    # PARSER_QUEUE_SIZE items and are written in batches
+    PARSER_QUEUE_SIZE: int = 1000
+    PARSER_WRITE_BATCH_SIZE: int = 100
+    PARSER_WRITE_FLUSH_SECONDS: float = 2.0
+    
+    # Media: thumbnails of photo and video posts are downloaded once into a
+    # content-addressed cache on disk, trimmed to MEDIA_CACHE_MAX_MB by
+    # evicting the least recently used files
+    MEDIA_THUMBNAILS: bool = True
+    MEDIA_CACHE_DIR: str = "media_cache"
+    MEDIA_CACHE_MAX_MB: int = 512
+    MEDIA_THUMB_MAX_SIDE: int = 320
+    
+    # Near-duplicate detection: posts whose text overlaps a recent post by at
+    # least DEDUP_THRESHOLD (Jaccard over word pairs) are hidden from the feed
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.7
+    DEDUP_MIN_WORDS: int = 8
+    DEDUP_WINDOW_HOURS: int = 72
+    DEDUP_INDEX_SIZE: int = 100000
+    
+    @model_validator(mode="after")
+    def check_role(self) -> "Settings":
+        if self.ROLE == "bot" and not self.WEBHOOK_URL:
+            raise ValueError("ROLE=bot requires WEBHOOK_URL: several replicas cannot poll one bot token")
+        return self
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from tg_news_feed.storage.async_repo import AsyncRepository
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """Leader election between processes sharing the database.
+
+    Every process keeps trying to take the named lease; the holder renews it
+    every `heartbeat` seconds. If the holder dies, the lease expires after
+    `ttl` seconds and another process takes over. A holder that cannot renew
+    in time stops considering itself the leader before the lease can pass on.
+
+    `on_acquire` and `on_lose` are awaited when this process becomes the
+    leader and when it stops being one, including when the lease runs out
+    because renewals kept failing.
+    """
+
+    def __init__(
+        self,
+        repo: AsyncRepository,
+        name: str,
+        holder: str,
+        ttl: float,
+        heartbeat: float,
+        on_acquire: Optional[Callable[[], Awaitable[None]]] = None,
+        on_lose: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        if heartbeat >= ttl:
+            raise ValueError("Lease heartbeat must be shorter than its ttl")
+        self.repo = repo
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_acquire = on_acquire
+        self.on_lose = on_lose
+        self.valid_until = 0.0
+        # Whether on_acquire ran without a matching on_lose yet
+        self.leading = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Check whether this process holds the lease right now."""
+        return time.monotonic() < self.valid_until
+
+    async def start(self):
+        """Try to take the lease and keep competing for it in the background."""
+        await self._renew()
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop renewing and hand the lease over right away."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        held = self.is_leader
+        self.valid_until = 0.0
+        if self.leading:
+            self.leading = False
+            await self._notify(self.on_lose)
+        if held:
+            await self.repo.release_lease(self.name, self.holder)
+
+    async def _run(self):
+        while True:
+            # Wake up when the lease runs out, so a leader whose renewals
+            # fail steps down as soon as another process may take over
+            delay = self.heartbeat
+            if self.leading:
+                delay = min(delay, max(0.0, self.valid_until - time.monotonic()))
+            await asyncio.sleep(delay)
+            await self._renew()
+
+    async def _renew(self):
+        started = time.monotonic()
+        try:
+            acquired = await self.repo.acquire_lease(self.name, self.holder, self.ttl)
+        except Exception as e:
+            logger.error(f"Error renewing lease {self.name}: {e}")
+        else:
+            # Count from before the write, so we never outlive the stored lease
+            self.valid_until = started + self.ttl if acquired else 0.0
+
+        if self.is_leader and not self.leading:
+            self.leading = True
+            logger.info(f"{self.holder} became the leader for {self.name}")
+            await self._notify(self.on_acquire)
+        elif self.leading and not self.is_leader:
+            self.leading = False
+            logger.warning(f"{self.holder} lost the lease {self.name}")
+            await self._notify(self.on_lose)
+
+    async def _notify(self, callback: Optional[Callable[[], Awaitable[None]]]):
+        if callback is None:
+            return
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"Error handling a change of lease {self.name}: {e}")
@@ -11,10 +11,15 @@ from aiogram.enums import ParseMode
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from tg_news_feed.config import config
-from tg_news_feed.storage.repo import Repository
+from tg_news_feed.storage.async_repo import AsyncRepository
+from tg_news_feed.storage.thumbnails import create_thumbnail_cache
+from tg_news_feed.storage.users import UserTracker
 from tg_news_feed.parser.fetcher import TelegramFetcher
 from tg_news_feed.scheduler import UpdateScheduler
-from tg_news_feed.bot.handlers import user, admin
+from tg_news_feed.lease import LeaderLease
+from tg_news_feed.metrics import metrics_handler, monitor_loop_lag, time_handler
+from tg_news_feed.bot.handlers import user, admin, search, subscriptions
+from tg_news_feed.bot.debounce import PostCallbackDebounce
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +40,7 @@ async def health_check(request):
     return web.Response(text='OK', status=200)
 
 app.router.add_get('/health', health_check)
+app.router.add_get('/metrics', metrics_handler)
 
 async def main():
     """Main function to start the bot."""
@@ -45,60 +51,124 @@ async def main():
     logger.info(f"Starting bot on {hostname} (ID: {server_id}) - Platform: {platform.platform()}")
     
     # Initialize repository and create tables
-    repo = Repository()
-    repo.create_tables()
+    repo = AsyncRepository()
+    await repo.create_tables()
     logger.info("Database initialized")
     
-    # Initialize Telegram client for parsing
-    fetcher = TelegramFetcher(repo)
-    await fetcher.start()
-    logger.info("Telegram fetcher initialized")
+    loop_lag_task = asyncio.create_task(monitor_loop_lag())
     
-    # Initialize scheduler
-    scheduler = UpdateScheduler(fetcher)
-    scheduler.start()
-    logger.info("Scheduler started")
+    # Post thumbnails: written by the fetcher, uploaded to users by the bot
+    thumbnails = create_thumbnail_cache()
     
-    # Initialize bot and dispatcher
-    bot = Bot(token=config.BOT_TOKEN, parse_mode=ParseMode.HTML)
-    dp = Dispatcher(storage=MemoryStorage())
+    # ROLE splits ingest workers from bot replicas; "all" runs both here
+    run_bot = config.ROLE in ("all", "bot")
+    run_ingest = config.ROLE in ("all", "worker")
     
-    # Register handlers
-    dp.include_router(user.router)
-    dp.include_router(admin.router)
-    
-    # Register middleware
-    async def middleware_handler(handler, event, data):
-        data["repo"] = repo
-        data["fetcher"] = fetcher
-        return await handler(event, data)
-    
-    dp.message.middleware(middleware_handler)
-    dp.callback_query.middleware(middleware_handler)
-    
-    # Set up webhook handler
-    webhook_handler = SimpleRequestHandler(
-        dispatcher=dp,
-        bot=bot,
-    )
-    webhook_handler.register(app, path='/webhook')
+    fetcher = None
+    scheduler = None
+    lease = None
+    if run_ingest:
+        # Initialize Telegram client for parsing
+        fetcher = TelegramFetcher(repo, thumbnails=thumbnails)
+        await fetcher.start()
+        logger.info("Telegram fetcher initialized")
+        
+        # Only the process holding the lease runs the scheduled jobs, push
+        # ingest and duplicate detection
+        lease = LeaderLease(
+            repo,
+            "scheduler",
+            holder=f"{hostname}:{server_id}",
+            ttl=config.LEADER_LEASE_SECONDS,
+            heartbeat=config.LEADER_HEARTBEAT_SECONDS,
+            on_acquire=fetcher.lead,
+            on_lose=fetcher.step_down
+        )
+        await lease.start()
+        
+        # Initialize scheduler
+        scheduler = UpdateScheduler(fetcher, lease)
+        scheduler.start()
+        logger.info("Scheduler started")
     
     # Start health check endpoint
     runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 8080)
-    await site.start()
-    logger.info("Health check endpoint started on port 8080")
     
-    # Start polling
+    users = None
     try:
-        logger.info(f"Bot started on {hostname} (ID: {server_id})")
-        await dp.start_polling(bot)
+        if run_bot:
+            # Track users in memory and write their activity behind the hot path
+            users = UserTracker(repo, flush_interval=config.USER_FLUSH_SECONDS)
+            await users.start()
+            
+            # Initialize bot and dispatcher
+            bot = Bot(token=config.BOT_TOKEN, parse_mode=ParseMode.HTML)
+            dp = Dispatcher(storage=MemoryStorage())
+            
+            # Register handlers
+            dp.include_router(user.router)
+            dp.include_router(admin.router)
+            dp.include_router(search.router)
+            dp.include_router(subscriptions.router)
+            
+            # Register middleware
+            async def middleware_handler(handler, event, data):
+                if event.from_user:
+                    users.touch(event.from_user.id)
+                data["repo"] = repo
+                data["fetcher"] = fetcher
+                data["thumbnails"] = thumbnails
+                data["users"] = users
+                return await handler(event, data)
+            
+            dp.message.outer_middleware(time_handler)
+            dp.callback_query.outer_middleware(time_handler)
+            dp.message.middleware(middleware_handler)
+            dp.callback_query.middleware(middleware_handler)
+            dp.callback_query.middleware(PostCallbackDebounce(window=config.CALLBACK_DEBOUNCE_SECONDS))
+            
+            # Set up webhook handler
+            webhook_handler = SimpleRequestHandler(
+                dispatcher=dp,
+                bot=bot,
+                secret_token=config.WEBHOOK_SECRET,
+            )
+            webhook_handler.register(app, path='/webhook')
+        
+        await runner.setup()
+        site = web.TCPSite(runner, '0.0.0.0', 8080)
+        await site.start()
+        logger.info("Health check and metrics endpoints started on port 8080")
+        
+        if run_bot and config.WEBHOOK_URL:
+            # Every replica serves /webhook; Telegram spreads updates over them
+            await bot.set_webhook(
+                f"{config.WEBHOOK_URL.rstrip('/')}/webhook",
+                secret_token=config.WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"Bot started on {hostname} (ID: {server_id}) in webhook mode")
+            await asyncio.Event().wait()
+        elif run_bot:
+            # Start polling
+            logger.info(f"Bot started on {hostname} (ID: {server_id})")
+            await dp.start_polling(bot)
+        else:
+            logger.info(f"Ingest worker started on {hostname} (ID: {server_id})")
+            await asyncio.Event().wait()
     finally:
         logger.info(f"Stopping bot on {hostname} (ID: {server_id})")
-        await fetcher.stop()
-        scheduler.stop()
+        if scheduler:
+            scheduler.stop()
+        if lease:
+            await lease.stop()
+        if fetcher:
+            await fetcher.stop()
         await runner.cleanup()
+        if users:
+            await users.stop()
+        loop_lag_task.cancel()
+        repo.close()
 
 if __name__ == "__main__":
     try:
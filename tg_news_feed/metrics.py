@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram.types import CallbackQuery, Message
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Parser
+FETCH_SECONDS = Histogram(
+    "tgfeed_fetch_seconds", "Time to fetch and store one channel", ["channel"]
+)
+FETCH_NEW_POSTS = Counter(
+    "tgfeed_fetch_new_posts_total", "New posts stored per channel", ["channel"]
+)
+FLOOD_WAIT_SECONDS = Counter(
+    "tgfeed_flood_wait_seconds_total", "Seconds of FloodWait requested by Telegram", ["session"]
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "tgfeed_ingest_queue_depth", "Items waiting in an ingest pipeline queue", ["stage"]
+)
+INGEST_BATCH_ROWS = Histogram(
+    "tgfeed_ingest_batch_rows",
+    "Rows stored per channel in one ingest transaction",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+# Storage
+REPO_SECONDS = Histogram(
+    "tgfeed_repo_seconds",
+    "Repository method latency on the database thread",
+    ["method"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+# Bot
+HANDLER_SECONDS = Histogram(
+    "tgfeed_handler_seconds", "Bot handler latency per command or callback", ["handler"]
+)
+LOOP_LAG_SECONDS = Gauge(
+    "tgfeed_event_loop_lag_seconds", "How late the event loop ran a scheduled wakeup"
+)
+
+# Scheduler
+SCHEDULER_CYCLE_SECONDS = Histogram(
+    "tgfeed_scheduler_cycle_seconds",
+    "Duration of scheduled jobs",
+    ["job"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+SCHEDULER_OVERRUNS = Counter(
+    "tgfeed_scheduler_overruns_total", "Scheduled runs that outlasted their interval or were skipped", ["job"]
+)
+
+
+# Commands labeled by name; anything else users type is "/other"
+COMMANDS = {
+    "/start", "/feed", "/saved", "/help", "/suggest", "/search", "/channels",
+    "/myfeed", "/stats", "/server", "/addchannel", "/suggestions",
+}
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Expose all metrics in the Prometheus text format."""
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+async def monitor_loop_lag(interval: float = 1.0):
+    """Measure event loop lag until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.set(max(0.0, loop.time() - started - interval))
+
+
+def handler_label(event: Any) -> str:
+    """Name an update for the handler latency metric.
+
+    Commands are labeled by the command, callbacks by the prefix of their
+    data, so the number of label values stays bounded.
+    """
+    if isinstance(event, CallbackQuery):
+        return "callback:" + (event.data or "").split(":", 1)[0]
+    if isinstance(event, Message) and event.text and event.text.startswith("/"):
+        command = event.text.split(maxsplit=1)[0].split("@", 1)[0]
+        return command if command in COMMANDS else "/other"
+    return "message"
+
+
+async def time_handler(
+    handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+    event: Any,
+    data: Dict[str, Any]
+) -> Any:
+    """Middleware that records handler latency."""
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        HANDLER_SECONDS.labels(handler_label(event)).observe(time.perf_counter() - started)
@@ -0,0 +1,29 @@
+"""Add resolved Telegram peer to channels
+
+Revision ID: 09
+Revises: 08
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '09'
+down_revision = '08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Filled in by the parser on the next fetch of each channel
+    op.add_column('channels', sa.Column('tg_id', sa.Integer(), nullable=True))
+    op.add_column('channels', sa.Column('access_hash', sa.Integer(), nullable=True))
+    op.add_column('channels', sa.Column('peer_session', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('channels', 'peer_session')
+    op.drop_column('channels', 'access_hash')
+    op.drop_column('channels', 'tg_id')
@@ -0,0 +1,37 @@
+"""Add channel_state table with per-channel fetch cursors
+
+Revision ID: 02
+Revises: 01
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '02'
+down_revision = '01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create channel_state table
+    op.create_table('channel_state',
+        sa.Column('channel_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['channel_id'], ['channels.id'], ),
+        sa.PrimaryKeyConstraint('channel_id')
+    )
+
+    # Seed cursors from the posts we already have
+    op.execute(
+        "INSERT INTO channel_state (channel_id, last_message_id, updated_at) "
+        "SELECT channel_id, MAX(message_id), CURRENT_TIMESTAMP FROM posts GROUP BY channel_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('channel_state')
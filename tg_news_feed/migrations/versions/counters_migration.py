@@ -0,0 +1,39 @@
+"""Add counters table for incrementally maintained stats
+
+Revision ID: 05
+Revises: 04
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '05'
+down_revision = '04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create counters table
+    op.create_table('counters',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # Seed the counters from the existing data
+    op.execute(
+        "INSERT INTO counters (name, value) "
+        "SELECT 'users', COUNT(*) FROM users "
+        "UNION ALL SELECT 'posts', COUNT(*) FROM posts "
+        "UNION ALL SELECT 'channels', COUNT(*) FROM channels "
+        "UNION ALL SELECT 'saved_posts', COUNT(*) FROM saved_posts "
+        "UNION ALL SELECT 'posts:' || channel_id, COUNT(*) FROM posts GROUP BY channel_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('counters')
@@ -0,0 +1,43 @@
+"""Add indexes for the feed, saved posts and suggestions queries
+
+Revision ID: 03
+Revises: 02
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '03'
+down_revision = '02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_posts_feed',
+        'posts',
+        [sa.text('date DESC'), sa.text('channel_id DESC'), sa.text('message_id DESC')]
+    )
+    op.create_index(
+        'ix_saved_posts_user_saved_at',
+        'saved_posts',
+        ['user_id', sa.text('saved_at DESC'), sa.text('channel_id DESC'), sa.text('message_id DESC')]
+    )
+    op.create_index('ix_suggestions_created_at', 'suggestions', ['created_at'])
+
+    # Rows saved with SQLite's CURRENT_TIMESTAMP lack microseconds; store them in
+    # the same format SQLAlchemy uses so saved_at compares correctly in cursors
+    op.execute(
+        "UPDATE saved_posts SET saved_at = strftime('%Y-%m-%d %H:%M:%f000', saved_at) "
+        "WHERE length(saved_at) = 19"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_suggestions_created_at', table_name='suggestions')
+    op.drop_index('ix_saved_posts_user_saved_at', table_name='saved_posts')
+    op.drop_index('ix_posts_feed', table_name='posts')
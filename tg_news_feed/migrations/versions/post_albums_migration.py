@@ -0,0 +1,33 @@
+"""Add album ids to posts
+
+Revision ID: 12
+Revises: 11
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '12'
+down_revision = '11'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Albums stored before this revision stay split into separate posts
+    op.add_column('posts', sa.Column('grouped_id', sa.Integer(), nullable=True))
+    op.create_index(
+        'ix_posts_channel_grouped',
+        'posts',
+        ['channel_id', 'grouped_id'],
+        sqlite_where=sa.text('grouped_id IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_channel_grouped', table_name='posts')
+    # Plain DROP COLUMN keeps the full-text triggers on posts intact
+    op.drop_column('posts', 'grouped_id')
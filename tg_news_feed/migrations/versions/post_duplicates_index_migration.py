@@ -0,0 +1,29 @@
+"""Index posts by the cluster representative they duplicate
+
+Revision ID: 13
+Revises: 12
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '13'
+down_revision = '12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_posts_duplicate_of',
+        'posts',
+        ['duplicate_of_channel_id', 'duplicate_of_message_id'],
+        sqlite_where=sa.text('duplicate_of_channel_id IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_duplicate_of', table_name='posts')
@@ -0,0 +1,30 @@
+"""Add near-duplicate columns to posts
+
+Revision ID: 07
+Revises: 06
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '07'
+down_revision = '06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing posts stay representatives; only new posts are fingerprinted
+    op.add_column('posts', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+    op.add_column('posts', sa.Column('duplicate_of_channel_id', sa.Integer(), nullable=True))
+    op.add_column('posts', sa.Column('duplicate_of_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    # Plain DROP COLUMN keeps the full-text triggers on posts intact
+    op.drop_column('posts', 'duplicate_of_message_id')
+    op.drop_column('posts', 'duplicate_of_channel_id')
+    op.drop_column('posts', 'minhash')
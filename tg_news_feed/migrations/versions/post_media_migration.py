@@ -0,0 +1,33 @@
+"""Add media to posts and uploaded thumbnail file_ids
+
+Revision ID: 11
+Revises: 10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '11'
+down_revision = '10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('media', sa.JSON(none_as_null=True), nullable=True))
+    op.create_table(
+        'media_files',
+        sa.Column('thumbnail', sa.String(), nullable=False),
+        sa.Column('file_id', sa.String(), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('thumbnail')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('media_files')
+    # Plain DROP COLUMN keeps the full-text triggers on posts intact
+    op.drop_column('posts', 'media')
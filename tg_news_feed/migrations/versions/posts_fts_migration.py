@@ -0,0 +1,48 @@
+"""Add FTS5 full-text index over posts
+
+Revision ID: 06
+Revises: 05
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '06'
+down_revision = '05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # External-content FTS5 table reading text from posts by rowid
+    op.execute(
+        "CREATE VIRTUAL TABLE posts_fts USING fts5("
+        "text, content='posts', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+    )
+
+    # Keep the index in sync with posts
+    op.execute(
+        "CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN "
+        "INSERT INTO posts_fts(rowid, text) VALUES (new.rowid, new.text); END"
+    )
+    op.execute(
+        "CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.rowid, old.text); END"
+    )
+    op.execute(
+        "CREATE TRIGGER posts_fts_update AFTER UPDATE OF text ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.rowid, old.text); "
+        "INSERT INTO posts_fts(rowid, text) VALUES (new.rowid, new.text); END"
+    )
+
+    # Index the posts we already have
+    op.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER posts_fts_update")
+    op.execute("DROP TRIGGER posts_fts_delete")
+    op.execute("DROP TRIGGER posts_fts_insert")
+    op.execute("DROP TABLE posts_fts")
@@ -0,0 +1,31 @@
+"""Store search queries for the "more results" buttons
+
+Revision ID: 14
+Revises: 13
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '14'
+down_revision = '13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'search_queries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('query')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('search_queries')
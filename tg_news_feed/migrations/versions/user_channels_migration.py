@@ -0,0 +1,40 @@
+"""Add user channel subscriptions
+
+Revision ID: 08
+Revises: 07
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '08'
+down_revision = '07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_channels',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('channel_id', sa.Integer(), nullable=False),
+        sa.Column('added_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+        sa.ForeignKeyConstraint(['channel_id'], ['channels.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'channel_id')
+    )
+
+    # Per-channel timelines merged into personal feeds
+    op.create_index(
+        'ix_posts_channel_date',
+        'posts',
+        ['channel_id', sa.text('date DESC'), sa.text('message_id DESC')]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_channel_date', table_name='posts')
+    op.drop_table('user_channels')
@@ -0,0 +1,42 @@
+import time
+from typing import Dict
+
+
+class BackoffSchedule:
+    """Per-channel "not before" times set by FloodWait errors.
+
+    Channels in backoff are skipped by regular update cycles and retried
+    on their own once the wait requested by Telegram has passed.
+    """
+
+    def __init__(self):
+        self.not_before: Dict[int, float] = {}
+
+    def defer(self, channel_id: int, seconds: float) -> float:
+        """Hold a channel back for at least `seconds`. Returns the delay in effect."""
+        until = max(self.not_before.get(channel_id, 0), time.monotonic() + seconds)
+        self.not_before[channel_id] = until
+        return until - time.monotonic()
+
+    def delay(self, channel_id: int) -> float:
+        """Seconds left until the channel may be fetched again."""
+        until = self.not_before.get(channel_id)
+        if until is None:
+            return 0
+        return max(0, until - time.monotonic())
+
+    def is_ready(self, channel_id: int) -> bool:
+        """Check whether a channel may be fetched now."""
+        return self.delay(channel_id) == 0
+
+    def clear(self, channel_id: int):
+        """Forget the backoff of a channel after a successful fetch."""
+        self.not_before.pop(channel_id, None)
+
+    def state(self) -> Dict[int, float]:
+        """Get remaining backoff seconds for every channel still waiting."""
+        return {
+            channel_id: delay
+            for channel_id, delay in ((cid, self.delay(cid)) for cid in list(self.not_before))
+            if delay > 0
+        }
@@ -0,0 +1,121 @@
+import re
+import struct
+from collections import OrderedDict, defaultdict
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+
+PostKey = Tuple[int, int]  # (channel_id, message_id)
+
+WORD_RE = re.compile(r"\w+")
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+# Each salted 64-byte BLAKE2b digest yields 16 independent 32-bit hashes
+SALTS = [bytes([i]) * 16 for i in range(NUM_PERM // 16)]
+SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+BAND_SIZE = ROWS * 4
+
+
+def minhash(text: str, min_words: int = 8) -> Optional[bytes]:
+    """Compute a packed MinHash signature over word bigrams of `text`.
+
+    Returns None for texts shorter than `min_words` words, which are too
+    short to be told apart reliably.
+    """
+    words = WORD_RE.findall(text.lower())
+    if len(words) < min_words:
+        return None
+
+    features = {f"{a} {b}".encode() for a, b in zip(words, words[1:])}
+    hashes = [
+        SIGNATURE.unpack(b"".join(blake2b(feature, digest_size=64, salt=salt).digest() for salt in SALTS))
+        for feature in features
+    ]
+    return SIGNATURE.pack(*map(min, zip(*hashes)))
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(SIGNATURE.unpack(a), SIGNATURE.unpack(b))) / NUM_PERM
+
+
+class DuplicateDetector:
+    """Near-duplicate detection over recent posts with MinHash LSH.
+
+    Signatures are split into 8 bands of 4 hashes, and each band maps to the
+    posts that share it. Posts with Jaccard similarity of 0.8 collide in at
+    least one band with ~98% probability, so a lookup compares only a handful
+    of candidates. The oldest signatures are evicted beyond `max_size`.
+    """
+
+    def __init__(self, threshold: float = 0.7, max_size: int = 100000, min_words: int = 8):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.min_words = min_words
+        self.signatures: "OrderedDict[PostKey, bytes]" = OrderedDict()
+        self.buckets: List[Dict[bytes, List[PostKey]]] = [defaultdict(list) for _ in range(BANDS)]
+
+    def _bands(self, signature: bytes):
+        for band in range(BANDS):
+            yield band, signature[band * BAND_SIZE:(band + 1) * BAND_SIZE]
+
+    def find(self, signature: bytes) -> Optional[PostKey]:
+        """Get the most similar known post, if it is above the threshold."""
+        best, best_score = None, self.threshold
+        seen = set()
+        for band, value in self._bands(signature):
+            for key in self.buckets[band].get(value, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(signature, self.signatures[key])
+                if score >= best_score:
+                    best, best_score = key, score
+        return best
+
+    def add(self, key: PostKey, signature: bytes):
+        """Index a post as the representative of its cluster."""
+        if key in self.signatures:
+            return
+        self.signatures[key] = signature
+        for band, value in self._bands(signature):
+            self.buckets[band][value].append(key)
+        while len(self.signatures) > self.max_size:
+            self._evict_oldest()
+
+    def remove(self, key: PostKey):
+        """Forget a post, e.g. after it was pruned."""
+        signature = self.signatures.pop(key, None)
+        if signature is not None:
+            self._unindex(key, signature)
+
+    def _evict_oldest(self):
+        key, signature = self.signatures.popitem(last=False)
+        self._unindex(key, signature)
+
+    def _unindex(self, key: PostKey, signature: bytes):
+        for band, value in self._bands(signature):
+            bucket = self.buckets[band][value]
+            bucket.remove(key)
+            if not bucket:
+                del self.buckets[band][value]
+
+    def classify(self, channel_id: int, row: Dict):
+        """Fingerprint a post row and mark it if it duplicates a known post.
+
+        Sets `minhash`, `duplicate_of_channel_id` and `duplicate_of_message_id`
+        on the row. Posts that are not duplicates become cluster representatives.
+        """
+        signature = minhash(row["text"] or "", self.min_words)
+        row["minhash"] = signature
+        row["duplicate_of_channel_id"] = None
+        row["duplicate_of_message_id"] = None
+        if signature is None:
+            return
+
+        key = (channel_id, row["message_id"])
+        original = self.find(signature)
+        if original is not None and original != key:
+            row["duplicate_of_channel_id"], row["duplicate_of_message_id"] = original
+        else:
+            self.add(key, signature)
@@ -1,92 +1,416 @@
 import asyncio
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Set
 
-from telethon import TelegramClient
-from telethon.errors import FloodWaitError, ChannelPrivateError
-from telethon.tl.types import Message
+from telethon import events, utils
+from telethon.errors import FloodWaitError, ChannelPrivateError, ChannelInvalidError, PeerIdInvalidError
+from telethon.tl.types import Message, InputPeerChannel, PeerChannel
 
 from tg_news_feed.config import config
-from tg_news_feed.storage.repo import Repository
+from tg_news_feed.metrics import FETCH_SECONDS, FETCH_NEW_POSTS, FLOOD_WAIT_SECONDS
+from tg_news_feed.parser.backoff import BackoffSchedule
+from tg_news_feed.parser.dedup import DuplicateDetector
+from tg_news_feed.parser.media import ThumbnailDownloader, media_info, media_object
+from tg_news_feed.parser.pipeline import IngestPipeline
+from tg_news_feed.parser.pool import ClientPool, PooledClient, create_client_pool
+from tg_news_feed.storage.async_repo import AsyncRepository
+from tg_news_feed.storage.models import Channel
+from tg_news_feed.storage.thumbnails import ThumbnailCache, create_thumbnail_cache
 
 logger = logging.getLogger(__name__)
 
 
 class TelegramFetcher:
-    def __init__(self, repo: Repository):
+    def __init__(
+        self,
+        repo: AsyncRepository,
+        pool: Optional[ClientPool] = None,
+        thumbnails: Optional[ThumbnailCache] = None
+    ):
         self.repo = repo
-        self.client = TelegramClient(
-            'bot_session',
-            config.API_ID,
-            config.API_HASH
-        )
+        # Telegram accounts sharing the fetches, each with its own concurrency,
+        # rate limit and FloodWait state; push updates use the primary one
+        self.pool = pool or create_client_pool()
+        self.client = self.pool.primary.client
         self.running = False
+        # Last fetched message_id per channel, loaded lazily from channel_state
+        self.cursors: Optional[Dict[int, int]] = None
+        # FloodWait backoff and the pending retries it scheduled
+        self.backoff = BackoffSchedule()
+        self.retry_handles: Dict[int, asyncio.TimerHandle] = {}
+        self.retry_tasks: Set[asyncio.Task] = set()
+        self.in_flight: Set[int] = set()
+        # Push mode: channels tracked by Telegram peer id
+        self.peers: Dict[int, Dict] = {}
+        self.subscribed = False
+        # Fetched and pushed messages are normalized and written in batches
+        self.pipeline = IngestPipeline(
+            repo,
+            normalize=self._normalize,
+            queue_size=config.PARSER_QUEUE_SIZE,
+            max_batch=config.PARSER_WRITE_BATCH_SIZE,
+            flush_interval=config.PARSER_WRITE_FLUSH_SECONDS,
+            classify=self._classify,
+            on_flush=self._advance_cursor,
+            on_stored=self._index_stored,
+            on_write_failed=self._unindex_unstored
+        )
+        # Thumbnails of media posts, fetched through the session that saw them.
+        # They are downloaded beside the fetches, so they don't count against
+        # the fetch timeout; a full queue skips thumbnails rather than
+        # holding up ingest.
+        thumbnails = thumbnails or create_thumbnail_cache()
+        self.thumbnails: Optional[ThumbnailDownloader] = None
+        if thumbnails is not None:
+            self.thumbnails = ThumbnailDownloader(thumbnails, config.MEDIA_THUMB_MAX_SIDE)
+        self.thumbnail_jobs: asyncio.Queue = asyncio.Queue(maxsize=config.PARSER_QUEUE_SIZE)
+        self.thumbnail_tasks: List[asyncio.Task] = []
+        # Near-duplicate detection over recently ingested posts; only the
+        # leader ingests, so the index is built when it takes over
+        self.dedup: Optional[DuplicateDetector] = None
         
     async def start(self):
-        """Start the Telegram client."""
-        await self.client.start()
+        """Start the Telegram clients."""
+        await self.pool.start()
+        self.pipeline.start()
+        if self.thumbnails is not None and not self.thumbnail_tasks:
+            self.thumbnail_tasks = [
+                asyncio.create_task(self._thumbnail_loop())
+                for _ in range(config.PARSER_CONCURRENCY)
+            ]
         logger.info("Telegram client started")
         
+    async def lead(self):
+        """Take over ingest: warm the duplicate index and subscribe to pushes."""
+        if config.DEDUP_ENABLED:
+            # Another worker may have ingested meanwhile, so start afresh
+            self.dedup = DuplicateDetector(
+                threshold=config.DEDUP_THRESHOLD,
+                max_size=config.DEDUP_INDEX_SIZE,
+                min_words=config.DEDUP_MIN_WORDS
+            )
+            await self._load_signatures()
+        if config.PARSER_PUSH_MODE:
+            await self.subscribe()
+            
+    async def step_down(self):
+        """Stop push ingest and drop the duplicate index after losing the lease."""
+        if self.subscribed:
+            self.client.remove_event_handler(self._on_new_message)
+            self.client.remove_event_handler(self._on_message_edited)
+            self.subscribed = False
+        self.peers.clear()
+        self.dedup = None
+        logger.info("Stopped ingesting: another worker is the leader")
+        
     async def stop(self):
-        """Stop the Telegram client."""
-        await self.client.disconnect()
+        """Stop the Telegram clients."""
+        for handle in self.retry_handles.values():
+            handle.cancel()
+        self.retry_handles.clear()
+        for task in list(self.retry_tasks):
+            task.cancel()
+        for task in self.thumbnail_tasks:
+            task.cancel()
+        await asyncio.gather(*self.thumbnail_tasks, return_exceptions=True)
+        self.thumbnail_tasks = []
+        await self.pipeline.stop()
+        await self.pool.stop()
         logger.info("Telegram client stopped")
         
+    async def _load_signatures(self):
+        """Warm the duplicate index with recent cluster representatives."""
+        if self.dedup is None:
+            return
+        since = datetime.utcnow() - timedelta(hours=config.DEDUP_WINDOW_HOURS)
+        signatures = await self.repo.get_recent_signatures(since, config.DEDUP_INDEX_SIZE)
+        for channel_id, message_id, signature in signatures:
+            self.dedup.add((channel_id, message_id), signature)
+        logger.info(f"Loaded {len(signatures)} post signatures for duplicate detection")
+        
+    def _channel_dict(self, channel: Channel) -> Dict:
+        return {
+            'id': channel.id,
+            'username': channel.username,
+            'title': channel.title,
+            'tg_id': channel.tg_id,
+            'access_hash': channel.access_hash,
+            'peer_session': channel.peer_session
+        }
+        
+    async def _resolve_peer(self, channel: Dict, pooled: PooledClient):
+        """Get the input peer of a channel for a session.
+        
+        The peer stored on the channel is used as is when it was resolved by
+        the same session; otherwise the username is resolved and the result
+        stored for the next fetches.
+        """
+        if channel.get('access_hash') is not None and channel.get('peer_session') == pooled.name:
+            return InputPeerChannel(channel['tg_id'], channel['access_hash'])
+            
+        peer = await pooled.client.get_input_entity(channel['username'])
+        if isinstance(peer, InputPeerChannel):
+            await self._store_peer(channel, peer.channel_id, peer.access_hash, pooled.name)
+        return peer
+        
+    async def _store_peer(
+        self,
+        channel: Dict,
+        tg_id: Optional[int],
+        access_hash: Optional[int],
+        peer_session: Optional[str]
+    ):
+        await self.repo.set_channel_peer(channel['id'], tg_id, access_hash, peer_session)
+        channel.update(tg_id=tg_id, access_hash=access_hash, peer_session=peer_session)
+        
     def _make_post_url(self, channel_username: str, message_id: int) -> str:
         """Create a URL for a Telegram post."""
         return f"https://t.me/{channel_username}/{message_id}"
         
-    async def fetch_channel_posts(self, channel: Dict, limit: int = 100) -> int:
-        """Fetch recent posts from a channel and store them in the database."""
+    def _make_post_row(self, channel_username: str, message: Message, thumbnail: Optional[str] = None) -> Optional[Dict]:
+        """Build a post row from a message, or None if it has nothing to show.
+        
+        Photo, video and file posts are kept even without a caption.
+        """
+        if not isinstance(message, Message):
+            return None
+        media = media_info(message)
+        if not message.text and media is None:
+            return None
+        if media is not None:
+            media["thumbnail"] = thumbnail
+            if message.grouped_id:
+                # Album captions are merged per message, see merge_album
+                media["caption"] = (message.text or "")[:4096]
+            
+        return {
+            "message_id": message.id,
+            "text": (message.text or "")[:4096],  # Telegram message limit
+            "date": message.date,
+            "url": self._make_post_url(channel_username, message.id),
+            "media": [media] if media else None,
+            "grouped_id": message.grouped_id
+        }
+        
+    def _classify(self, channel: Dict, row: Dict):
+        """Mark a new post row as a near-duplicate of a recent post, if it is one.
+        
+        New representatives are indexed right away, so duplicates queued
+        behind them are caught before they are stored.
+        """
+        if self.dedup is not None:
+            self.dedup.classify(channel['id'], row)
+            
+    def _unindex_unstored(self, channel_id: int, rows: List[Dict]):
+        """Take representatives whose write failed out of the duplicate index.
+        
+        They may never be stored, and posts marked as their duplicates
+        would be hidden from the feed behind nothing.
+        """
+        if self.dedup is not None:
+            for row in rows:
+                self.dedup.remove((channel_id, row['message_id']))
+                
+    def _index_stored(self, channel_id: int, rows: List[Dict]):
+        """Index the representatives of a write, e.g. after a failed attempt."""
+        if self.dedup is None:
+            return
+        for row in rows:
+            if row.get('minhash') is not None and row.get('duplicate_of_channel_id') is None:
+                self.dedup.add((channel_id, row['message_id']), row['minhash'])
+            
+    def _queue_thumbnail(self, channel: Dict, pooled: PooledClient, message: Message):
+        """Download a queued message's thumbnail in the background."""
+        if self.thumbnails is None or not isinstance(message, Message) or media_object(message) is None:
+            return
+        try:
+            self.thumbnail_jobs.put_nowait((channel, pooled, message))
+        except asyncio.QueueFull:
+            logger.warning(f"Skipping the thumbnail of {channel['username']}/{message.id}: download queue is full")
+            
+    async def _thumbnail_loop(self):
+        """Download thumbnails within their session's rate limit and FloodWait."""
+        while True:
+            channel, pooled, message = await self.thumbnail_jobs.get()
+            delay = pooled.throttle_delay()
+            if delay:
+                await asyncio.sleep(delay)
+            await pooled.rate_limiter.acquire()
+            try:
+                thumbnail = await self.thumbnails.download(pooled.client, message)
+            except FloodWaitError as e:
+                pooled.throttle(e.seconds)
+                FLOOD_WAIT_SECONDS.labels(pooled.name).inc(e.seconds)
+                logger.warning(f"FloodWaitError downloading a thumbnail via {pooled.name}: pausing for {e.seconds} seconds")
+                continue
+            except Exception as e:
+                logger.error(f"Error downloading the thumbnail of {channel['username']}/{message.id}: {e}")
+                continue
+            if thumbnail is not None:
+                await self.pipeline.put_thumbnail(channel, message.id, message.grouped_id, thumbnail)
+        
+    def _normalize(self, channel: Dict, message: Message) -> Optional[Dict]:
+        """Turn a message into a post row for the ingest pipeline.
+        
+        The pipeline merges albums and classifies new rows afterwards;
+        thumbnails follow separately.
+        """
+        return self._make_post_row(channel['username'], message)
+        
+    async def _get_cursor(self, channel_id: int) -> int:
+        """Get the last fetched message_id for a channel."""
+        if self.cursors is None:
+            self.cursors = await self.repo.get_channel_cursors()
+        return self.cursors.get(channel_id, 0)
+        
+    def _advance_cursor(self, channel_id: int, message_id: int):
+        """Record a stored message_id in the in-memory cursors."""
+        if self.cursors is not None:
+            self.cursors[channel_id] = max(self.cursors.get(channel_id, 0), message_id)
+        
+    async def fetch_channel_posts(self, channel: Dict, limit: int = 100, pooled: Optional[PooledClient] = None) -> int:
+        """Fetch new posts from a channel and store them in the database.
+        
+        A channel seen for the first time is backfilled with its latest `limit`
+        messages. After that only messages newer than the stored cursor are
+        requested, oldest first, so an interrupted catch-up resumes where it
+        stopped on the next run. Without `pooled` the channel's account is
+        picked from the pool.
+        """
         channel_id = channel['id']
         username = channel['username']
         
+        if not self.backoff.is_ready(channel_id):
+            logger.info(f"Skipping {username}: FloodWait backoff for {self.backoff.delay(channel_id):.0f}s")
+            return 0
+            
+        pooled = pooled or self.pool.pick(channel_id)
+        if pooled is None:
+            logger.warning(f"Skipping {username}: no Telegram session available")
+            return 0
+            
         # Get the latest message_id we have for this channel
-        last_message_id = self.repo.get_max_message_id(channel_id)
-        new_posts = 0
+        last_message_id = await self._get_cursor(channel_id)
+        used_stored_peer = channel.get('peer_session') == pooled.name
+        started = time.perf_counter()
+        fetch = self.pipeline.begin()
         
         try:
-            # Fetch the latest messages from the channel
-            messages = await self.client.get_messages(username, limit=limit)
-            
-            for message in messages:
-                if not isinstance(message, Message) or not message.text:
-                    continue
-                    
-                # Skip if we've already processed this message
-                if last_message_id and message.id <= last_message_id:
-                    continue
-                    
-                # Create a URL for the post
-                url = self._make_post_url(username, message.id)
-                
-                # Store the post in the database
-                self.repo.add_post(
-                    channel_id=channel_id,
-                    message_id=message.id,
-                    text=message.text[:4096],  # Telegram message limit
-                    date=message.date,
-                    url=url
+            peer = await self._resolve_peer(channel, pooled)
+            if last_message_id:
+                messages = pooled.client.iter_messages(
+                    peer,
+                    min_id=last_message_id,
+                    reverse=True,
+                    limit=config.PARSER_MAX_MESSAGES_PER_FETCH
                 )
-                new_posts += 1
+            else:
+                messages = pooled.client.iter_messages(peer, limit=limit)
+            
+            # Messages stream into the pipeline as pages arrive; put() waits
+            # while the writer is behind
+            max_message_id = last_message_id
+            async for message in messages:
+                max_message_id = max(max_message_id, message.id)
+                await self.pipeline.put(channel, message, fetch)
+                self._queue_thumbnail(channel, pooled, message)
                 
+            # Wait until the posts and the new cursor are stored
+            new_posts = await self.pipeline.commit(
+                channel,
+                max_message_id if max_message_id > last_message_id else None,
+                fetch
+            )
+            self.backoff.clear(channel_id)
+                
+            FETCH_SECONDS.labels(username).observe(time.perf_counter() - started)
+            FETCH_NEW_POSTS.labels(username).inc(new_posts)
             logger.info(f"Fetched {new_posts} new posts from {username}")
             return new_posts
             
         except FloodWaitError as e:
-            logger.warning(f"FloodWaitError: Need to wait {e.seconds} seconds")
-            await asyncio.sleep(e.seconds)
+            # The wait applies to the account: move the channel to another
+            # account if one is free, otherwise wait for the first to recover
+            pooled.throttle(e.seconds)
+            FLOOD_WAIT_SECONDS.labels(pooled.name).inc(e.seconds)
+            # Wait at least a second, so the retry doesn't find this fetch still in flight
+            delay = max(self.backoff.defer(channel_id, self.pool.wait_time()), 1)
+            logger.warning(f"FloodWaitError on {username} via {pooled.name}: retrying in {delay:.0f} seconds")
+            self._schedule_retry(channel, delay)
             return 0
         except ChannelPrivateError:
             logger.error(f"Cannot access private channel {username}")
             return 0
+        except (ChannelInvalidError, PeerIdInvalidError) as e:
+            if not used_stored_peer:
+                logger.error(f"Error fetching posts from {username}: {e}")
+                return 0
+            # The stored peer went stale: resolve the username once more
+            logger.warning(f"Stored peer of {username} is no longer valid, resolving again")
+            await self._store_peer(channel, None, None, None)
+            return await self.fetch_channel_posts(channel, limit, pooled)
         except Exception as e:
             logger.error(f"Error fetching posts from {username}: {e}")
             return 0
+        finally:
+            self.pipeline.end(fetch)
+            
+    def _schedule_retry(self, channel: Dict, delay: float):
+        """Fetch a channel again once its FloodWait backoff has passed."""
+        channel_id = channel['id']
+        handle = self.retry_handles.pop(channel_id, None)
+        if handle:
+            handle.cancel()
+            
+        def spawn():
+            self.retry_handles.pop(channel_id, None)
+            task = asyncio.create_task(self.fetch_limited(channel))
+            self.retry_tasks.add(task)
+            task.add_done_callback(self.retry_tasks.discard)
+            
+        self.retry_handles[channel_id] = asyncio.get_running_loop().call_later(delay, spawn)
+        
+    def get_backoff_state(self) -> Dict[int, float]:
+        """Get remaining FloodWait backoff seconds per channel_id."""
+        return self.backoff.state()
+        
+    def get_pool_state(self) -> Dict[str, float]:
+        """Get remaining FloodWait seconds per session; -1 means disconnected."""
+        return self.pool.state()
+            
+    async def fetch_limited(self, channel: Dict) -> int:
+        """Fetch a channel within its account's concurrency, rate and time limits.
+        
+        Every fetch goes through here, so a channel is never fetched twice
+        at once; returns 0 if it is already being fetched.
+        """
+        channel_id = channel['id']
+        if channel_id in self.in_flight:
+            return 0
+            
+        pooled = self.pool.pick(channel_id)
+        if pooled is None:
+            logger.warning(f"Skipping {channel['username']}: no Telegram session available")
+            return 0
+            
+        self.in_flight.add(channel_id)
+        try:
+            async with pooled.semaphore:
+                await pooled.rate_limiter.acquire()
+                return await asyncio.wait_for(
+                    self.fetch_channel_posts(channel, pooled=pooled),
+                    timeout=config.PARSER_FETCH_TIMEOUT_SECONDS
+                )
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out fetching posts from {channel['username']}")
+            return 0
+        finally:
+            self.in_flight.discard(channel_id)
             
     async def update_channels(self):
-        """Update all active channels."""
+        """Update all active channels concurrently."""
         if self.running:
             logger.warning("Update already in progress, skipping")
             return
@@ -94,23 +418,64 @@ class TelegramFetcher:
         self.running = True
         
         try:
-            channels = self.repo.get_channels(active_only=True)
-            total_new_posts = 0
-            
-            for channel in channels:
-                channel_dict = {
-                    'id': channel.id,
-                    'username': channel.username,
-                    'title': channel.title
-                }
-                new_posts = await self.fetch_channel_posts(channel_dict)
-                total_new_posts += new_posts
-                
-                # Sleep between channels to avoid rate limits
-                await asyncio.sleep(2)
+            channels = await self.repo.get_channels(active_only=True)
+            channel_dicts = [self._channel_dict(channel) for channel in channels]
+            
+            # Channels waiting out a FloodWait are retried on their own schedule
+            ready = [channel for channel in channel_dicts if self.backoff.is_ready(channel['id'])]
+            if len(ready) < len(channel_dicts):
+                logger.info(f"Skipping {len(channel_dicts) - len(ready)} channels in FloodWait backoff")
+            
+            results = await asyncio.gather(*(self.fetch_limited(channel) for channel in ready))
+            total_new_posts = sum(results)
                 
             logger.info(f"Update complete. Added {total_new_posts} new posts")
         except Exception as e:
             logger.error(f"Error updating channels: {e}")
         finally:
-            self.running = False 
\ No newline at end of file
+            self.running = False
+            
+    async def track_channel(self, channel: Dict) -> bool:
+        """Start receiving pushed posts for a channel.
+        
+        Telegram only pushes updates for channels the account has joined;
+        others are still covered by the reconciliation poll.
+        """
+        try:
+            if channel.get('tg_id') is not None:
+                peer_id = utils.get_peer_id(PeerChannel(channel['tg_id']))
+            else:
+                peer_id = await self.client.get_peer_id(channel['username'])
+        except Exception as e:
+            logger.error(f"Cannot resolve {channel['username']} for push updates: {e}")
+            return False
+            
+        self.peers[peer_id] = channel
+        return True
+        
+    async def subscribe(self):
+        """Switch to push mode for all active channels."""
+        channels = await self.repo.get_channels(active_only=True)
+        for channel in channels:
+            await self.track_channel(self._channel_dict(channel))
+            
+        if not self.subscribed:
+            tracked = lambda event: event.chat_id in self.peers
+            self.client.add_event_handler(self._on_new_message, events.NewMessage(func=tracked))
+            self.client.add_event_handler(self._on_message_edited, events.MessageEdited(func=tracked))
+            self.subscribed = True
+            
+        logger.info(f"Subscribed to push updates from {len(self.peers)} channels")
+        
+    async def _on_new_message(self, event: events.NewMessage.Event):
+        if event.chat_id not in self.peers:
+            return
+        channel = self.peers[event.chat_id]
+        await self.pipeline.put(channel, event.message)
+        self._queue_thumbnail(channel, self.pool.primary, event.message)
+            
+    async def _on_message_edited(self, event: events.MessageEdited.Event):
+        # Edits only update the text, so the media isn't downloaded again
+        if event.chat_id not in self.peers:
+            return
+        await self.pipeline.put_edit(self.peers[event.chat_id], event.message)
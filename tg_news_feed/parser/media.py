@@ -0,0 +1,115 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from telethon.tl.types import (
+    Document, Message, MessageMediaDocument, MessageMediaPhoto, Photo, PhotoSize, PhotoSizeProgressive
+)
+
+from tg_news_feed.storage.thumbnails import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+
+
+def media_object(message: Message) -> Optional[Union[Photo, Document]]:
+    """Get the photo or document attached to a message.
+
+    Link previews, polls, locations and the like don't count as media.
+    """
+    media = message.media
+    if isinstance(media, MessageMediaPhoto) and isinstance(media.photo, Photo):
+        return media.photo
+    if isinstance(media, MessageMediaDocument) and isinstance(media.document, Document):
+        return media.document
+    return None
+
+
+def media_info(message: Message) -> Optional[Dict]:
+    """Describe a message's photo or document for the posts.media column."""
+    media = media_object(message)
+    if media is None:
+        return None
+    if isinstance(media, Photo):
+        kind = "photo"
+    elif message.gif:
+        kind = "animation"
+    elif message.video or message.video_note:
+        kind = "video"
+    elif message.audio or message.voice:
+        kind = "audio"
+    else:
+        kind = "document"
+    file = message.file
+    return {
+        "message_id": message.id,
+        "type": kind,
+        "mime_type": file.mime_type,
+        "size": file.size,
+        "width": file.width,
+        "height": file.height,
+        "duration": file.duration,
+        "thumbnail": None,
+    }
+
+
+def thumbnail_size(media: Union[Photo, Document], max_side: int) -> Optional[Union[PhotoSize, PhotoSizeProgressive]]:
+    """Pick the largest preview size that fits in `max_side`, else the smallest one."""
+    sizes = media.sizes if isinstance(media, Photo) else media.thumbs
+    sizes = [size for size in sizes or [] if isinstance(size, (PhotoSize, PhotoSizeProgressive))]
+    if not sizes:
+        return None
+    fitting = [size for size in sizes if max(size.w, size.h) <= max_side]
+    if fitting:
+        return max(fitting, key=lambda size: size.w * size.h)
+    return min(sizes, key=lambda size: size.w * size.h)
+
+
+class ThumbnailDownloader:
+    """Downloads post thumbnails into the thumbnail cache.
+
+    Photo and document ids seen recently are remembered with the hash of
+    their thumbnail, so edits and refetches don't download them again.
+    """
+
+    def __init__(self, cache: ThumbnailCache, max_side: int, remember: int = 10000):
+        self.cache = cache
+        self.max_side = max_side
+        self.remember = remember
+        self.known: "OrderedDict[int, str]" = OrderedDict()
+
+    async def download(self, client: TelegramClient, message: Message) -> Optional[str]:
+        """Cache the thumbnail of a message's media. Returns its content hash.
+
+        `client` must be the session that fetched the message: media access
+        hashes are only valid for it. FloodWaitError is raised for the
+        caller to throttle the session; other errors only skip the thumbnail.
+        """
+        media = media_object(message)
+        if media is None:
+            return None
+        digest = self.known.get(media.id)
+        if digest is not None and self.cache.contains(digest):
+            self.known.move_to_end(media.id)
+            return digest
+
+        size = thumbnail_size(media, self.max_side)
+        if size is None:
+            return None
+        try:
+            # Telethon matches progressive sizes by their type letter only
+            data = await client.download_media(message, file=bytes, thumb=size.type)
+        except FloodWaitError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cannot download the thumbnail of message {message.id}: {e}")
+            return None
+        if not data:
+            return None
+
+        digest = await self.cache.put(data)
+        self.known[media.id] = digest
+        if len(self.known) > self.remember:
+            self.known.popitem(last=False)
+        return digest
@@ -0,0 +1,369 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tg_news_feed.metrics import INGEST_QUEUE_DEPTH, INGEST_BATCH_ROWS
+from tg_news_feed.storage.async_repo import AsyncRepository
+from tg_news_feed.storage.repo import merge_album
+
+logger = logging.getLogger(__name__)
+
+# Queue items: (kind, channel, payload, fetch), where fetch is the id from
+# begin() of the poll that queued the item, or None for pushed messages
+MESSAGE = "message"
+EDIT = "edit"
+# Marks the end of a fetch: payload is (last_message_id, future). Everything
+# queued before it is written before the future resolves.
+COMMIT = "commit"
+# A thumbnail downloaded after its message was queued: payload is a dict of
+# message_id, grouped_id and thumbnail (its content hash)
+THUMBNAIL = "thumbnail"
+
+# Rows that fail to be written this many times are dropped
+MAX_WRITE_ATTEMPTS = 3
+
+
+def apply_thumbnail(rows: List[Dict], thumbnail: Dict) -> bool:
+    """Set a thumbnail on the media item of a row that is not stored yet.
+
+    Returns False if none of `rows` holds the message.
+    """
+    for row in rows:
+        if row["message_id"] != thumbnail["message_id"] and (
+            not thumbnail["grouped_id"] or row.get("grouped_id") != thumbnail["grouped_id"]
+        ):
+            continue
+        for item in row.get("media") or []:
+            if item.get("message_id", row["message_id"]) == thumbnail["message_id"]:
+                item["thumbnail"] = thumbnail["thumbnail"]
+                return True
+    return False
+
+
+class IngestPipeline:
+    """Staged ingest: fetchers -> normalizer -> batching writer.
+
+    Fetchers put raw messages into a bounded queue. A normalizer task turns
+    them into post rows and passes them on through a second bounded queue to
+    a single writer task, which stores rows in one transaction per channel
+    every `flush_interval` seconds or `max_batch` rows. When the disk is
+    slow both queues fill up and put() makes the fetchers wait, so memory
+    stays bounded and network I/O overlaps with writes otherwise.
+
+    Rows of a Telegram album (same grouped_id) are held back by the
+    normalizer and merged into one post once the channel moves on to
+    another message, its fetch commits or `flush_interval` passes. New
+    rows go through `classify` after merging. `on_write_failed` and
+    `on_stored` are called with the rows of every failed and successful
+    transaction, so state built by `classify` can follow what is stored.
+
+    Rows that fail to be written are kept for the next transaction, up to
+    MAX_WRITE_ATTEMPTS times and `max(queue_size, max_batch)` rows. Each
+    poll tags its rows with the id from begin(), so commit() counts only
+    the posts that this fetch inserted.
+
+    Thumbnails are downloaded after their messages are queued and follow
+    them through put_thumbnail(): one that catches up with its row before
+    it is stored is set on the row, later ones update the stored post.
+    """
+
+    def __init__(
+        self,
+        repo: AsyncRepository,
+        normalize: Callable[[Dict, Any], Optional[Dict]],
+        queue_size: int,
+        max_batch: int,
+        flush_interval: float,
+        classify: Optional[Callable[[Dict, Dict], None]] = None,
+        on_flush: Optional[Callable[[int, int], None]] = None,
+        on_stored: Optional[Callable[[int, List[Dict]], None]] = None,
+        on_write_failed: Optional[Callable[[int, List[Dict]], None]] = None
+    ):
+        self.repo = repo
+        self.normalize = normalize
+        self.classify = classify
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.on_stored = on_stored
+        self.on_write_failed = on_write_failed
+        self.retry_limit = max(queue_size, max_batch)
+        self.messages: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.rows: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        INGEST_QUEUE_DEPTH.labels("messages").set_function(self.messages.qsize)
+        INGEST_QUEUE_DEPTH.labels("rows").set_function(self.rows.qsize)
+        # Normalizer state: the album being collected per channel_id, as
+        # (channel, grouped_id, started, rows, fetch)
+        self.albums: Dict[int, tuple] = {}
+        # Writer state: new rows waiting for the next transaction by
+        # (channel_id, fetch), and posts inserted so far by open fetches
+        self.new_rows: Dict[Tuple[int, Optional[int]], List[Dict]] = defaultdict(list)
+        self.edited_rows: Dict[int, List[Dict]] = defaultdict(list)
+        self.thumbnails: Dict[int, List[Dict]] = defaultdict(list)
+        self.fetch_ids = itertools.count(1)
+        self.inserted: Dict[int, int] = {}
+        # Failed writes so far of rows kept for a retry, by id() of the row
+        self.attempts: Dict[int, int] = {}
+        self.commits: List[tuple] = []
+        self.pending = 0
+        self.tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the normalizer and writer tasks."""
+        if not self.tasks:
+            self.tasks = [
+                asyncio.create_task(self._normalize_loop()),
+                asyncio.create_task(self._write_loop()),
+            ]
+
+    async def stop(self):
+        """Write everything queued so far and stop the stages."""
+        if self.tasks:
+            await self.flush()
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+
+    def begin(self) -> int:
+        """Open a fetch and get the id to tag its messages and commit with."""
+        fetch = next(self.fetch_ids)
+        self.inserted[fetch] = 0
+        return fetch
+
+    def end(self, fetch: int):
+        """Close a fetch, whether it committed or failed half way."""
+        self.inserted.pop(fetch, None)
+
+    async def put(self, channel: Dict, message: Any, fetch: Optional[int] = None):
+        """Queue a new message, waiting while the pipeline is full."""
+        await self.messages.put((MESSAGE, channel, message, fetch))
+
+    async def put_edit(self, channel: Dict, message: Any):
+        """Queue an edited message, waiting while the pipeline is full."""
+        await self.messages.put((EDIT, channel, message, None))
+
+    async def put_thumbnail(self, channel: Dict, message_id: int, grouped_id: Optional[int], thumbnail: str):
+        """Queue the thumbnail of a message that was put() before."""
+        payload = {"message_id": message_id, "grouped_id": grouped_id, "thumbnail": thumbnail}
+        await self.messages.put((THUMBNAIL, channel, payload, None))
+
+    async def commit(self, channel: Dict, last_message_id: Optional[int] = None, fetch: Optional[int] = None) -> int:
+        """Wait until all messages queued for a fetch are stored.
+
+        Also advances the channel's cursor to `last_message_id`, which covers
+        messages that produced no row; nothing else moves cursors. Returns
+        the number of posts inserted from messages put with `fetch`.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.messages.put((COMMIT, channel, (last_message_id, future), fetch))
+        return await future
+
+    async def flush(self):
+        """Wait until everything queued so far is stored."""
+        future = asyncio.get_running_loop().create_future()
+        await self.messages.put((COMMIT, None, (None, future), None))
+        await future
+
+    async def _normalize_loop(self):
+        while True:
+            timeout = None
+            if self.albums:
+                oldest = min(album[2] for album in self.albums.values())
+                timeout = max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                kind, channel, payload, fetch = await asyncio.wait_for(self.messages.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                # Pushed albums have no commit; don't hold them back for long
+                deadline = time.monotonic() - self.flush_interval
+                for channel_id in [key for key, album in self.albums.items() if album[2] <= deadline]:
+                    await self._close_album(channel_id)
+                continue
+
+            if kind == COMMIT:
+                if channel is None:
+                    for channel_id in list(self.albums):
+                        await self._close_album(channel_id)
+                else:
+                    await self._close_album(channel['id'])
+                await self.rows.put((kind, channel, payload, fetch))
+                continue
+
+            if kind == THUMBNAIL:
+                album = self.albums.get(channel['id'])
+                if album is None or not apply_thumbnail(album[3], payload):
+                    await self.rows.put((kind, channel, payload, fetch))
+                continue
+
+            try:
+                row = self.normalize(channel, payload)
+            except Exception as e:
+                logger.error(f"Error normalizing a message from {channel['username']}: {e}")
+                row = None
+            if row is None:
+                continue
+            if kind == EDIT:
+                await self.rows.put((kind, channel, row, fetch))
+                continue
+
+            # Album messages arrive one after another; collect them until the
+            # channel moves on
+            album = self.albums.get(channel['id'])
+            grouped_id = row.get("grouped_id")
+            if album is not None and album[1] != grouped_id:
+                await self._close_album(channel['id'])
+                album = None
+            if grouped_id:
+                if album is None:
+                    self.albums[channel['id']] = (channel, grouped_id, time.monotonic(), [row], fetch)
+                else:
+                    album[3].append(row)
+                continue
+            await self._emit(channel, row, fetch)
+
+    async def _close_album(self, channel_id: int):
+        album = self.albums.pop(channel_id, None)
+        if album is not None:
+            channel, _, _, rows, fetch = album
+            await self._emit(channel, merge_album(rows), fetch)
+
+    async def _emit(self, channel: Dict, row: Dict, fetch: Optional[int]):
+        """Pass a new post row on to the writer."""
+        if self.classify is not None:
+            try:
+                self.classify(channel, row)
+            except Exception as e:
+                # Classification is optional; the fetch commits past this
+                # row, so store it as is rather than lose it
+                logger.error(f"Error classifying a post from {channel['username']}, storing it unclassified: {e}")
+                row.update(minhash=None, duplicate_of_channel_id=None, duplicate_of_message_id=None)
+        await self.rows.put((MESSAGE, channel, row, fetch))
+
+    async def _write_loop(self):
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, channel, payload, fetch = await asyncio.wait_for(self.rows.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                deadline = await self._write()
+                continue
+
+            if kind == COMMIT:
+                self.commits.append((channel, payload, fetch))
+                deadline = await self._write()
+                continue
+
+            channel_id = channel['id']
+            if kind == MESSAGE:
+                self.new_rows[(channel_id, fetch)].append(payload)
+            elif kind == THUMBNAIL:
+                pending = [row for (key, _), rows in self.new_rows.items() if key == channel_id for row in rows]
+                if not apply_thumbnail(pending, payload):
+                    self.thumbnails[channel_id].append(payload)
+            else:
+                self.edited_rows[channel_id].append(payload)
+            self.pending += 1
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if self.pending >= self.max_batch:
+                deadline = await self._write()
+
+    async def _write(self) -> Optional[float]:
+        """Store pending rows and resolve the commits that were waiting on them.
+
+        Returns when the rows kept for a retry are due, if there are any.
+        """
+        new_rows, self.new_rows = self.new_rows, defaultdict(list)
+        edited_rows, self.edited_rows = self.edited_rows, defaultdict(list)
+        thumbnails, self.thumbnails = self.thumbnails, defaultdict(list)
+        commits, self.commits = self.commits, []
+        self.pending = 0
+
+        # Only commits of polls move cursors. Pushed rows never do: after
+        # downtime the first push would otherwise jump the cursor over the
+        # messages missed meanwhile, and the reconciliation poll that starts
+        # from the cursor would never fill that gap.
+        cursors = {}
+        for channel, (last_message_id, _), _ in commits:
+            if channel is not None and last_message_id is not None:
+                cursors[channel['id']] = max(cursors.get(channel['id'], 0), last_message_id)
+
+        batches: Dict[int, List[tuple]] = defaultdict(list)
+        for (channel_id, fetch), rows in new_rows.items():
+            batches[channel_id].append((fetch, rows))
+
+        errors: Dict[int, Exception] = {}
+        for channel_id in set(cursors) | set(batches):
+            # One transaction per fetch, so each commit learns its own
+            # count; the cursor goes with the last one
+            channel_batches = batches.get(channel_id) or [(None, [])]
+            for i, (fetch, rows) in enumerate(channel_batches):
+                last_message_id = None
+                if i == len(channel_batches) - 1 and channel_id not in errors:
+                    last_message_id = cursors.get(channel_id)
+                try:
+                    inserted = await self.repo.add_posts_bulk(channel_id, rows, last_message_id=last_message_id)
+                except Exception as e:
+                    logger.error(f"Error storing {len(rows)} posts of channel {channel_id}: {e}")
+                    errors[channel_id] = e
+                    if self.on_write_failed and rows:
+                        self.on_write_failed(channel_id, rows)
+                    self._retry(channel_id, fetch, rows)
+                    continue
+                if rows:
+                    INGEST_BATCH_ROWS.observe(len(rows))
+                    if self.on_stored:
+                        self.on_stored(channel_id, rows)
+                if self.attempts:
+                    for row in rows:
+                        self.attempts.pop(id(row), None)
+                if fetch in self.inserted:
+                    self.inserted[fetch] += inserted
+                if self.on_flush and last_message_id is not None:
+                    self.on_flush(channel_id, last_message_id)
+
+        for channel_id, rows in edited_rows.items():
+            try:
+                await self.repo.update_posts_text(channel_id, rows)
+            except Exception as e:
+                logger.error(f"Error updating {len(rows)} edited posts of channel {channel_id}: {e}")
+
+        for channel_id, items in thumbnails.items():
+            try:
+                await self.repo.set_post_thumbnails(channel_id, items)
+            except Exception as e:
+                logger.error(f"Error storing {len(items)} thumbnails of channel {channel_id}: {e}")
+
+        for channel, (_, future), fetch in commits:
+            if future.done():
+                continue
+            if channel is not None and channel['id'] in errors:
+                future.set_exception(errors[channel['id']])
+            else:
+                future.set_result(self.inserted.get(fetch, 0))
+
+        if self.pending:
+            return time.monotonic() + self.flush_interval
+        return None
+
+    def _retry(self, channel_id: int, fetch: Optional[int], rows: List[Dict]):
+        """Keep rows that failed to be written for the next transaction."""
+        retry = []
+        for row in rows:
+            attempts = self.attempts.pop(id(row), 0) + 1
+            if attempts < MAX_WRITE_ATTEMPTS and len(retry) < self.retry_limit - self.pending:
+                self.attempts[id(row)] = attempts
+                retry.append(row)
+        if len(retry) < len(rows):
+            logger.error(f"Dropping {len(rows) - len(retry)} posts of channel {channel_id} after failed writes")
+        if retry:
+            self.new_rows[(channel_id, fetch)][:0] = retry
+            self.pending += len(retry)
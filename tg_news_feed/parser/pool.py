@@ -0,0 +1,132 @@
+import asyncio
+import bisect
+import logging
+import time
+from hashlib import blake2b
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from telethon import TelegramClient
+
+from tg_news_feed.config import config
+from tg_news_feed.parser.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class PooledClient:
+    """A Telegram account in the pool with its own limits and FloodWait state."""
+
+    def __init__(self, name: str, client: TelegramClient, concurrency: int, rate: float, burst: int):
+        self.name = name
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.throttled_until = 0.0
+
+    def throttle(self, seconds: float):
+        """Take the client out of rotation for `seconds` after a FloodWait."""
+        self.throttled_until = max(self.throttled_until, time.monotonic() + seconds)
+
+    def throttle_delay(self) -> float:
+        """Seconds left until the client may be used again."""
+        return max(0.0, self.throttled_until - time.monotonic())
+
+    def is_available(self) -> bool:
+        """Check whether the client is connected and not throttled."""
+        return self.client.is_connected() and self.throttle_delay() == 0
+
+
+class ClientPool:
+    """Telegram accounts sharing the channel fetches.
+
+    Channels are placed on a consistent-hash ring with `replicas` points per
+    account, so each channel sticks to one account and adding or removing an
+    account only moves its share of channels. A channel whose account is
+    throttled or disconnected falls through to the next account on the ring
+    until its own account is back.
+    """
+
+    def __init__(self, clients: Dict[str, TelegramClient], replicas: int = 100):
+        if not clients:
+            raise ValueError("Client pool needs at least one session")
+        self.clients = [
+            PooledClient(
+                name,
+                client,
+                concurrency=config.PARSER_CONCURRENCY,
+                rate=config.PARSER_RATE_PER_SECOND,
+                burst=config.PARSER_RATE_BURST
+            )
+            for name, client in clients.items()
+        ]
+        self.ring: List[Tuple[int, PooledClient]] = sorted(
+            ((_hash(f"{pooled.name}#{i}"), pooled) for pooled in self.clients for i in range(replicas)),
+            key=lambda point: point[0]
+        )
+        self.points = [point for point, _ in self.ring]
+
+    @property
+    def primary(self) -> PooledClient:
+        """The first configured account, used for push updates."""
+        return self.clients[0]
+
+    async def start(self):
+        """Connect every account. Accounts that fail stay out of rotation."""
+        for pooled in self.clients:
+            try:
+                await pooled.client.start()
+            except Exception as e:
+                logger.error(f"Cannot start Telegram session {pooled.name}: {e}")
+
+    async def stop(self):
+        """Disconnect every account."""
+        for pooled in self.clients:
+            await pooled.client.disconnect()
+
+    def candidates(self, channel_id: int) -> Iterator[PooledClient]:
+        """Accounts in ring order for a channel, its owner first."""
+        start = bisect.bisect(self.points, _hash(str(channel_id)))
+        seen = set()
+        for i in range(len(self.ring)):
+            pooled = self.ring[(start + i) % len(self.ring)][1]
+            if pooled.name not in seen:
+                seen.add(pooled.name)
+                yield pooled
+                if len(seen) == len(self.clients):
+                    return
+
+    def pick(self, channel_id: int) -> Optional[PooledClient]:
+        """Get the account that should fetch a channel now, if any is usable."""
+        for pooled in self.candidates(channel_id):
+            if pooled.is_available():
+                return pooled
+        return None
+
+    def wait_time(self) -> float:
+        """Seconds until some connected account is out of FloodWait."""
+        delays = [pooled.throttle_delay() for pooled in self.clients if pooled.client.is_connected()]
+        return min(delays) if delays else 0.0
+
+    def state(self) -> Dict[str, float]:
+        """Get remaining FloodWait seconds per account; -1 means disconnected."""
+        return {
+            pooled.name: pooled.throttle_delay() if pooled.client.is_connected() else -1
+            for pooled in self.clients
+        }
+
+
+def create_client_pool() -> ClientPool:
+    """Create the client pool from TELEGRAM_SESSIONS."""
+    return ClientPool({
+        session: TelegramClient(
+            session,
+            config.API_ID,
+            config.API_HASH,
+            flood_sleep_threshold=config.PARSER_FLOOD_SLEEP_THRESHOLD
+        )
+        for session in config.TELEGRAM_SESSIONS
+    })
@@ -1,33 +1,115 @@
 import asyncio
+import functools
 import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, JobEvent
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 from tg_news_feed.config import config
+from tg_news_feed.lease import LeaderLease
+from tg_news_feed.metrics import SCHEDULER_CYCLE_SECONDS, SCHEDULER_OVERRUNS
 from tg_news_feed.parser.fetcher import TelegramFetcher
 from tg_news_feed.storage.repo import Repository
+from tg_news_feed.storage.retention import retention_enabled, run_retention
 
 logger = logging.getLogger(__name__)
 
 
 class UpdateScheduler:
-    def __init__(self, fetcher: TelegramFetcher):
+    def __init__(self, fetcher: TelegramFetcher, lease: Optional[LeaderLease] = None):
         self.fetcher = fetcher
+        # With a lease, jobs only run in the process that currently holds it
+        self.lease = lease
         self.scheduler = AsyncIOScheduler()
         
+    def _job(self, job_id: str, func: Callable, interval: timedelta) -> Callable:
+        """Wrap a job to run on the leader only and record its duration."""
+        @functools.wraps(func)
+        async def job(*args, **kwargs):
+            if self.lease is not None and not self.lease.is_leader:
+                logger.debug(f"Skipping {job_id}: not the leader")
+                return None
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                SCHEDULER_CYCLE_SECONDS.labels(job_id).observe(elapsed)
+                if elapsed > interval.total_seconds():
+                    SCHEDULER_OVERRUNS.labels(job_id).inc()
+                    logger.warning(f"Job {job_id} took {elapsed:.0f}s, longer than its interval")
+        return job
+        
+    async def _run_retention(self) -> int:
+        # The duplicate index is replaced whenever leadership changes
+        return await run_retention(self.fetcher.repo, self.fetcher.dedup)
+        
+    async def _prune_search_queries(self) -> int:
+        before = datetime.utcnow() - timedelta(hours=config.SEARCH_QUERY_TTL_HOURS)
+        return await self.fetcher.repo.prune_search_queries(before)
+        
+    def _on_job_skipped(self, event: JobEvent):
+        # A run was dropped because the previous one was still going
+        SCHEDULER_OVERRUNS.labels(event.job_id).inc()
+        
     def start(self):
         """Start the scheduler."""
-        interval_minutes = config.PARSER_INTERVAL_MINUTES
+        # In push mode polling only reconciles gaps, so it can run rarely
+        if config.PARSER_PUSH_MODE:
+            interval_minutes = config.PARSER_RECONCILE_INTERVAL_MINUTES
+        else:
+            interval_minutes = config.PARSER_INTERVAL_MINUTES
         
-        # Add the job to update channels
+        # Add the job to update channels. The first run is right away, so
+        # posts missed while the process was down are fetched without
+        # waiting a whole (reconciliation) interval.
+        interval = timedelta(minutes=interval_minutes)
         self.scheduler.add_job(
-            self.fetcher.update_channels,
+            self._job('update_channels', self.fetcher.update_channels, interval),
             trigger=IntervalTrigger(minutes=interval_minutes),
             id='update_channels',
+            next_run_time=datetime.now(),
             replace_existing=True
         )
         
+        # Recount the stats counters now and then to correct any drift
+        self.scheduler.add_job(
+            self._job(
+                'reconcile_counters',
+                self.fetcher.repo.reconcile_counters,
+                timedelta(hours=config.COUNTERS_RECONCILE_HOURS)
+            ),
+            trigger=IntervalTrigger(hours=config.COUNTERS_RECONCILE_HOURS),
+            id='reconcile_counters',
+            replace_existing=True
+        )
+        
+        # Forget search queries whose "more" buttons are no longer used
+        self.scheduler.add_job(
+            self._job(
+                'prune_search_queries',
+                self._prune_search_queries,
+                timedelta(hours=config.SEARCH_QUERY_TTL_HOURS)
+            ),
+            trigger=IntervalTrigger(hours=config.SEARCH_QUERY_TTL_HOURS),
+            id='prune_search_queries',
+            replace_existing=True
+        )
+        
+        # Prune old posts to keep the database bounded
+        if retention_enabled():
+            self.scheduler.add_job(
+                self._job('retention', self._run_retention, timedelta(hours=config.RETENTION_INTERVAL_HOURS)),
+                trigger=IntervalTrigger(hours=config.RETENTION_INTERVAL_HOURS),
+                id='retention',
+                replace_existing=True
+            )
+        
         # Start the scheduler
+        self.scheduler.add_listener(self._on_job_skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
         self.scheduler.start()
         logger.info(f"Scheduler started with {interval_minutes} minute interval")
         
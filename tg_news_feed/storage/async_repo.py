@@ -0,0 +1,125 @@
+import asyncio
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from tg_news_feed.config import config
+from tg_news_feed.metrics import REPO_SECONDS
+from tg_news_feed.storage.cache import FeedCache
+from tg_news_feed.storage.repo import Repository, PageCursor, PruneResult
+
+
+class AsyncRepository:
+    """Async facade over Repository.
+
+    Every public Repository method is exposed as a coroutine with the same
+    signature. The call runs on a dedicated database thread pool, so slow
+    SQLite I/O never blocks the event loop and reads can overlap writes.
+    
+    Feed pages are served from an in-process cache that is invalidated
+    whenever stored posts change. Posts may be written by another process
+    (ROLE=worker), so the shared feed generation in the counters table is
+    also checked, at most every FEED_CACHE_SYNC_SECONDS.
+    """
+
+    def __init__(self, repo: Optional[Repository] = None, max_workers: Optional[int] = None):
+        self.repo = repo or Repository()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.DB_EXECUTOR_WORKERS,
+            thread_name_prefix="db"
+        )
+        self.feed_cache = FeedCache(config.FEED_CACHE_PAGES, config.FEED_CACHE_TTL_SECONDS)
+        self.feed_generation: Optional[int] = None
+        self.feed_synced_at = float("-inf")
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the database executor.
+        
+        Its latency on the database thread is recorded per method name.
+        """
+        histogram = REPO_SECONDS.labels(func.__name__)
+        
+        def timed():
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+                
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, timed)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.repo, name)
+        if name.startswith("_") or not inspect.ismethod(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return method
+
+    async def _sync_feed_cache(self):
+        """Drop cached pages if any process changed the feed since the last check."""
+        now = time.monotonic()
+        if now - self.feed_synced_at < config.FEED_CACHE_SYNC_SECONDS:
+            return
+        self.feed_synced_at = now
+        generation = await self.run(self.repo.get_feed_generation)
+        if generation != self.feed_generation:
+            self.feed_cache.invalidate()
+            self.feed_generation = generation
+
+    async def _cached_feed(self, key: tuple, func: Callable, *args) -> List[Dict]:
+        await self._sync_feed_cache()
+        posts = self.feed_cache.get(key)
+        if posts is None:
+            generation = self.feed_cache.generation
+            posts = await self.run(func, *args)
+            self.feed_cache.put(key, posts, generation)
+        return posts
+
+    async def get_latest_posts(self, limit: int = 20, offset: int = 0) -> List[Dict]:
+        return await self._cached_feed(("offset", offset, limit), self.repo.get_latest_posts, limit, offset)
+
+    async def get_latest_posts_page(self, cursor: Optional[PageCursor] = None, limit: int = 20) -> List[Dict]:
+        return await self._cached_feed(("cursor", cursor, limit), self.repo.get_latest_posts_page, cursor, limit)
+
+    async def get_user_feed_page(self, user_id: int, cursor: Optional[PageCursor] = None, limit: int = 20) -> List[Dict]:
+        # Users who follow nothing read the global feed, so it comes from the cache
+        channel_ids = await self.run(self.repo.get_user_channel_ids, user_id)
+        if not channel_ids:
+            return await self.get_latest_posts_page(cursor, limit)
+        return await self.run(self.repo.get_channels_feed_page, channel_ids, cursor, limit)
+
+    async def add_posts_bulk(self, channel_id: int, rows: List[Dict], last_message_id: Optional[int] = None) -> int:
+        inserted = await self.run(self.repo.add_posts_bulk, channel_id, rows, last_message_id)
+        if inserted:
+            self.feed_cache.invalidate()
+        return inserted
+
+    async def update_posts_text(self, channel_id: int, rows: List[Dict]) -> int:
+        updated = await self.run(self.repo.update_posts_text, channel_id, rows)
+        if updated:
+            self.feed_cache.invalidate()
+        return updated
+
+    async def set_post_thumbnails(self, channel_id: int, thumbnails: List[Dict]) -> int:
+        updated = await self.run(self.repo.set_post_thumbnails, channel_id, thumbnails)
+        if updated:
+            self.feed_cache.invalidate()
+        return updated
+
+    async def prune_posts(self, channel_id: int, *args, **kwargs) -> PruneResult:
+        result = await self.run(self.repo.prune_posts, channel_id, *args, **kwargs)
+        if result.deleted:
+            self.feed_cache.invalidate()
+        return result
+
+    def close(self):
+        """Wait for pending queries and release the executor."""
+        self.executor.shutdown(wait=True)
+        self.repo.engine.dispose()
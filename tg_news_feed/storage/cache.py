@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class FeedCache:
+    """In-process LRU cache with TTL for feed pages.
+
+    Pages are dropped when they expire, when the cache is full, or all at once
+    by invalidate() after new posts are stored. A generation counter keeps a
+    read that raced with an invalidation from caching a stale page.
+    """
+
+    def __init__(self, max_pages: int, ttl: float):
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self.pages: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached page, or None if it is missing or expired."""
+        entry = self.pages.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.pages.pop(key, None)
+            self.misses += 1
+            return None
+        self.pages.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: int):
+        """Cache a page read while the cache was at `generation`."""
+        if generation != self.generation or self.max_pages <= 0:
+            return
+        self.pages[key] = (time.monotonic() + self.ttl, value)
+        self.pages.move_to_end(key)
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+    def invalidate(self):
+        """Drop all cached pages."""
+        self.generation += 1
+        self.pages.clear()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, UniqueConstraint, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, ForeignKeyConstraint, UniqueConstraint, Text, Index, LargeBinary, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -13,6 +13,11 @@ class Channel(Base):
     title = Column(String)
     added_at = Column(DateTime, default=func.current_timestamp())
     is_active = Column(Boolean, default=True)
+    # Resolved Telegram peer, so fetches skip username resolution. The
+    # access_hash is only valid for the session that resolved it.
+    tg_id = Column(Integer)
+    access_hash = Column(Integer)
+    peer_session = Column(String)
 
 
 class Post(Base):
@@ -23,6 +28,50 @@ class Post(Base):
     text = Column(Text)
     date = Column(DateTime)
     url = Column(String)
+    # Near-duplicate detection: MinHash signature and the cluster
+    # representative this post duplicates (NULL for representatives)
+    minhash = Column(LargeBinary)
+    duplicate_of_channel_id = Column(Integer)
+    duplicate_of_message_id = Column(Integer)
+    # Attached media: a list of {message_id, type, mime_type, size, width,
+    # height, duration, thumbnail}, where thumbnail is the content hash of a
+    # file in the thumbnail cache
+    media = Column(JSON(none_as_null=True))
+    # Telegram album id; an album is stored as one post under its first
+    # message_id with the media of all its messages
+    grouped_id = Column(Integer)
+
+
+class ChannelState(Base):
+    __tablename__ = 'channel_state'
+    
+    channel_id = Column(Integer, ForeignKey('channels.id'), primary_key=True)
+    last_message_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.current_timestamp())
+
+
+class Counter(Base):
+    __tablename__ = 'counters'
+    
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class Lease(Base):
+    __tablename__ = 'leases'
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class MediaFile(Base):
+    __tablename__ = 'media_files'
+    
+    # Bot API file_id of an uploaded thumbnail, by its content hash
+    thumbnail = Column(String, primary_key=True)
+    file_id = Column(String, nullable=False)
+    uploaded_at = Column(DateTime, default=func.current_timestamp())
 
 
 class User(Base):
@@ -30,6 +79,7 @@ class User(Base):
     
     user_id = Column(Integer, primary_key=True)
     first_seen = Column(DateTime, default=func.current_timestamp())
+    last_seen = Column(DateTime)
 
 
 class SavedPost(Base):
@@ -41,10 +91,31 @@ class SavedPost(Base):
     saved_at = Column(DateTime, default=func.current_timestamp())
     
     __table_args__ = (
-        ForeignKey('posts.channel_id', 'posts.message_id'),
+        ForeignKeyConstraint(
+            ['channel_id', 'message_id'],
+            ['posts.channel_id', 'posts.message_id']
+        ),
     )
 
 
+class UserChannel(Base):
+    __tablename__ = 'user_channels'
+    
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+    channel_id = Column(Integer, ForeignKey('channels.id'), primary_key=True)
+    added_at = Column(DateTime, default=func.current_timestamp())
+
+
+class SearchQuery(Base):
+    __tablename__ = 'search_queries'
+    
+    # "More results" buttons carry the id instead of the query, so any bot
+    # replica can serve them
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    query = Column(Text, unique=True, nullable=False)
+    used_at = Column(DateTime, default=func.current_timestamp())
+
+
 class Suggestion(Base):
     __tablename__ = 'suggestions'
     
@@ -52,4 +123,51 @@ class Suggestion(Base):
     user_id = Column(Integer, ForeignKey('users.user_id'))
     channel_username = Column(String)
     comment = Column(Text)
-    created_at = Column(DateTime, default=func.current_timestamp()) 
\ No newline at end of file
+    created_at = Column(DateTime, default=func.current_timestamp())
+
+
+# Indexes for the hot feed, saved posts and suggestions queries. Their column
+# order matches the keyset pagination order so pages are read straight from
+# the index without a sort.
+Index('ix_posts_feed', Post.date.desc(), Post.channel_id.desc(), Post.message_id.desc())
+# Per-channel timelines merged into personal feeds
+Index('ix_posts_channel_date', Post.channel_id, Post.date.desc(), Post.message_id.desc())
+# Finds the stored album a late album message belongs to
+Index(
+    'ix_posts_channel_grouped',
+    Post.channel_id,
+    Post.grouped_id,
+    sqlite_where=Post.grouped_id.isnot(None)
+)
+# Finds the duplicates of a cluster representative that is being pruned
+Index(
+    'ix_posts_duplicate_of',
+    Post.duplicate_of_channel_id,
+    Post.duplicate_of_message_id,
+    sqlite_where=Post.duplicate_of_channel_id.isnot(None)
+)
+Index(
+    'ix_saved_posts_user_saved_at',
+    SavedPost.user_id,
+    SavedPost.saved_at.desc(),
+    SavedPost.channel_id.desc(),
+    SavedPost.message_id.desc()
+)
+Index('ix_suggestions_created_at', Suggestion.created_at)
+
+
+# Full-text search over posts, created by Repository.create_tables. posts_fts
+# is an FTS5 index that reads the text from posts by rowid; triggers keep it in
+# sync with every insert, update and delete. A full VACUUM may renumber posts
+# rowids, so run Repository.rebuild_search_index() after one.
+POSTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+    "text, content='posts', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, text) VALUES (new.rowid, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.rowid, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF text ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.rowid, old.text); "
+    "INSERT INTO posts_fts(rowid, text) VALUES (new.rowid, new.text); END",
+]
@@ -1,21 +1,146 @@
-from sqlalchemy import create_engine, select, delete, func
+import sqlite3
+
+from sqlalchemy import create_engine, event, select, delete, update, func, bindparam, literal, or_, text, tuple_, union_all, DateTime
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional, Tuple, Dict
-from datetime import datetime
+from typing import Collection, List, NamedTuple, Optional, Set, Tuple, Dict
+from datetime import datetime, timedelta
 
 from tg_news_feed.config import config
-from tg_news_feed.storage.models import Base, Channel, Post, User, SavedPost, Suggestion
+from tg_news_feed.storage.models import Base, Channel, ChannelState, Counter, Lease, MediaFile, Post, SearchQuery, User, UserChannel, SavedPost, Suggestion, POSTS_FTS_DDL
+
+# Keyset pagination cursors: (date, channel_id, message_id) for the feed and
+# (saved_at, channel_id, message_id) for saved posts
+PageCursor = Tuple[datetime, int, int]
+PostKey = Tuple[int, int]  # (channel_id, message_id)
+
+
+class PruneResult(NamedTuple):
+    deleted: int
+    # Pruned cluster representatives, each mapped to the duplicate promoted
+    # in its place and that post's signature, or to None if it had none left
+    representatives: Dict[PostKey, Optional[Tuple[PostKey, bytes]]]
+
+# Markers around matched terms in search snippets; the bot replaces them with
+# markup after escaping the text
+SNIPPET_OPEN = "\x02"
+SNIPPET_CLOSE = "\x03"
+
+# Oldest SQLite with everything the queries use: upserts (3.24), FTS5 and
+# INSERT ... RETURNING in save_post (3.35)
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+# Counter bumped by every write that changes the feed, so processes can
+# tell when their cached feed pages are stale
+FEED_GENERATION = "feed_generation"
+
+
+def merge_album(rows: List[Dict]) -> Dict:
+    """Merge post rows of one Telegram album into a single row.
+    
+    The result takes the first message's id, date and url and lists the
+    media of all messages in order. Each media item keeps the caption of
+    its message, and the text is rebuilt from them, so merging a row that
+    is already part of the album again changes nothing. Of rows with the
+    same message the later one wins, e.g. an edit, but a missing thumbnail
+    doesn't replace a cached one.
+    """
+    rows = sorted(rows, key=lambda row: row["message_id"])
+    merged = dict(rows[0])
+    captions: Dict[int, str] = {}
+    media: Dict[int, Dict] = {}
+    for row in rows:
+        items = row.get("media") or []
+        for item in items:
+            message_id = item.get("message_id", row["message_id"])
+            item = dict(item)
+            stored = media.get(message_id)
+            if stored is not None and not item.get("thumbnail"):
+                item["thumbnail"] = stored.get("thumbnail")
+            media[message_id] = item
+            if "caption" in item:
+                captions[message_id] = item["caption"]
+        if row["text"] and not any("caption" in item for item in items):
+            # Stored before captions were kept per message
+            captions.setdefault(row["message_id"], row["text"])
+            
+    for message_id, item in media.items():
+        item["caption"] = captions.get(message_id, "")
+    texts = []
+    for message_id in sorted(captions):
+        if captions[message_id] and captions[message_id] not in texts:
+            texts.append(captions[message_id])
+    merged["text"] = "\n\n".join(texts)[:4096]
+    merged["media"] = [media[message_id] for message_id in sorted(media)] or None
+    return merged
+
+
+def create_sqlite_engine(db_path: Optional[str] = None) -> Engine:
+    """Create the SQLite engine with the tuning profile from Settings.
+    
+    Every pooled connection gets the configured PRAGMAs. With WAL readers
+    don't block the writer, and synchronous=NORMAL only fsyncs at checkpoints.
+    The pool keeps one connection per database thread warm.
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(
+            f"SQLite {sqlite3.sqlite_version} is too old, "
+            f"{'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required"
+        )
+    engine = create_engine(
+        f"sqlite:///{db_path or config.DB_PATH}",
+        echo=False,
+        poolclass=QueuePool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_POOL_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+        connect_args={
+            "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            "check_same_thread": False
+        }
+    )
+    
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Must come first: only takes effect before the database file is
+        # initialized; see Repository.enable_incremental_vacuum
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA temp_store={config.SQLITE_TEMP_STORE}")
+        cursor.close()
+        
+    return engine
 
 
 class Repository:
     def __init__(self):
-        self.engine = create_engine(f"sqlite:///{config.DB_PATH}", echo=False)
+        self.engine = create_sqlite_engine()
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         
     def create_tables(self):
-        """Create database tables."""
+        """Create database tables and the full-text search index."""
         Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            has_fts = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'"
+            ).first()
+            for statement in POSTS_FTS_DDL:
+                connection.exec_driver_sql(statement)
+            if not has_fts:
+                connection.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+                
+    def rebuild_search_index(self):
+        """Rebuild the full-text search index from posts."""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
         
     def get_session(self) -> Session:
         """Get a database session."""
@@ -28,6 +153,8 @@ class Repository:
             channel = Channel(username=username, title=title, added_at=datetime.now())
             session.add(channel)
             try:
+                session.flush()
+                self._bump(session, "channels")
                 session.commit()
                 session.refresh(channel)
                 return channel
@@ -47,6 +174,24 @@ class Repository:
         """Get channel by ID."""
         with self.get_session() as session:
             return session.execute(select(Channel).where(Channel.id == channel_id)).scalar_one_or_none()
+            
+    def set_channel_peer(
+        self,
+        channel_id: int,
+        tg_id: Optional[int],
+        access_hash: Optional[int],
+        peer_session: Optional[str]
+    ) -> None:
+        """Store (or clear, with None) the resolved Telegram peer of a channel."""
+        with self.get_session() as session:
+            session.execute(
+                update(Channel).where(Channel.id == channel_id).values(
+                    tg_id=tg_id,
+                    access_hash=access_hash,
+                    peer_session=peer_session
+                )
+            )
+            session.commit()
     
     # Posts
     def add_post(self, channel_id: int, message_id: int, text: str, date: datetime, url: str) -> Optional[Post]:
@@ -61,6 +206,9 @@ class Repository:
             )
             session.add(post)
             try:
+                session.flush()
+                self._bump_posts(session, channel_id, 1)
+                self._bump(session, FEED_GENERATION)
                 session.commit()
                 session.refresh(post)
                 return post
@@ -68,25 +216,271 @@ class Repository:
                 session.rollback()
                 return None
                 
+    def add_posts_bulk(self, channel_id: int, rows: List[Dict], last_message_id: Optional[int] = None) -> int:
+        """Insert many posts of a channel in one transaction, skipping duplicates.
+
+        Each row holds message_id, text, date and url, and optionally the
+        media, album and near-duplicate columns set by the parser. Rows of
+        an album that is already stored are merged into its post. If
+        last_message_id is given, the channel's fetch cursor is advanced in
+        the same transaction. Returns the number of rows actually inserted.
+        """
+        if not rows and last_message_id is None:
+            return 0
+            
+        with self.get_session() as session:
+            inserted = 0
+            if any(row.get("grouped_id") for row in rows):
+                rows = self._merge_albums(session, channel_id, rows)
+            if rows:
+                stmt = insert(Post.__table__).on_conflict_do_nothing(index_elements=["channel_id", "message_id"])
+                result = session.execute(stmt, [{**row, "channel_id": channel_id} for row in rows])
+                inserted = result.rowcount
+                self._bump_posts(session, channel_id, inserted)
+                self._bump(session, FEED_GENERATION, 1 if inserted else 0)
+                
+            if last_message_id is not None:
+                self._advance_cursor(session, channel_id, last_message_id)
+                
+            session.commit()
+            return inserted
+            
+    def _merge_albums(self, session: Session, channel_id: int, rows: List[Dict]) -> List[Dict]:
+        """Coalesce album rows, folding late messages into stored albums.
+        
+        Returns the rows that still need inserting.
+        """
+        albums: Dict[int, List[Dict]] = {}
+        singles = []
+        for row in rows:
+            if row.get("grouped_id"):
+                albums.setdefault(row["grouped_id"], []).append(row)
+            else:
+                singles.append(row)
+                
+        for album_rows in self._merge_stored_albums(session, channel_id, albums).values():
+            singles.append(merge_album(album_rows))
+        session.flush()
+        return singles
+        
+    def _merge_stored_albums(
+        self,
+        session: Session,
+        channel_id: int,
+        albums: Dict[int, List[Dict]]
+    ) -> Dict[int, List[Dict]]:
+        """Merge rows into the stored posts of their albums.
+        
+        Returns the albums, by grouped_id, that are not stored yet.
+        """
+        missing = {}
+        stored = {
+            post.grouped_id: post
+            for post in session.execute(
+                select(Post).where(Post.channel_id == channel_id, Post.grouped_id.in_(list(albums)))
+            ).scalars()
+        }
+        for grouped_id, album_rows in albums.items():
+            post = stored.get(grouped_id)
+            if post is None:
+                missing[grouped_id] = album_rows
+                continue
+            # The stored post keeps its message_id; only text and media grow
+            merged = merge_album([{"message_id": post.message_id, "text": post.text, "media": post.media}] + album_rows)
+            if merged["text"] != post.text or merged["media"] != post.media:
+                post.text = merged["text"]
+                post.media = merged["media"]
+                self._bump(session, FEED_GENERATION)
+        return missing
+            
+    def update_posts_text(self, channel_id: int, rows: List[Dict]) -> int:
+        """Update the text of already stored posts (e.g. after an edit).
+
+        Each row holds message_id and text. Edited album messages (rows with
+        a grouped_id) update their caption in the album's post instead.
+        Returns the number of rows applied.
+        """
+        if not rows:
+            return 0
+            
+        albums: Dict[int, List[Dict]] = {}
+        singles = []
+        for row in rows:
+            if row.get("grouped_id"):
+                albums.setdefault(row["grouped_id"], []).append(row)
+            else:
+                singles.append(row)
+                
+        posts = Post.__table__
+        with self.get_session() as session:
+            updated = 0
+            if albums:
+                missing = self._merge_stored_albums(session, channel_id, albums)
+                updated += sum(len(album_rows) for grouped_id, album_rows in albums.items() if grouped_id not in missing)
+            if singles:
+                stmt = update(posts).where(
+                    posts.c.channel_id == channel_id,
+                    posts.c.message_id == bindparam("b_message_id")
+                ).values(text=bindparam("b_text"))
+                result = session.execute(
+                    stmt,
+                    [{"b_message_id": row["message_id"], "b_text": row["text"]} for row in singles]
+                )
+                updated += result.rowcount
+                self._bump(session, FEED_GENERATION, 1 if result.rowcount else 0)
+            session.commit()
+            return updated
+            
+    def _advance_cursor(self, session: Session, channel_id: int, last_message_id: int):
+        """Move the channel's fetch cursor forward, never backwards."""
+        stmt = insert(ChannelState.__table__).values(
+            channel_id=channel_id,
+            last_message_id=last_message_id,
+            updated_at=datetime.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["channel_id"],
+            set_={
+                "last_message_id": func.max(ChannelState.last_message_id, stmt.excluded.last_message_id),
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        session.execute(stmt)
+                
+    def _latest_posts_query(self):
+        # One representative per near-duplicate cluster
+        return select(Post, Channel.username, Channel.title).join(
+            Channel, Post.channel_id == Channel.id
+        ).where(Post.duplicate_of_channel_id.is_(None))
+        
+    def _post_dict(self, post: Post, username: str, title: Optional[str]) -> Dict:
+        return {
+            "channel_id": post.channel_id,
+            "message_id": post.message_id,
+            "text": post.text,
+            "date": post.date,
+            "url": post.url,
+            "media": post.media,
+            "channel_username": username,
+            "channel_title": title
+        }
+                
     def get_latest_posts(self, limit: int = 20, offset: int = 0) -> List[Dict]:
         """Get latest posts with channel information."""
         with self.get_session() as session:
-            query = select(Post, Channel.username, Channel.title).join(
-                Channel, Post.channel_id == Channel.id
-            ).order_by(Post.date.desc()).limit(limit).offset(offset)
-            
-            result = []
-            for post, username, title in session.execute(query):
-                result.append({
-                    "channel_id": post.channel_id,
-                    "message_id": post.message_id,
-                    "text": post.text,
-                    "date": post.date,
-                    "url": post.url,
-                    "channel_username": username,
-                    "channel_title": title
-                })
-            return result
+            query = self._latest_posts_query().order_by(Post.date.desc()).limit(limit).offset(offset)
+            return [self._post_dict(*row) for row in session.execute(query)]
+            
+    def get_latest_posts_page(self, cursor: Optional[PageCursor] = None, limit: int = 20) -> List[Dict]:
+        """Get the feed page that follows `cursor` (keyset pagination).
+        
+        The cursor is the (date, channel_id, message_id) of the last post of the
+        previous page, so every page costs the same as the first one.
+        """
+        with self.get_session() as session:
+            query = self._latest_posts_page_query(cursor, limit)
+            return [self._post_dict(*row) for row in session.execute(query)]
+            
+    def _latest_posts_page_query(self, cursor: Optional[PageCursor], limit: int):
+        key = (Post.date, Post.channel_id, Post.message_id)
+        query = self._latest_posts_query().order_by(*(column.desc() for column in key)).limit(limit)
+        if cursor:
+            query = query.where(tuple_(*key) < tuple_(*cursor))
+        return query
+            
+    def get_user_feed_page(self, user_id: int, cursor: Optional[PageCursor] = None, limit: int = 20) -> List[Dict]:
+        """Get a page of the user's personal feed (keyset pagination).
+        
+        Users who follow nothing get the global feed.
+        """
+        channel_ids = self.get_user_channel_ids(user_id)
+        if not channel_ids:
+            return self.get_latest_posts_page(cursor, limit)
+        return self.get_channels_feed_page(channel_ids, cursor, limit)
+            
+    def get_channels_feed_page(
+        self,
+        channel_ids: Collection[int],
+        cursor: Optional[PageCursor] = None,
+        limit: int = 20
+    ) -> List[Dict]:
+        """Get a page of the feed merged from the given channels (keyset pagination).
+        
+        For up to FEED_FANOUT_MAX_CHANNELS channels each timeline is read from
+        the (channel_id, date) index and at most `limit` rows per channel are
+        merged, so a page costs channels x limit index reads whatever the size
+        of the posts table. For more channels than that the global feed index
+        is read, skipping the few posts from channels that aren't followed.
+        """
+        channel_ids = sorted(channel_ids)
+        with self.get_session() as session:
+            if len(channel_ids) > config.FEED_FANOUT_MAX_CHANNELS:
+                query = self._global_user_feed_query(channel_ids, cursor, limit)
+            else:
+                query = self._fanout_user_feed_query(channel_ids, cursor, limit)
+            return [self._post_dict(*row) for row in session.execute(query)]
+            
+    def _followed_representative(self, channel_ids: List[int]):
+        # A duplicate is still shown if its representative is in a channel
+        # the user doesn't follow
+        return or_(
+            Post.duplicate_of_channel_id.is_(None),
+            Post.duplicate_of_channel_id.not_in(channel_ids)
+        )
+        
+    def _global_user_feed_query(self, channel_ids: List[int], cursor: Optional[PageCursor], limit: int):
+        key = (Post.date, Post.channel_id, Post.message_id)
+        query = select(Post, Channel.username, Channel.title).join(
+            Channel, Post.channel_id == Channel.id
+        ).where(
+            Post.channel_id.in_(channel_ids),
+            self._followed_representative(channel_ids)
+        ).order_by(*(column.desc() for column in key)).limit(limit)
+        if cursor:
+            query = query.where(tuple_(*key) < tuple_(*cursor))
+        return query
+        
+    def _fanout_user_feed_query(self, channel_ids: List[int], cursor: Optional[PageCursor], limit: int):
+        timelines = []
+        for channel_id in channel_ids:
+            timeline = select(Post.channel_id, Post.message_id, Post.date).where(
+                Post.channel_id == channel_id,
+                self._followed_representative(channel_ids)
+            )
+            if cursor:
+                # The feed order is (date, channel_id, message_id); within one
+                # channel this reduces to a range on (date, message_id)
+                date, cursor_channel_id, cursor_message_id = cursor
+                if channel_id < cursor_channel_id:
+                    timeline = timeline.where(Post.date <= date)
+                elif channel_id > cursor_channel_id:
+                    timeline = timeline.where(Post.date < date)
+                else:
+                    timeline = timeline.where(tuple_(Post.date, Post.message_id) < tuple_(date, cursor_message_id))
+            timeline = timeline.order_by(Post.date.desc(), Post.message_id.desc()).limit(limit).subquery()
+            timelines.append(select(timeline))
+            
+        merged = union_all(*timelines).subquery()
+        return select(Post, Channel.username, Channel.title).join(
+            merged,
+            (Post.channel_id == merged.c.channel_id) & (Post.message_id == merged.c.message_id)
+        ).join(
+            Channel, Post.channel_id == Channel.id
+        ).order_by(
+            merged.c.date.desc(), merged.c.channel_id.desc(), merged.c.message_id.desc()
+        ).limit(limit)
+        
+    def get_recent_signatures(self, since: datetime, limit: int) -> List[Tuple[int, int, bytes]]:
+        """Get (channel_id, message_id, minhash) of cluster representatives
+        posted since `since`, oldest first, at most the newest `limit`."""
+        with self.get_session() as session:
+            query = select(Post.channel_id, Post.message_id, Post.minhash, Post.date).where(
+                Post.date >= since,
+                Post.minhash.is_not(None),
+                Post.duplicate_of_channel_id.is_(None)
+            ).order_by(Post.date.desc()).limit(limit)
+            rows = session.execute(query).all()
+            return [(row.channel_id, row.message_id, row.minhash) for row in reversed(rows)]
             
     def get_max_message_id(self, channel_id: int) -> Optional[int]:
         """Get maximum message_id for a channel."""
@@ -96,6 +490,225 @@ class Repository:
             ).scalar_one_or_none()
             return result if result else 0
             
+    def get_channel_cursors(self) -> Dict[int, int]:
+        """Get the last fetched message_id for every channel."""
+        with self.get_session() as session:
+            cursors = dict(session.execute(
+                select(ChannelState.channel_id, ChannelState.last_message_id)
+            ).all())
+            
+            # Channels fetched before channel_state existed fall back to their posts
+            fallback = session.execute(
+                select(Post.channel_id, func.max(Post.message_id)).where(
+                    Post.channel_id.not_in(select(ChannelState.channel_id))
+                ).group_by(Post.channel_id)
+            ).all()
+            cursors.update(dict(fallback))
+            return cursors
+            
+    # Retention
+    def prune_posts(
+        self,
+        channel_id: int,
+        before: Optional[datetime] = None,
+        keep_latest: int = 0,
+        batch_size: int = 500
+    ) -> PruneResult:
+        """Delete one batch of a channel's old posts.
+        
+        Posts older than `before` and posts beyond the newest `keep_latest` are
+        pruned, except posts that users have saved. The feed hides duplicates,
+        so when a cluster representative is pruned the oldest remaining
+        duplicate takes its place in the same transaction. Each call is one
+        short transaction; repeat while it deletes `batch_size` posts.
+        """
+        conditions = []
+        if before is not None:
+            conditions.append(Post.date < before)
+        if keep_latest:
+            newest = select(Post.message_id).where(
+                Post.channel_id == channel_id
+            ).order_by(Post.message_id.desc()).limit(1).offset(keep_latest - 1).scalar_subquery()
+            conditions.append(Post.message_id < newest)
+        if not conditions:
+            return PruneResult(0, {})
+            
+        saved = select(SavedPost.message_id).where(
+            SavedPost.channel_id == Post.channel_id,
+            SavedPost.message_id == Post.message_id
+        ).exists()
+        
+        with self.get_session() as session:
+            pruned = session.execute(
+                select(Post.message_id, Post.minhash, Post.duplicate_of_channel_id).where(
+                    Post.channel_id == channel_id,
+                    or_(*conditions),
+                    ~saved
+                ).limit(batch_size)
+            ).all()
+            if not pruned:
+                return PruneResult(0, {})
+                
+            message_ids = [post.message_id for post in pruned]
+            representatives = self._promote_duplicates(
+                session,
+                channel_id,
+                [post.message_id for post in pruned if post.minhash is not None and post.duplicate_of_channel_id is None],
+                set(message_ids)
+            )
+            result = session.execute(
+                delete(Post).where(
+                    Post.channel_id == channel_id,
+                    Post.message_id.in_(message_ids)
+                )
+            )
+            self._bump_posts(session, channel_id, -result.rowcount)
+            self._bump(session, FEED_GENERATION, 1 if result.rowcount else 0)
+            session.commit()
+            return PruneResult(result.rowcount, representatives)
+            
+    def _promote_duplicates(
+        self,
+        session: Session,
+        channel_id: int,
+        message_ids: List[int],
+        pruned: Set[int]
+    ) -> Dict[PostKey, Optional[Tuple[PostKey, bytes]]]:
+        """Hand the clusters of representatives about to be pruned to their oldest duplicate."""
+        if not message_ids:
+            return {}
+        clusters: Dict[int, list] = {message_id: [] for message_id in message_ids}
+        for post in session.execute(
+            select(Post.channel_id, Post.message_id, Post.minhash, Post.duplicate_of_message_id).where(
+                Post.duplicate_of_channel_id == channel_id,
+                Post.duplicate_of_message_id.in_(message_ids)
+            ).order_by(Post.date, Post.channel_id, Post.message_id)
+        ):
+            if post.channel_id == channel_id and post.message_id in pruned:
+                continue
+            clusters[post.duplicate_of_message_id].append(post)
+            
+        representatives = {}
+        for message_id, members in clusters.items():
+            if not members:
+                representatives[(channel_id, message_id)] = None
+                continue
+            heir = members[0]
+            session.execute(
+                update(Post).where(
+                    Post.channel_id == heir.channel_id,
+                    Post.message_id == heir.message_id
+                ).values(duplicate_of_channel_id=None, duplicate_of_message_id=None)
+            )
+            if len(members) > 1:
+                session.execute(
+                    update(Post).where(
+                        Post.duplicate_of_channel_id == channel_id,
+                        Post.duplicate_of_message_id == message_id
+                    ).values(duplicate_of_channel_id=heir.channel_id, duplicate_of_message_id=heir.message_id)
+                )
+            representatives[(channel_id, message_id)] = ((heir.channel_id, heir.message_id), heir.minhash)
+        return representatives
+            
+    def incremental_vacuum(self, pages: int = 0) -> bool:
+        """Return up to `pages` free pages to the OS (0 means all).
+        
+        Returns False if the database is not in incremental auto-vacuum mode.
+        """
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            # 2 is INCREMENTAL
+            if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                return False
+            # executescript steps the pragma to completion; execute() would
+            # stop after the first freed page
+            connection.connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            return True
+            
+    def enable_incremental_vacuum(self):
+        """Switch an existing database to incremental auto-vacuum.
+        
+        Needs a one-time full VACUUM, which may renumber post rowids, so the
+        search index is rebuilt afterwards.
+        """
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+        self.rebuild_search_index()
+            
+    # Search
+    def search_posts(self, query: str, cursor: int = 0, limit: int = 10) -> List[Dict]:
+        """Full-text search over posts, best matches first.
+        
+        Every word of `query` must occur in the post. `cursor` is the number of
+        results already shown. Each result carries a `snippet` with the
+        matches wrapped in SNIPPET_OPEN/SNIPPET_CLOSE.
+        """
+        # Quote every word so user input can't break the FTS5 query syntax
+        terms = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+        if not terms:
+            return []
+            
+        sql = text(
+            "SELECT posts.channel_id, posts.message_id, posts.text, posts.date, posts.url, "
+            "channels.username, channels.title, "
+            "snippet(posts_fts, 0, :open, :close, '…', 24) AS snippet "
+            "FROM posts_fts "
+            "JOIN posts ON posts.rowid = posts_fts.rowid "
+            "JOIN channels ON channels.id = posts.channel_id "
+            "WHERE posts_fts MATCH :match "
+            "ORDER BY posts_fts.rank "
+            "LIMIT :limit OFFSET :offset"
+        ).columns(date=DateTime)
+        
+        with self.get_session() as session:
+            rows = session.execute(sql, {
+                "open": SNIPPET_OPEN,
+                "close": SNIPPET_CLOSE,
+                "match": " ".join(terms),
+                "limit": limit,
+                "offset": cursor
+            })
+            return [
+                {
+                    "channel_id": row.channel_id,
+                    "message_id": row.message_id,
+                    "text": row.text,
+                    "date": row.date,
+                    "url": row.url,
+                    "channel_username": row.username,
+                    "channel_title": row.title,
+                    "snippet": row.snippet
+                }
+                for row in rows
+            ]
+            
+    def get_search_query_id(self, query: str) -> int:
+        """Get the id of a search query, storing the query if it is new."""
+        queries = SearchQuery.__table__
+        with self.get_session() as session:
+            stmt = insert(queries).values(query=query, used_at=datetime.utcnow())
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["query"],
+                set_={"used_at": stmt.excluded.used_at}
+            ).returning(queries.c.id)
+            query_id = session.execute(stmt).scalar_one()
+            session.commit()
+            return query_id
+            
+    def get_search_query(self, query_id: int) -> Optional[str]:
+        """Get a stored search query by id."""
+        with self.get_session() as session:
+            return session.execute(
+                select(SearchQuery.query).where(SearchQuery.id == query_id)
+            ).scalar_one_or_none()
+            
+    def prune_search_queries(self, before: datetime) -> int:
+        """Delete search queries last used before `before`."""
+        with self.get_session() as session:
+            result = session.execute(delete(SearchQuery).where(SearchQuery.used_at < before))
+            session.commit()
+            return result.rowcount
+            
     # Users
     def register_user(self, user_id: int) -> User:
         """Register a new user or get existing."""
@@ -104,10 +717,38 @@ class Repository:
             if not user:
                 user = User(user_id=user_id)
                 session.add(user)
+                session.flush()
+                self._bump(session, "users")
                 session.commit()
                 session.refresh(user)
             return user
             
+    def get_user_ids(self) -> Set[int]:
+        """Get the IDs of all registered users."""
+        with self.get_session() as session:
+            return set(session.execute(select(User.user_id)).scalars().all())
+            
+    def touch_users(self, last_seen: Dict[int, datetime]) -> None:
+        """Register users and update their last activity in one transaction."""
+        if not last_seen:
+            return
+            
+        with self.get_session() as session:
+            known = session.execute(
+                select(func.count()).select_from(User).where(User.user_id.in_(list(last_seen)))
+            ).scalar_one()
+            stmt = insert(User.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"last_seen": stmt.excluded.last_seen}
+            )
+            session.execute(stmt, [
+                {"user_id": user_id, "first_seen": seen_at, "last_seen": seen_at}
+                for user_id, seen_at in last_seen.items()
+            ])
+            self._bump(session, "users", len(last_seen) - known)
+            session.commit()
+            
     def get_user_count(self) -> int:
         """Get total user count."""
         with self.get_session() as session:
@@ -115,66 +756,77 @@ class Repository:
             
     # Saved posts
     def save_post(self, user_id: int, channel_id: int, message_id: int) -> Tuple[bool, str]:
-        """Save a post for a user."""
+        """Save a post for a user.
+        
+        One INSERT ... SELECT ... ON CONFLICT statement checks that the post
+        exists and saves it. The returned saved_at tells a new save from an
+        existing one, and no returned row means the post was not found.
+        """
+        now = datetime.now()
+        posts = Post.__table__
+        saved_posts = SavedPost.__table__
+        
         with self.get_session() as session:
-            # Check if post exists
-            post = session.execute(
-                select(Post).where(
-                    Post.channel_id == channel_id,
-                    Post.message_id == message_id
-                )
-            ).scalar_one_or_none()
-            
-            if not post:
+            source = select(
+                literal(user_id),
+                posts.c.channel_id,
+                posts.c.message_id,
+                literal(now, DateTime)
+            ).where(
+                posts.c.channel_id == channel_id,
+                posts.c.message_id == message_id
+            )
+            stmt = insert(saved_posts).from_select(
+                ["user_id", "channel_id", "message_id", "saved_at"], source
+            ).on_conflict_do_update(
+                index_elements=["user_id", "channel_id", "message_id"],
+                set_={"saved_at": saved_posts.c.saved_at}
+            ).returning(saved_posts.c.saved_at)
+            row = session.execute(stmt).first()
+            if row is None:
                 return False, "Post not found"
-                
-            # Check if already saved
-            saved = session.execute(
-                select(SavedPost).where(
-                    SavedPost.user_id == user_id,
-                    SavedPost.channel_id == channel_id,
-                    SavedPost.message_id == message_id
-                )
-            ).scalar_one_or_none()
-            
-            if saved:
+            if row.saved_at != now:
                 return False, "Post already saved"
                 
-            # Save post
-            saved_post = SavedPost(
-                user_id=user_id,
-                channel_id=channel_id,
-                message_id=message_id
-            )
-            session.add(saved_post)
+            self._bump(session, "saved_posts")
             session.commit()
             return True, "Post saved"
             
+    def _saved_posts_query(self, user_id: int):
+        return select(Post, Channel.username, Channel.title, SavedPost.saved_at).join(
+            SavedPost, 
+            (Post.channel_id == SavedPost.channel_id) & (Post.message_id == SavedPost.message_id)
+        ).join(
+            Channel, Post.channel_id == Channel.id
+        ).where(
+            SavedPost.user_id == user_id
+        )
+        
+    def _saved_post_dict(self, post: Post, username: str, title: Optional[str], saved_at: datetime) -> Dict:
+        return {**self._post_dict(post, username, title), "saved_at": saved_at}
+            
     def get_saved_posts(self, user_id: int, limit: int = 20, offset: int = 0) -> List[Dict]:
         """Get saved posts for a user."""
         with self.get_session() as session:
-            query = select(Post, Channel.username, Channel.title, SavedPost.saved_at).join(
-                SavedPost, 
-                (Post.channel_id == SavedPost.channel_id) & (Post.message_id == SavedPost.message_id)
-            ).join(
-                Channel, Post.channel_id == Channel.id
-            ).where(
-                SavedPost.user_id == user_id
-            ).order_by(SavedPost.saved_at.desc()).limit(limit).offset(offset)
-            
-            result = []
-            for post, username, title, saved_at in session.execute(query):
-                result.append({
-                    "channel_id": post.channel_id,
-                    "message_id": post.message_id,
-                    "text": post.text,
-                    "date": post.date,
-                    "url": post.url,
-                    "channel_username": username,
-                    "channel_title": title,
-                    "saved_at": saved_at
-                })
-            return result
+            query = self._saved_posts_query(user_id).order_by(SavedPost.saved_at.desc()).limit(limit).offset(offset)
+            return [self._saved_post_dict(*row) for row in session.execute(query)]
+            
+    def get_saved_posts_page(self, user_id: int, cursor: Optional[PageCursor] = None, limit: int = 20) -> List[Dict]:
+        """Get the saved posts page that follows `cursor` (keyset pagination).
+        
+        The cursor is the (saved_at, channel_id, message_id) of the last post of
+        the previous page.
+        """
+        with self.get_session() as session:
+            query = self._saved_posts_page_query(user_id, cursor, limit)
+            return [self._saved_post_dict(*row) for row in session.execute(query)]
+            
+    def _saved_posts_page_query(self, user_id: int, cursor: Optional[PageCursor], limit: int):
+        key = (SavedPost.saved_at, SavedPost.channel_id, SavedPost.message_id)
+        query = self._saved_posts_query(user_id).order_by(*(column.desc() for column in key)).limit(limit)
+        if cursor:
+            query = query.where(tuple_(*key) < tuple_(*cursor))
+        return query
             
     def delete_saved_post(self, user_id: int, channel_id: int, message_id: int) -> bool:
         """Delete a saved post."""
@@ -186,9 +838,100 @@ class Repository:
                     SavedPost.message_id == message_id
                 )
             )
+            self._bump(session, "saved_posts", -result.rowcount)
+            session.commit()
+            return result.rowcount > 0
+            
+    # Subscriptions
+    def subscribe_channel(self, user_id: int, channel_id: int) -> bool:
+        """Follow a channel. Returns False if the user already follows it."""
+        with self.get_session() as session:
+            stmt = insert(UserChannel.__table__).values(
+                user_id=user_id,
+                channel_id=channel_id,
+                added_at=datetime.now()
+            ).on_conflict_do_nothing(index_elements=["user_id", "channel_id"])
+            result = session.execute(stmt)
+            session.commit()
+            return result.rowcount > 0
+            
+    def unsubscribe_channel(self, user_id: int, channel_id: int) -> bool:
+        """Stop following a channel. Returns False if the user didn't follow it."""
+        with self.get_session() as session:
+            result = session.execute(
+                delete(UserChannel).where(
+                    UserChannel.user_id == user_id,
+                    UserChannel.channel_id == channel_id
+                )
+            )
             session.commit()
             return result.rowcount > 0
             
+    def get_user_channel_ids(self, user_id: int) -> Set[int]:
+        """Get the IDs of the channels a user follows."""
+        with self.get_session() as session:
+            return set(session.execute(
+                select(UserChannel.channel_id).where(UserChannel.user_id == user_id)
+            ).scalars().all())
+            
+    # Media
+    def get_media_file_ids(self, thumbnails: List[str]) -> Dict[str, str]:
+        """Get Bot API file_ids of already uploaded thumbnails by content hash."""
+        if not thumbnails:
+            return {}
+        with self.get_session() as session:
+            return dict(session.execute(
+                select(MediaFile.thumbnail, MediaFile.file_id).where(MediaFile.thumbnail.in_(thumbnails))
+            ).all())
+            
+    def set_post_thumbnails(self, channel_id: int, thumbnails: List[Dict]) -> int:
+        """Set thumbnails downloaded after their posts were stored.
+        
+        Each item holds message_id, grouped_id and thumbnail; album messages
+        are found through the album's post. Returns the number of posts
+        updated.
+        """
+        if not thumbnails:
+            return 0
+            
+        with self.get_session() as session:
+            updated = 0
+            for thumbnail in thumbnails:
+                if thumbnail["grouped_id"]:
+                    condition = Post.grouped_id == thumbnail["grouped_id"]
+                else:
+                    condition = Post.message_id == thumbnail["message_id"]
+                post = session.execute(
+                    select(Post).where(Post.channel_id == channel_id, condition)
+                ).scalars().first()
+                if post is None or not post.media:
+                    continue
+                media = [dict(item) for item in post.media]
+                for item in media:
+                    if item.get("message_id", post.message_id) == thumbnail["message_id"]:
+                        item["thumbnail"] = thumbnail["thumbnail"]
+                        post.media = media
+                        updated += 1
+                        break
+            self._bump(session, FEED_GENERATION, 1 if updated else 0)
+            session.commit()
+            return updated
+            
+    def set_media_file_id(self, thumbnail: str, file_id: str):
+        """Remember the Bot API file_id of an uploaded thumbnail."""
+        with self.get_session() as session:
+            stmt = insert(MediaFile.__table__).values(
+                thumbnail=thumbnail,
+                file_id=file_id,
+                uploaded_at=datetime.now()
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["thumbnail"],
+                set_={"file_id": stmt.excluded.file_id, "uploaded_at": stmt.excluded.uploaded_at}
+            )
+            session.execute(stmt)
+            session.commit()
+            
     # Suggestions
     def add_suggestion(self, user_id: int, channel_username: str, comment: Optional[str] = None) -> Suggestion:
         """Add a new channel suggestion."""
@@ -208,18 +951,141 @@ class Repository:
         with self.get_session() as session:
             return list(session.execute(select(Suggestion).order_by(Suggestion.created_at.desc())).scalars().all())
             
+    # Leases
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Take or renew a named lease for `ttl_seconds`.
+        
+        Succeeds if the lease is free, expired or already held by `holder`.
+        The check and the write are one statement, so two processes sharing
+        the database can never both get it.
+        """
+        now = datetime.utcnow()
+        leases = Lease.__table__
+        with self.get_session() as session:
+            stmt = insert(leases).values(
+                name=name,
+                holder=holder,
+                expires_at=now + timedelta(seconds=ttl_seconds)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["name"],
+                set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+                where=(leases.c.holder == stmt.excluded.holder) | (leases.c.expires_at < now)
+            )
+            result = session.execute(stmt)
+            session.commit()
+            return result.rowcount > 0
+            
+    def release_lease(self, name: str, holder: str) -> bool:
+        """Give up a lease held by `holder`."""
+        with self.get_session() as session:
+            result = session.execute(
+                delete(Lease).where(Lease.name == name, Lease.holder == holder)
+            )
+            session.commit()
+            return result.rowcount > 0
+            
     # Stats
+    def _bump(self, session: Session, name: str, delta: int = 1):
+        """Add `delta` to a counter within the caller's transaction."""
+        if not delta:
+            return
+        stmt = insert(Counter.__table__).values(name=name, value=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"value": Counter.value + stmt.excluded.value}
+        )
+        session.execute(stmt)
+        
+    def _bump_posts(self, session: Session, channel_id: int, delta: int):
+        self._bump(session, "posts", delta)
+        self._bump(session, f"posts:{channel_id}", delta)
+        
+    def reconcile_counters(self) -> Dict[str, int]:
+        """Recount all counters from the tables they summarize."""
+        with self.get_session() as session:
+            counters = {
+                "users": session.execute(select(func.count(User.user_id))).scalar_one(),
+                "posts": session.execute(select(func.count()).select_from(Post)).scalar_one(),
+                "channels": session.execute(select(func.count(Channel.id))).scalar_one(),
+                "saved_posts": session.execute(select(func.count()).select_from(SavedPost)).scalar_one()
+            }
+            for channel_id, count in session.execute(
+                select(Post.channel_id, func.count()).group_by(Post.channel_id)
+            ):
+                counters[f"posts:{channel_id}"] = count
+                
+            # The feed generation is not a count; keep it going
+            session.execute(delete(Counter).where(Counter.name != FEED_GENERATION))
+            session.execute(insert(Counter.__table__), [
+                {"name": name, "value": value} for name, value in counters.items()
+            ])
+            session.commit()
+            return counters
+            
+    def get_feed_generation(self) -> int:
+        """Get the shared counter of writes that changed the feed."""
+        with self.get_session() as session:
+            value = session.execute(
+                select(Counter.value).where(Counter.name == FEED_GENERATION)
+            ).scalar_one_or_none()
+            return value or 0
+            
     def get_stats(self) -> Dict:
-        """Get basic stats."""
+        """Get basic stats from the incrementally maintained counters.
+        
+        Besides the totals, `channel_posts` lists every channel with its
+        stored posts and the posts published in the last hour.
+        """
         with self.get_session() as session:
-            user_count = session.execute(select(func.count(User.user_id))).scalar_one()
-            post_count = session.execute(select(func.count()).select_from(Post)).scalar_one()
-            channel_count = session.execute(select(func.count(Channel.id))).scalar_one()
-            saved_count = session.execute(select(func.count()).select_from(SavedPost)).scalar_one()
+            counters = dict(session.execute(select(Counter.name, Counter.value)).all())
+            if "posts" not in counters:
+                counters = self.reconcile_counters()
+                
+            # Bounded by recent volume: a range scan on the date index
+            last_hour = dict(session.execute(
+                select(Post.channel_id, func.count()).where(
+                    Post.date >= datetime.utcnow() - timedelta(hours=1)
+                ).group_by(Post.channel_id)
+            ).all())
+            channels = session.execute(select(Channel.id, Channel.username).order_by(Channel.id)).all()
             
             return {
-                "users": user_count,
-                "posts": post_count,
-                "channels": channel_count,
-                "saved_posts": saved_count
-            } 
\ No newline at end of file
+                "users": counters.get("users", 0),
+                "posts": counters.get("posts", 0),
+                "channels": counters.get("channels", 0),
+                "saved_posts": counters.get("saved_posts", 0),
+                "channel_posts": [
+                    {
+                        "channel_id": channel_id,
+                        "username": username,
+                        "posts": counters.get(f"posts:{channel_id}", 0),
+                        "last_hour": last_hour.get(channel_id, 0)
+                    }
+                    for channel_id, username in channels
+                ]
+            }
+            
+    # Diagnostics
+    def explain_query_plans(self) -> Dict[str, List[str]]:
+        """Run EXPLAIN QUERY PLAN for the hot read queries.
+        
+        Returns the plan steps of each query, e.g. to check that they are
+        served by index scans rather than full scans plus sorts.
+        """
+        cursor = (datetime.now(), 0, 0)
+        queries = {
+            "feed": self._latest_posts_page_query(None, 20),
+            "feed_cursor": self._latest_posts_page_query(cursor, 20),
+            "saved": self._saved_posts_page_query(0, None, 20),
+            "saved_cursor": self._saved_posts_page_query(0, cursor, 20),
+            "suggestions": select(Suggestion).order_by(Suggestion.created_at.desc()),
+        }
+        
+        plans = {}
+        with self.engine.connect() as connection:
+            for name, query in queries.items():
+                sql = query.compile(self.engine, compile_kwargs={"literal_binds": True})
+                rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+                plans[name] = [row[-1] for row in rows]
+        return plans
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from tg_news_feed.config import config
+from tg_news_feed.parser.dedup import DuplicateDetector
+from tg_news_feed.storage.async_repo import AsyncRepository
+
+logger = logging.getLogger(__name__)
+
+
+def retention_enabled() -> bool:
+    """Check whether any retention limit is configured."""
+    return bool(config.RETENTION_DAYS or config.RETENTION_CHANNEL_DAYS or config.RETENTION_MAX_POSTS_PER_CHANNEL)
+
+
+async def run_retention(repo: AsyncRepository, dedup: Optional[DuplicateDetector] = None) -> int:
+    """Prune old posts by the configured age and row limits, then vacuum.
+    
+    Posts are deleted in small batches, each in its own transaction, so the
+    write lock is never held for long. Saved posts are always kept. Pruned
+    cluster representatives are replaced in `dedup` by the duplicates that
+    took their place. Returns the number of posts deleted.
+    """
+    channels = await repo.get_channels(active_only=False)
+    total_deleted = 0
+    
+    for channel in channels:
+        days = config.RETENTION_CHANNEL_DAYS.get(channel.username, config.RETENTION_DAYS)
+        keep_latest = config.RETENTION_MAX_POSTS_PER_CHANNEL
+        if not days and not keep_latest:
+            continue
+            
+        # Post dates are stored in UTC
+        before = datetime.utcnow() - timedelta(days=days) if days else None
+        while True:
+            result = await repo.prune_posts(
+                channel.id,
+                before=before,
+                keep_latest=keep_latest,
+                batch_size=config.RETENTION_BATCH_SIZE
+            )
+            total_deleted += result.deleted
+            if dedup is not None:
+                for key, heir in result.representatives.items():
+                    dedup.remove(key)
+                    if heir is not None:
+                        dedup.add(*heir)
+            if result.deleted < config.RETENTION_BATCH_SIZE:
+                break
+            # Let other writers in between batches
+            await asyncio.sleep(config.RETENTION_BATCH_PAUSE_SECONDS)
+            
+    if total_deleted:
+        logger.info(f"Retention pruned {total_deleted} posts")
+        if not await repo.incremental_vacuum(config.RETENTION_VACUUM_PAGES):
+            # Converting takes a full VACUUM under an exclusive lock, so it
+            # is left to an explicit one-off run
+            logger.warning(
+                "Database is not in incremental auto-vacuum mode, freed pages stay in the file; "
+                "run enable_incremental_vacuum.py once to convert it"
+            )
+            
+    return total_deleted
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from tg_news_feed.config import config
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees space down to this share of the limit, so it runs in bursts
+# rather than on every write
+EVICT_TO = 0.9
+
+
+class ThumbnailCache:
+    """Content-addressed on-disk cache of post thumbnails.
+
+    Files are named by the SHA-256 of their bytes, so a picture reposted by
+    several channels is stored once. Reads and repeated writes refresh a
+    file's mtime, and when the cache grows past `max_bytes` the least
+    recently used files are deleted. Bot replicas only read, so processes
+    sharing the database can share the directory too.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # Bytes on disk, counted on the first write
+        self.total: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def _file(self, digest: str) -> Path:
+        return self.path / digest[:2] / f"{digest}.jpg"
+
+    def _scan(self) -> Iterator[Tuple[float, int, Path]]:
+        """Yield (mtime, size, path) for every cached file."""
+        if not self.path.is_dir():
+            return
+        for shard in self.path.iterdir():
+            if not shard.is_dir():
+                continue
+            for file in shard.glob("*.jpg"):
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, file
+
+    def _evict(self):
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO
+        evicted = 0
+        for _, size, file in files:
+            if total <= target:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        self.total = total
+        logger.info(f"Evicted {evicted} thumbnails, {total // 1024} KiB left in the cache")
+
+    def put_sync(self, data: bytes) -> str:
+        """Store a thumbnail and return its content hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        file = self._file(digest)
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for _, size, _ in self._scan())
+            try:
+                os.utime(file)
+                return digest
+            except FileNotFoundError:
+                pass
+            file.parent.mkdir(parents=True, exist_ok=True)
+            # Write and rename, so readers never see a partial file
+            partial = file.with_suffix(f".{os.getpid()}.tmp")
+            partial.write_bytes(data)
+            os.replace(partial, file)
+            self.total += len(data)
+            if self.total > self.max_bytes:
+                self._evict()
+        return digest
+
+    def get_sync(self, digest: str) -> Optional[bytes]:
+        """Read a thumbnail by its content hash, or None if it was evicted."""
+        file = self._file(digest)
+        try:
+            data = file.read_bytes()
+            os.utime(file)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def contains(self, digest: str) -> bool:
+        return self._file(digest).is_file()
+
+    async def put(self, data: bytes) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, self.put_sync, data)
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_sync, digest)
+
+
+def create_thumbnail_cache() -> Optional[ThumbnailCache]:
+    """Create the thumbnail cache from Settings, or None if thumbnails are off."""
+    if not config.MEDIA_THUMBNAILS:
+        return None
+    return ThumbnailCache(config.MEDIA_CACHE_DIR, config.MEDIA_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from tg_news_feed.storage.async_repo import AsyncRepository
+
+logger = logging.getLogger(__name__)
+
+
+class UserTracker:
+    """Write-behind user registration and activity tracking.
+
+    Known user IDs are kept in memory, so recording an interaction never
+    touches the database. New users and last-seen times are written in one
+    batch every `flush_interval` seconds.
+    """
+
+    def __init__(self, repo: AsyncRepository, flush_interval: float):
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self.known: Set[int] = set()
+        self.last_seen: Dict[int, datetime] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Load known users and start the background flush loop."""
+        self.known = await self.repo.get_user_ids()
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        logger.info(f"Loaded {len(self.known)} known users")
+
+    async def stop(self):
+        """Stop the flush loop and write pending activity."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    def touch(self, user_id: int) -> bool:
+        """Record an interaction. Returns True if the user is new."""
+        self.last_seen[user_id] = datetime.now()
+        if user_id in self.known:
+            return False
+        self.known.add(user_id)
+        return True
+
+    def is_known(self, user_id: int) -> bool:
+        """Check whether a user has interacted with the bot before."""
+        return user_id in self.known
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing user activity: {e}")
+
+    async def flush(self):
+        """Write pending registrations and last-seen times."""
+        if not self.last_seen:
+            return
+        last_seen, self.last_seen = self.last_seen, {}
+        try:
+            await self.repo.touch_users(last_seen)
+        except Exception:
+            # Keep the batch for the next flush, unless newer activity replaced it
+            for user_id, seen_at in last_seen.items():
+                self.last_seen.setdefault(user_id, seen_at)
+            raise